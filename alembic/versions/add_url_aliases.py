@@ -0,0 +1,37 @@
+"""add_url_aliases
+
+Revision ID: add_url_aliases
+Revises: add_url_shards
+Create Date: 2026-10-19 19:00:00.000000
+
+Ampliar un varchar solo cambia el catálogo: no reescribe la tabla ni los
+índices, aunque toma un lock exclusivo breve. Los shards distintos del 0 no
+pasan por Alembic: en cada uno hay que ejecutar el mismo ALTER a mano.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_aliases'
+down_revision: Union[str, None] = 'add_url_shards'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['urls', 'urls_archive']
+
+
+def upgrade() -> None:
+    """Códigos de hasta 32 caracteres para los alias personalizados."""
+    for table in TABLES:
+        op.alter_column(table, 'code', type_=sa.String(length=32), existing_type=sa.String(length=10),
+                        existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Volver a 10 caracteres; falla si ya hay alias más largos."""
+    for table in TABLES:
+        op.alter_column(table, 'code', type_=sa.String(length=10), existing_type=sa.String(length=32),
+                        existing_nullable=False)
@@ -0,0 +1,57 @@
+"""add_url_archive
+
+Revision ID: add_url_archive
+Revises: partition_urls_by_code
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.archive_service import restore_row
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_archive'
+down_revision: Union[str, None] = 'partition_urls_by_code'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Agregar el último acceso y la tabla de enlaces archivados."""
+    # Nullable y sin default: no reescribe la tabla; se usa created_at hasta el primer acceso
+    op.add_column('urls', sa.Column('last_accessed_at', sa.DateTime(), nullable=True))
+    op.create_table('urls_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('code', sa.String(length=10), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['owner_id'], ['users.id'], name='fk_urls_archive_owner_id_users', ondelete='SET NULL'
+        ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('code'),
+    )
+    op.create_index(
+        'ix_urls_archive_owner_created', 'urls_archive', ['owner_id', 'created_at', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Devolver los enlaces archivados a urls y eliminar el archivo."""
+    conn = op.get_bind()
+    urls = sa.table(
+        'urls', sa.column('id'), sa.column('code'), sa.column('owner_id'), sa.column('created_at'),
+        sa.column('original_url'), sa.column('url_hash'), sa.column('access_count'), sa.column('last_accessed_at'),
+    )
+    archived = conn.execute(sa.text('SELECT id, code, owner_id, created_at, payload FROM urls_archive')).all()
+    if archived:
+        conn.execute(sa.insert(urls), [restore_row(row) for row in archived])
+    op.drop_index('ix_urls_archive_owner_created', table_name='urls_archive')
+    op.drop_table('urls_archive')
+    op.drop_column('urls', 'last_accessed_at')
@@ -0,0 +1,37 @@
+"""add_url_consumed_clicks
+
+Revision ID: add_url_consumed_clicks
+Revises: add_url_aliases
+Create Date: 2026-10-19 20:00:00.000000
+
+Los bots gastan max_clicks sin sumar a access_count: el límite se cuenta
+aparte. Añadir una columna NOT NULL con valor por defecto constante solo
+cambia el catálogo; el relleno recorre ix_urls_max_clicks y solo toca los
+enlaces con límite. Los shards distintos del 0 no pasan por Alembic: en cada
+uno hay que ejecutar lo mismo a mano.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_consumed_clicks'
+down_revision: Union[str, None] = 'add_url_aliases'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Usos consumidos de cada enlace con max_clicks, incluidos los de bots."""
+    op.add_column('urls', sa.Column('consumed_clicks', sa.Integer(), nullable=False, server_default='0'))
+    # Hasta ahora solo los accesos de personas gastaban el límite en la BD
+    op.execute(sa.text(
+        "UPDATE urls SET consumed_clicks = COALESCE(access_count, 0) "
+        "WHERE max_clicks IS NOT NULL AND access_count > 0"
+    ))
+
+
+def downgrade() -> None:
+    op.drop_column('urls', 'consumed_clicks')
@@ -0,0 +1,40 @@
+"""add_url_expiration
+
+Revision ID: add_url_expiration
+Revises: remove_items_table
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_expiration'
+down_revision: Union[str, None] = 'remove_items_table'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Agregar expiración y límite de accesos a las URLs."""
+    op.add_column('urls', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.add_column('urls', sa.Column('max_clicks', sa.Integer(), nullable=True))
+    op.create_index(
+        'ix_urls_expires_at', 'urls', ['expires_at'],
+        postgresql_where=sa.text('expires_at IS NOT NULL'),
+    )
+    op.create_index(
+        'ix_urls_max_clicks', 'urls', ['id'],
+        postgresql_where=sa.text('max_clicks IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Eliminar expiración y límite de accesos."""
+    op.drop_index('ix_urls_max_clicks', table_name='urls')
+    op.drop_index('ix_urls_expires_at', table_name='urls')
+    op.drop_column('urls', 'max_clicks')
+    op.drop_column('urls', 'expires_at')
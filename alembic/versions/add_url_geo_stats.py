@@ -0,0 +1,34 @@
+"""add_url_geo_stats
+
+Revision ID: add_url_geo_stats
+Revises: add_url_archive
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_geo_stats'
+down_revision: Union[str, None] = 'add_url_archive'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Agregar los clics por país y ASN."""
+    op.create_table('url_geo_stats',
+        sa.Column('url_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('country', sa.String(length=2), nullable=False),
+        sa.Column('asn', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('clicks', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('url_id', 'country', 'asn'),
+    )
+
+
+def downgrade() -> None:
+    """Eliminar los clics por país y ASN."""
+    op.drop_table('url_geo_stats')
@@ -0,0 +1,49 @@
+"""add_url_hash
+
+Revision ID: add_url_hash
+Revises: add_url_expiration
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.canonical_url import canonicalize_url, url_digest
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_hash'
+down_revision: Union[str, None] = 'add_url_expiration'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Agregar el digest de la URL canónica y rellenarlo por lotes."""
+    op.add_column('urls', sa.Column('url_hash', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_urls_url_hash'), 'urls', ['url_hash'], unique=False)
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text("SELECT id, original_url FROM urls WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("UPDATE urls SET url_hash = :url_hash WHERE id = :id"),
+            [{"id": row.id, "url_hash": url_digest(canonicalize_url(row.original_url))} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Eliminar el digest de la URL canónica."""
+    op.drop_index(op.f('ix_urls_url_hash'), table_name='urls')
+    op.drop_column('urls', 'url_hash')
@@ -0,0 +1,42 @@
+"""add_url_owner
+
+Revision ID: add_url_owner
+Revises: add_url_hash
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_owner'
+down_revision: Union[str, None] = 'add_url_hash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Agregar el propietario de cada URL y el contador de enlaces por usuario."""
+    op.add_column('urls', sa.Column('owner_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_urls_owner_id_users', 'urls', 'users', ['owner_id'], ['id'], ondelete='SET NULL'
+    )
+    op.create_index('ix_urls_owner_created', 'urls', ['owner_id', 'created_at', 'id'], unique=False)
+    op.add_column(
+        'users',
+        sa.Column('link_count', sa.Integer(), server_default='0', nullable=False),
+    )
+
+    # Los enlaces anteriores a la autenticación quedan sin propietario (owner_id NULL):
+    # siguen siendo públicos y no cuentan en la cuota de nadie
+
+
+def downgrade() -> None:
+    """Eliminar el propietario de las URLs y el contador de enlaces."""
+    op.drop_column('users', 'link_count')
+    op.drop_index('ix_urls_owner_created', table_name='urls')
+    op.drop_constraint('fk_urls_owner_id_users', 'urls', type_='foreignkey')
+    op.drop_column('urls', 'owner_id')
@@ -0,0 +1,46 @@
+"""add_url_shards
+
+Revision ID: add_url_shards
+Revises: add_url_target_status
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_shards'
+down_revision: Union[str, None] = 'add_url_target_status'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columnas con ids de enlace; los ids con shard no caben en 32 bits
+ID_COLUMNS = [('urls', 'id'), ('urls_archive', 'id'), ('url_geo_stats', 'url_id')]
+
+
+def _set_id_type(type_: sa.types.TypeEngine, sequence_type: str) -> None:
+    # Cambiar el tipo reescribe cada tabla con un lock exclusivo mientras dura
+    for table, column in ID_COLUMNS:
+        op.alter_column(table, column, type_=type_)
+    sequence = op.get_bind().execute(sa.text("SELECT pg_get_serial_sequence('urls', 'id')")).scalar()
+    op.execute(sa.text(f"ALTER SEQUENCE {sequence} AS {sequence_type}"))
+
+
+def upgrade() -> None:
+    """Mapa bucket→shard e ids de enlace de 64 bits."""
+    op.create_table('url_shards',
+        sa.Column('bucket', sa.SmallInteger(), autoincrement=False, nullable=False),
+        sa.Column('shard', sa.SmallInteger(), nullable=False),
+        sa.Column('moving', sa.Boolean(), server_default='false', nullable=False),
+        sa.PrimaryKeyConstraint('bucket'),
+    )
+    _set_id_type(sa.BigInteger(), 'bigint')
+
+
+def downgrade() -> None:
+    """Eliminar el mapa de shards; falla si ya hay ids de 64 bits."""
+    _set_id_type(sa.Integer(), 'integer')
+    op.drop_table('url_shards')
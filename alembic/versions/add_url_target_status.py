@@ -0,0 +1,54 @@
+"""add_url_target_status
+
+Revision ID: add_url_target_status
+Revises: add_url_geo_stats
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_url_target_status'
+down_revision: Union[str, None] = 'add_url_geo_stats'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_partitioned(conn) -> bool:
+    return conn.execute(
+        sa.text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'urls'::regclass)")
+    ).scalar()
+
+
+def _replace_covering_index(include: list[str]) -> None:
+    """Recrea ix_urls_code_covering con otras columnas incluidas."""
+    if _is_partitioned(op.get_bind()):
+        # Una tabla particionada no admite CONCURRENTLY: bloquea escrituras mientras dura
+        op.drop_index('ix_urls_code_covering', table_name='urls')
+        op.create_index('ix_urls_code_covering', 'urls', ['code'], unique=True, postgresql_include=include)
+        return
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_urls_code_covering_new', 'urls', ['code'], unique=True,
+            postgresql_include=include, postgresql_concurrently=True,
+        )
+        op.drop_index('ix_urls_code_covering', table_name='urls', postgresql_concurrently=True)
+        op.execute(sa.text("ALTER INDEX ix_urls_code_covering_new RENAME TO ix_urls_code_covering"))
+
+
+def upgrade() -> None:
+    """Estado del destino de cada enlace, incluido en el índice de la redirección."""
+    op.add_column('urls', sa.Column('target_status', sa.SmallInteger(), nullable=True))
+    op.add_column('urls', sa.Column('target_checked_at', sa.DateTime(), nullable=True))
+    _replace_covering_index(['id', 'original_url', 'expires_at', 'max_clicks', 'target_status'])
+
+
+def downgrade() -> None:
+    """Eliminar el estado del destino."""
+    _replace_covering_index(['id', 'original_url', 'expires_at', 'max_clicks'])
+    op.drop_column('urls', 'target_checked_at')
+    op.drop_column('urls', 'target_status')
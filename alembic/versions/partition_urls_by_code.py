@@ -0,0 +1,111 @@
+"""partition_urls_by_code
+
+Revision ID: partition_urls_by_code
+Revises: tune_url_indexes
+Create Date: 2026-10-19 14:30:00.000000
+
+Opcional: solo actúa si URLS_HASH_PARTITIONS > 0. Pensado para tablas de más
+de 100M de filas; copia la tabla completa, así que debe ejecutarse con la
+aplicación detenida.
+
+En la tabla particionada la clave única es `code` (debe incluir la clave de
+partición); `id` sigue saliendo de la misma secuencia y tiene un índice
+normal, pero las búsquedas por id recorren todas las particiones.
+"""
+from typing import Sequence, Union
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'partition_urls_by_code'
+down_revision: Union[str, None] = 'tune_url_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = int(os.getenv("URLS_HASH_PARTITIONS", "0"))
+BATCH_SIZE = 50000
+FILLFACTOR = 80
+
+# Índices comunes a ambos esquemas, en el orden en que se crean
+INDEXES = [
+    "CREATE UNIQUE INDEX ix_urls_code_covering ON urls (code) "
+    "INCLUDE (id, original_url, expires_at, max_clicks)",
+    "CREATE INDEX ix_urls_created_at_brin ON urls USING brin (created_at)",
+    "CREATE INDEX ix_urls_url_hash ON urls (url_hash)",
+    "CREATE INDEX ix_urls_owner_created ON urls (owner_id, created_at, id)",
+    "CREATE INDEX ix_urls_expires_at ON urls (expires_at) WHERE expires_at IS NOT NULL",
+    "CREATE INDEX ix_urls_max_clicks ON urls (id) WHERE max_clicks IS NOT NULL",
+]
+
+
+def _is_partitioned(conn) -> bool:
+    return conn.execute(
+        sa.text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'urls'::regclass)")
+    ).scalar()
+
+
+def _copy(conn, source: str, target: str) -> None:
+    """Copia por rangos de id para no mantener una única sentencia gigante."""
+    max_id = conn.execute(sa.text(f"SELECT COALESCE(MAX(id), 0) FROM {source}")).scalar()
+    for start in range(0, max_id, BATCH_SIZE):
+        conn.execute(
+            sa.text(f"INSERT INTO {target} SELECT * FROM {source} WHERE id > :start AND id <= :end"),
+            {"start": start, "end": start + BATCH_SIZE},
+        )
+    copied = conn.execute(sa.text(f"SELECT COUNT(*) FROM {target}")).scalar()
+    expected = conn.execute(sa.text(f"SELECT COUNT(*) FROM {source}")).scalar()
+    if copied != expected:
+        raise RuntimeError(f"Copia incompleta de {source}: {copied} de {expected} filas")
+
+
+def _swap(conn, old: str, new: str) -> None:
+    """Sustituye `old` por `new` conservando la secuencia de ids."""
+    sequence = conn.execute(sa.text(f"SELECT pg_get_serial_sequence('{old}', 'id')")).scalar()
+    op.execute(sa.text(f"ALTER SEQUENCE {sequence} OWNED BY {new}.id"))
+    op.drop_table(old)
+    op.rename_table(new, 'urls')
+    for statement in INDEXES:
+        op.execute(sa.text(statement))
+    op.create_foreign_key(
+        'fk_urls_owner_id_users', 'urls', 'users', ['owner_id'], ['id'], ondelete='SET NULL'
+    )
+
+
+def upgrade() -> None:
+    """Particionar urls por hash de code."""
+    conn = op.get_bind()
+    if PARTITIONS <= 0 or _is_partitioned(conn):
+        return
+
+    op.execute(sa.text(
+        "CREATE TABLE urls_partitioned (LIKE urls INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY HASH (code)"
+    ))
+    for remainder in range(PARTITIONS):
+        op.execute(sa.text(
+            f"CREATE TABLE urls_p{remainder} PARTITION OF urls_partitioned "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder}) "
+            f"WITH (fillfactor = {FILLFACTOR})"
+        ))
+    _copy(conn, 'urls', 'urls_partitioned')
+    _swap(conn, 'urls', 'urls_partitioned')
+    # Sin clave primaria en id: las búsquedas por id necesitan su propio índice
+    op.execute(sa.text("CREATE INDEX ix_urls_id ON urls (id)"))
+
+
+def downgrade() -> None:
+    """Volver a una tabla urls sin particionar."""
+    conn = op.get_bind()
+    if not _is_partitioned(conn):
+        return
+
+    op.execute(sa.text(
+        "CREATE TABLE urls_unpartitioned (LIKE urls INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"WITH (fillfactor = {FILLFACTOR})"
+    ))
+    op.execute(sa.text("ALTER TABLE urls_unpartitioned ADD CONSTRAINT urls_pkey PRIMARY KEY (id)"))
+    _copy(conn, 'urls', 'urls_unpartitioned')
+    _swap(conn, 'urls', 'urls_unpartitioned')
@@ -0,0 +1,55 @@
+"""tune_url_indexes
+
+Revision ID: tune_url_indexes
+Revises: add_url_owner
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'tune_url_indexes'
+down_revision: Union[str, None] = 'add_url_owner'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Deja hueco en cada página para que los UPDATE de access_count sean HOT
+URLS_FILLFACTOR = 80
+
+
+def upgrade() -> None:
+    """Índices ajustados a la redirección; CONCURRENTLY para no bloquear escrituras."""
+    with op.get_context().autocommit_block():
+        # Cubre todas las columnas que lee la redirección: búsqueda index-only
+        op.create_index(
+            'ix_urls_code_covering', 'urls', ['code'], unique=True,
+            postgresql_include=['id', 'original_url', 'expires_at', 'max_clicks'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_urls_code', table_name='urls', postgresql_concurrently=True)
+        # Rangos por fecha: created_at crece con el id y BRIN ocupa unos pocos KB
+        op.create_index(
+            'ix_urls_created_at_brin', 'urls', ['created_at'],
+            postgresql_using='brin', postgresql_concurrently=True,
+        )
+        # Duplican el índice de la clave primaria
+        op.drop_index('ix_urls_id', table_name='urls', postgresql_concurrently=True)
+        op.drop_index('ix_users_id', table_name='users', postgresql_concurrently=True)
+
+    # Solo afecta a las páginas nuevas; las existentes se reescriben con VACUUM FULL o pg_repack
+    op.execute(sa.text(f"ALTER TABLE urls SET (fillfactor = {URLS_FILLFACTOR})"))
+
+
+def downgrade() -> None:
+    """Restaurar los índices originales."""
+    op.execute(sa.text("ALTER TABLE urls RESET (fillfactor)"))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_id', 'users', ['id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_urls_id', 'urls', ['id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_urls_created_at_brin', table_name='urls', postgresql_concurrently=True)
+        op.create_index('ix_urls_code', 'urls', ['code'], unique=True, postgresql_concurrently=True)
+        op.drop_index('ix_urls_code_covering', table_name='urls', postgresql_concurrently=True)
@@ -5,9 +5,11 @@ from jose import jwt, JWTError
 from app.services.user_service import get_user_by_id
 from app.db.session import get_session
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
 settings = get_settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login", auto_error=False)
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -22,3 +24,12 @@ async def get_current_user(
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
+
+async def get_current_user_optional(
+    token: Optional[str] = Depends(oauth2_scheme_optional),
+    session: AsyncSession = Depends(get_session)
+):
+    """Usuario autenticado si se envió un token; None para peticiones anónimas."""
+    if not token:
+        return None
+    return await get_current_user(token, session)
@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
 import logging
+from app.core.client_ip import get_client_ip
+from app.core.config import get_settings
+from app.core.prometheus import REDIRECT_CLIENTS
 from app.db.session import get_session
-from app.db.models.url import URL
-from app.core.security import set_security_headers
+from app.services.url_service import resolve_code, record_access, consume_click
+from app.services.click_stream_service import click_publisher
+from app.services.geoip_service import geo_clicks
+from app.services.user_agent_service import classify_user_agent, is_automated
 from typing import List, Optional
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 router = APIRouter()
+settings = get_settings()
 
 # Lista de dominios potencialmente maliciosos
 BLOCKED_DOMAINS: List[str] = [
@@ -51,28 +56,47 @@ async def get_url_info(
 ):
     """Devuelve la URL original desde un código corto (uso AJAX)."""
     
-    client_ip = request.client.host if request.client else "unknown"
-    user_agent = request.headers.get("user-agent", "unknown")
-    security_logger.info(f"Consulta AJAX: code={code}, ip={client_ip}, user_agent={user_agent}")
+    client_ip = get_client_ip(request)
+    user_agent = request.headers.get("user-agent", "")
+    ua_class = classify_user_agent(user_agent)
+    security_logger.info(
+        f"Consulta AJAX: code={code}, ip={client_ip}, client={ua_class.value}, user_agent={user_agent or 'unknown'}"
+    )
 
-    q = select(URL).where(URL.code == code)
-    result = await db.execute(q)
-    url = result.scalars().first()
+    url = await resolve_code(code)
 
     if not url:
         security_logger.warning(f"Código inexistente: {code} desde {client_ip}")
         raise HTTPException(status_code=404, detail="URL no encontrada")
 
+    if url.is_expired():
+        security_logger.info(f"Código expirado: {code} desde {client_ip}")
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="URL expirada")
+
     if not is_url_safe(url.original_url):
         security_logger.error(f"URL insegura: {url.original_url}")
         raise HTTPException(status_code=403, detail="URL bloqueada por seguridad")
 
-    # Registrar acceso (opcional para AJAX)
-    await db.execute(
-        update(URL)
-        .where(URL.id == url.id)
-        .values(access_count=URL.access_count + 1)
-    )
-    await db.commit()
+    if url.broken and settings.block_broken_targets:
+        security_logger.info(f"Destino roto: {code} desde {client_ip}")
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="El destino ya no está disponible")
+
+    if url.max_clicks is not None and not await consume_click(url):
+        security_logger.info(f"Código sin accesos disponibles: {code} desde {client_ip}")
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="URL sin accesos disponibles")
+
+    REDIRECT_CLIENTS.labels(ua_class.value).inc()
+    limited = url.max_clicks is not None
+    # Bots y previsualizadores no inflan el contador ni las estadísticas; los límites sí les aplican
+    if not is_automated(ua_class):
+        await record_access(db, url.id, consumed=limited)
+        click_publisher.add(code)
+        geo_clicks.add(url.id, client_ip)
+    elif limited:
+        # El uso queda en la BD: el barrido y la caché ven el límite agotado
+        await record_access(db, url.id, counted=False, consumed=True)
 
+    if url.broken:
+        # El cliente puede avisar antes de redirigir
+        return {"url": url.original_url, "broken": True}
     return {"url": url.original_url}
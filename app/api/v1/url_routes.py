@@ -1,21 +1,50 @@
-import secrets
-import string
-from typing import List
+import heapq
+import json
+from itertools import islice
+from typing import AsyncIterator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
 
+from app.api.deps import get_current_user, get_current_user_optional
 from app.db.session import get_session
+from app.db.sharding import make_url_id, scatter, shard_map, shard_session, users_session
 from app.db.models.url import URL
-from app.schemas.url import URLCreate, URLResponse, URLList
+from app.db.models.url_geo_stat import URLGeoStat
+from app.schemas.url import (
+    ALIAS_MAX_LENGTH, ALIAS_MIN_LENGTH, ALIAS_PATTERN, AliasAvailability, BulkSelection, BulkUpdate, GeoStat,
+    URLAccepted, URLCreate, URLResponse, URLList, URLPage
+)
 from app.core.security import set_security_headers
+from app.services.url_service import (
+    CachedURL, cache_urls, check_code_exists, decode_cursor, encode_cursor, find_duplicate, generate_short_code,
+    invalidate_urls, list_owner_urls, release_link_slots, reserve_link_slot
+)
+from app.services.user_service import has_role
+from app.services.alias_service import alias_available, alias_error, suggest_aliases
+from app.services.archive_service import delete_archived, get_archived
+from app.services.bulk_service import bulk_delete, bulk_update
+from app.services.etag_service import (
+    ALL_URLS_VERSION, affected_versions, bump_versions, check_not_modified, make_etag, owner_version,
+    params_digest, read_versions, url_version
+)
+from app.services.geoip_service import lookup_ip
+from app.services.user_agent_service import classify_user_agent
+from app.services.canonical_url import canonicalize_url, url_digest
+from app.services.snapshot_service import record_created, record_deleted
+from app.services.write_behind_service import accept_url, id_allocator, record_removed
+from app.core.client_ip import get_client_ip
+from app.core.config import get_settings
+from redis.exceptions import RedisError
 import logging
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 router = APIRouter()
+settings = get_settings()
 
 # Configuración del logger para seguridad
 security_logger = logging.getLogger("security")
@@ -23,48 +52,137 @@ security_logger = logging.getLogger("security")
 # Configuración del rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
-# Configuración para la generación de códigos cortos
-CODE_LENGTH = 6
-ALLOWED_CHARS = string.ascii_letters + string.digits
-
-def generate_short_code(length: int = CODE_LENGTH) -> str:
-    """Genera un código aleatorio para la URL corta."""
-    return ''.join(secrets.choice(ALLOWED_CHARS) for _ in range(length))
-
-async def check_code_exists(db: AsyncSession, code: str) -> bool:
-    """Verifica si un código ya existe en la base de datos."""
-    result = await db.execute(select(URL).where(URL.code == code))
-    return result.scalars().first() is not None
+def _forbid_moving(code: str) -> None:
+    if shard_map.is_moving(code):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El enlace se está moviendo de shard; inténtalo de nuevo en unos segundos",
+            headers={"Retry-After": str(int(settings.shard_map_refresh_interval) or 1)},
+        )
 
 @router.post("/", response_model=URLResponse, status_code=status.HTTP_201_CREATED)
 @limiter.limit("10/minute")
 async def create_url(
     url_data: URLCreate,
     request: Request,
-    db: AsyncSession = Depends(get_session)
+    dedupe: bool = False,
+    write_behind: bool = Query(False, alias="async"),
+    db: AsyncSession = Depends(get_session),
+    current_user = Depends(get_current_user_optional)
 ):
-    """Crea una nueva URL corta."""
+    """
+    Crea una nueva URL corta; con `dedupe=true` reutiliza el código de un destino idéntico.
+
+    Con `async=true` responde 202 en cuanto el enlace está en Redis y la fila se
+    guarda en Postgres en segundo plano. Con `alias` el código es el indicado
+    (409 si está ocupado) y el alta es siempre síncrona.
+    """
     # Registrar la creación para análisis de seguridad
-    client_ip = request.client.host if request.client else "unknown"
-    user_agent = request.headers.get("user-agent", "unknown")
-    security_logger.info(f"Intento de creación de URL: ip={client_ip}, user_agent={user_agent}")
+    client_ip = get_client_ip(request)
+    user_agent = request.headers.get("user-agent", "")
+    geo = lookup_ip(client_ip)
+    security_logger.info(
+        f"Intento de creación de URL: ip={client_ip}, country={geo.country if geo else '-'}, "
+        f"asn={geo.asn if geo else '-'}, client={classify_user_agent(user_agent).value}, "
+        f"user_agent={user_agent or 'unknown'}"
+    )
+
+    original_url = str(url_data.original_url)
+    canonical_url = canonicalize_url(original_url)
+    url_hash = url_digest(canonical_url)
+    owner_id = current_user.id if current_user else None
+    alias = url_data.alias
+
+    if alias:
+        reason = alias_error(alias)
+        if reason:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=reason)
+        _forbid_moving(alias)
+        if not await alias_available(db, alias):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El alias ya está en uso")
+
+    # Los enlaces con límites o alias son siempre nuevos
+    if dedupe and not alias and url_data.expires_at is None and url_data.max_clicks is None:
+        existing = await find_duplicate(db, canonical_url, url_hash, owner_id)
+        if existing:
+            response = JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content=URLResponse.from_orm(existing).model_dump(mode="json")
+            )
+            set_security_headers(response)
+            return response
 
-    # Generar un código único
-    code = generate_short_code()
-    while await check_code_exists(db, code):
+    # Sin consultar la BD no se puede garantizar un alias: solo alta síncrona
+    if write_behind and not alias:
+        # La cuota se comprueba contra el contador ya confirmado: las altas en vuelo no cuentan
+        if current_user and 0 < settings.max_links_per_user <= current_user.link_count:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Cuota de enlaces alcanzada"
+            )
+        try:
+            pending = await accept_url(
+                original_url, url_hash, owner_id, url_data.expires_at, url_data.max_clicks
+            )
+        except RedisError as exc:
+            # Sin Redis no hay cola duradera: se crea por el camino síncrono
+            security_logger.warning(f"Alta diferida no disponible, se crea de forma síncrona: {exc}")
+        else:
+            response = JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content=URLAccepted(
+                    id=pending.id,
+                    code=pending.code,
+                    original_url=pending.original_url,
+                    owner_id=pending.owner_id,
+                ).model_dump(mode="json")
+            )
+            set_security_headers(response)
+            return response
+
+    # Cuota por usuario comprobada contra el contador, en la misma transacción que el alta
+    if owner_id is not None and not await reserve_link_slot(db, owner_id):
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Cuota de enlaces alcanzada"
+        )
+
+    # Generar un código único; el alias ya se comprobó y lo confirma la restricción única
+    code = alias or generate_short_code()
+    while not alias and await check_code_exists(db, code):
         code = generate_short_code()
 
-    # Crear la nueva URL
+    # Crear la nueva URL; con shards el id lleva el bucket del código
     new_url = URL(
-        original_url=str(url_data.original_url),
+        id=make_url_id(await id_allocator.next_id(), code) if shard_map.sharded else None,
+        original_url=original_url,
         code=code,
-        access_count=0
+        url_hash=url_hash,
+        access_count=0,
+        consumed_clicks=0,
+        expires_at=url_data.expires_at,
+        max_clicks=url_data.max_clicks,
+        owner_id=owner_id,
     )
 
-    # Guardar en la base de datos
-    db.add(new_url)
+    # Guardar en la base de datos; en el shard 0 en la misma transacción que la cuota
+    try:
+        async with shard_session(shard_map.shard_for_code(code), db) as session:
+            session.add(new_url)
+            await session.commit()
+            await session.refresh(new_url)
+    except IntegrityError:
+        # Otra alta se llevó el código entre la comprobación y la inserción
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El código ya está en uso")
     await db.commit()
-    await db.refresh(new_url)
+    await bump_versions(affected_versions([(new_url.id, owner_id)]))
+    entry = CachedURL.from_model(new_url)
+    if not entry.is_limited:
+        record_created(new_url.code, new_url.id, new_url.original_url)
+    # Escritura directa en caché: reemplaza cualquier entrada negativa previa
+    await cache_urls([(new_url.code, entry)], {new_url.id: 0})
 
     # Crear respuesta con cabeceras de seguridad
     response = JSONResponse(
@@ -81,28 +199,119 @@ async def create_url(
 @limiter.limit("30/minute")
 async def list_urls(
     request: Request,
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(100, ge=1),
+    after_id: Optional[int] = Query(None, ge=0),
     db: AsyncSession = Depends(get_session)
 ):
-    """Lista todas las URLs creadas con paginación."""
-    query = select(URL).offset(skip).limit(limit)
-    result = await db.execute(query)
-    urls = result.scalars().all()
+    """
+    Lista todas las URLs por id; admite If-None-Match.
+
+    La página siguiente se pide con `after_id` igual a la cabecera
+    X-Next-After-Id. `skip` solo se admite sin shards.
+    """
+    versions = await read_versions(ALL_URLS_VERSION)
+    etag = make_etag("l", params_digest(skip, limit, after_id), versions[0]) if versions else None
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    query = select(URL).order_by(URL.id).limit(limit)
+    if after_id is not None:
+        query = query.where(URL.id > after_id)
+
+    if not shard_map.sharded:
+        urls = list((await db.execute(query.offset(skip))).scalars())
+    elif skip:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Con shards la paginación es por after_id"
+        )
+    else:
+        # Cada shard aporta su página siguiente al cursor y se mezclan por id
+        async def page(session: AsyncSession) -> list[URL]:
+            return list((await session.execute(query)).scalars())
 
+        urls = list(islice(heapq.merge(*await scatter(page, db), key=lambda url: url.id), limit))
+
+    if len(urls) == limit:
+        response.headers["X-Next-After-Id"] = str(urls[-1].id)
     return urls
 
+@router.get("/mine", response_model=URLPage)
+@limiter.limit("30/minute")
+async def list_my_urls(
+    request: Request,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_session),
+    current_user = Depends(get_current_user)
+):
+    """Lista las URLs del usuario autenticado con paginación por cursor; admite If-None-Match."""
+    versions = await read_versions(owner_version(current_user.id))
+    etag = make_etag("m", params_digest(limit, cursor), versions[0]) if versions else None
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+
+    urls = await list_owner_urls(db, current_user.id, limit, after)
+    next_cursor = encode_cursor(urls[-1]) if len(urls) == limit else None
+
+    return URLPage(
+        items=[URLList.model_validate(url) for url in urls],
+        next_cursor=next_cursor,
+        total=current_user.link_count,
+    )
+
+@router.get("/aliases/{alias}", response_model=AliasAvailability)
+@limiter.limit("30/minute")
+async def check_alias(
+    request: Request,
+    alias: str = Path(..., min_length=ALIAS_MIN_LENGTH, max_length=ALIAS_MAX_LENGTH, pattern=ALIAS_PATTERN),
+    suggestions: int = Query(5, ge=0, le=20),
+    db: AsyncSession = Depends(get_session)
+):
+    """Indica si un alias está libre y, si no, propone alternativas libres."""
+    available = (
+        alias_error(alias) is None and not shard_map.is_moving(alias) and await alias_available(db, alias)
+    )
+    # Con una palabra vetada ninguna variante es válida y no hay sugerencias
+    return AliasAvailability(
+        alias=alias,
+        available=available,
+        suggestions=[] if available or not suggestions else await suggest_aliases(db, alias, suggestions),
+    )
+
 @router.get("/{url_id}", response_model=URLResponse)
 @limiter.limit("30/minute")
 async def get_url(
     url_id: int,
     request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_session)
 ):
-    """Obtiene los detalles de una URL específica por su ID."""
-    query = select(URL).where(URL.id == url_id)
-    result = await db.execute(query)
-    url = result.scalars().first()
+    """Obtiene los detalles de una URL específica por su ID; admite If-None-Match."""
+    # El sello se lee antes que la fila: una escritura posterior siempre lo cambia
+    versions = await read_versions(url_version(url_id))
+    etag = make_etag("u", url_id, versions[0]) if versions else None
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    async with shard_session(shard_map.shard_for_id(url_id), db) as session:
+        result = await session.execute(select(URL).where(URL.id == url_id))
+        url = result.scalars().first() or await get_archived(session, url_id)
 
     if not url:
         raise HTTPException(
@@ -112,31 +321,143 @@ async def get_url(
 
     return url
 
+@router.get("/{url_id}/geo", response_model=List[GeoStat])
+@limiter.limit("30/minute")
+async def get_url_geo_stats(
+    url_id: int,
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_session),
+    current_user = Depends(get_current_user_optional)
+):
+    """Clics por país y ASN de una URL, de más a menos."""
+    async with shard_session(shard_map.shard_for_id(url_id), db) as session:
+        result = await session.execute(select(URL.owner_id).where(URL.id == url_id))
+        url = result.first() or await get_archived(session, url_id)
+        if url:
+            result = await session.execute(
+                select(URLGeoStat.country, URLGeoStat.asn, URLGeoStat.clicks)
+                .where(URLGeoStat.url_id == url_id)
+                .order_by(URLGeoStat.clicks.desc())
+                .limit(limit)
+            )
+            stats = [GeoStat(country=r.country, asn=r.asn, clicks=r.clicks) for r in result]
+    if not url:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="URL no encontrada"
+        )
+
+    # Mismo criterio que para eliminar: el origen de los visitantes es del propietario
+    if url.owner_id is not None and not (
+        current_user and (current_user.id == url.owner_id or has_role(current_user, "admin"))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos sobre esta URL"
+        )
+
+    return stats
+
 @router.delete("/{url_id}", status_code=status.HTTP_204_NO_CONTENT)
 @limiter.limit("5/minute")
 async def delete_url(
     url_id: int,
     request: Request,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_session),
+    current_user = Depends(get_current_user_optional)
 ):
     """Elimina una URL corta por su ID."""
     # Registrar el intento de eliminación para análisis de seguridad
-    client_ip = request.client.host if request.client else "unknown"
+    client_ip = get_client_ip(request)
     security_logger.info(f"Intento de eliminación de URL: id={url_id}, ip={client_ip}")
 
-    # Verificar que la URL existe
-    query = select(URL).where(URL.id == url_id)
-    result = await db.execute(query)
-    url = result.scalars().first()
+    shard = shard_map.shard_for_id(url_id)
+    async with shard_session(shard, db) as session:
+        # Verificar que la URL existe
+        query = select(URL).where(URL.id == url_id)
+        result = await session.execute(query)
+        url = result.scalars().first()
+        archived = url is None
+        if archived:
+            url = await get_archived(session, url_id)
 
-    if not url:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="URL no encontrada"
-        )
+        if not url:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="URL no encontrada"
+            )
 
-    # Eliminar la URL
-    await db.execute(delete(URL).where(URL.id == url_id))
-    await db.commit()
+        # Los enlaces con propietario solo los elimina su dueño o un admin
+        if url.owner_id is not None and not (
+            current_user and (current_user.id == url.owner_id or has_role(current_user, "admin"))
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permisos sobre esta URL"
+            )
+        _forbid_moving(url.code)
+
+        # Eliminar la URL
+        if archived:
+            await delete_archived(session, url_id)
+        else:
+            await session.execute(delete(URL).where(URL.id == url_id))
+        await session.execute(delete(URLGeoStat).where(URLGeoStat.url_id == url_id))
+        async with users_session(shard, session) as users:
+            await release_link_slots(users, [url.owner_id])
+        await session.commit()
+    await invalidate_urls([(url_id, url.code)])
+    await record_removed([(url_id, url.code)])
+    await bump_versions(affected_versions([(url_id, url.owner_id)]))
+    record_deleted(url.code)
 
     return None
+
+def _ndjson(items: AsyncIterator[dict]) -> StreamingResponse:
+    """Un resultado JSON por línea, enviado en cuanto se conoce."""
+    async def lines():
+        async for item in items:
+            yield json.dumps(item, separators=(",", ":")) + "\n"
+
+    response = StreamingResponse(lines(), media_type="application/x-ndjson")
+    set_security_headers(response)
+    return response
+
+@router.post("/bulk-delete")
+@limiter.limit("5/minute")
+async def bulk_delete_urls(
+    selection: BulkSelection,
+    request: Request,
+    current_user = Depends(get_current_user)
+):
+    """
+    Elimina enlaces por ids, códigos o filtro en lotes de una sola sentencia.
+
+    Responde NDJSON: una línea por enlace (`deleted`, `not_found` o `moving`)
+    y una última con el resumen. Solo los administradores borran enlaces ajenos.
+    """
+    client_ip = get_client_ip(request)
+    security_logger.info(
+        f"Eliminación masiva: user={current_user.id}, ip={client_ip}, "
+        f"ids={len(selection.ids or [])}, codes={len(selection.codes or [])}, filter={selection.filter}"
+    )
+    owner_id = None if has_role(current_user, "admin") else current_user.id
+    return _ndjson(bulk_delete(selection, owner_id))
+
+@router.post("/bulk-update")
+@limiter.limit("5/minute")
+async def bulk_update_urls(
+    changes: BulkUpdate,
+    request: Request,
+    current_user = Depends(get_current_user)
+):
+    """Cambia el destino o la expiración de varios enlaces; responde como `bulk-delete`."""
+    client_ip = get_client_ip(request)
+    security_logger.info(
+        f"Cambio masivo: user={current_user.id}, ip={client_ip}, "
+        f"ids={len(changes.ids or [])}, codes={len(changes.codes or [])}, filter={changes.filter}, "
+        f"fields={sorted(changes.model_fields_set - {'ids', 'codes', 'filter'})}"
+    )
+    owner_id = None if has_role(current_user, "admin") else current_user.id
+    return _ndjson(bulk_update(changes, owner_id))
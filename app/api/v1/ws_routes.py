@@ -1,19 +1,34 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
-from jose import JWTError
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, status
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.core.prometheus import CLICK_STREAM_CONNECTIONS
 from app.core.security import decode_access_token
+from app.db.models.url import URL
+from app.db.session import async_session, shard_sessions
+from app.db.sharding import scatter, shard_map
+from app.services.click_stream_service import Subscription, click_hub
+from app.services.user_service import get_user_by_id, has_role
 
 router = APIRouter()
+settings = get_settings()
 
-@router.websocket("/ws/echo")
-async def websocket_echo(websocket: WebSocket, token: str = Query(...)):
+async def _authenticate(websocket: WebSocket, token: str) -> Optional[int]:
+    """Id del usuario del token; cierra la conexión y devuelve None si no es válido."""
     try:
         payload = decode_access_token(token)
-        user_id = payload.get("sub")
-        if not user_id:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-    except JWTError:
+        return int(payload.get("sub"))
+    except (HTTPException, TypeError, ValueError):
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return None
+
+@router.websocket("/ws/echo")
+async def websocket_echo(websocket: WebSocket, token: str = Query(...)):
+    if await _authenticate(websocket, token) is None:
         return
     await websocket.accept()
     try:
@@ -22,3 +37,97 @@ async def websocket_echo(websocket: WebSocket, token: str = Query(...)):
             await websocket.send_text(f"Echo: {data}")
     except WebSocketDisconnect:
         pass
+
+# Clics en vivo
+
+async def _owner_codes(user_id: int) -> set[str]:
+    async def codes(session) -> list[str]:
+        result = await session.execute(select(URL.code).where(URL.owner_id == user_id))
+        return list(result.scalars())
+
+    return {code for shard_codes in await scatter(codes) for code in shard_codes}
+
+async def _can_watch(user_id: int, code: str) -> bool:
+    row = None
+    for shard in shard_map.shards_for_code(code):
+        async with shard_sessions[shard]() as session:
+            result = await session.execute(select(URL.owner_id).where(URL.code == code))
+            row = result.first()
+        if row is not None:
+            break
+    if row is None:
+        return False
+    if row.owner_id == user_id:
+        return True
+    async with async_session() as session:
+        user = await get_user_by_id(session, user_id)
+    return user is not None and has_role(user, "admin")
+
+async def _receive_until_closed(websocket: WebSocket) -> None:
+    # El cliente no envía datos; leer solo sirve para detectar el cierre
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+async def _send_frames(
+    websocket: WebSocket,
+    subscription: Subscription,
+    refresh_codes: Optional[Callable[[], Awaitable[set[str]]]] = None,
+) -> None:
+    last_refresh = time.monotonic()
+    while True:
+        if await subscription.wait(settings.click_stream_owner_refresh if refresh_codes else None):
+            # Ventana de agrupación: los eventos que lleguen mientras tanto van en el mismo frame
+            await asyncio.sleep(settings.click_stream_frame_interval)
+            frame = subscription.drain()
+            if frame:
+                try:
+                    await asyncio.wait_for(websocket.send_json(frame), settings.click_stream_send_timeout)
+                except asyncio.TimeoutError:
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                    return
+        if refresh_codes and time.monotonic() - last_refresh >= settings.click_stream_owner_refresh:
+            click_hub.update(subscription, await refresh_codes())
+            last_refresh = time.monotonic()
+
+async def _stream_clicks(
+    websocket: WebSocket,
+    codes: set[str],
+    refresh_codes: Optional[Callable[[], Awaitable[set[str]]]] = None,
+) -> None:
+    await websocket.accept()
+    subscription = click_hub.subscribe(codes)
+    CLICK_STREAM_CONNECTIONS.inc()
+    tasks = {
+        asyncio.create_task(_receive_until_closed(websocket)),
+        asyncio.create_task(_send_frames(websocket, subscription, refresh_codes)),
+    }
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        click_hub.unsubscribe(subscription)
+        CLICK_STREAM_CONNECTIONS.dec()
+
+@router.websocket("/ws/links/{code}/clicks")
+async def link_clicks(websocket: WebSocket, code: str, token: str = Query(...)):
+    """Clics de un enlace; solo para su propietario o un admin."""
+    user_id = await _authenticate(websocket, token)
+    if user_id is None:
+        return
+    if not await _can_watch(user_id, code):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await _stream_clicks(websocket, {code})
+
+@router.websocket("/ws/clicks")
+async def owner_clicks(websocket: WebSocket, token: str = Query(...)):
+    """Clics de todos los enlaces del usuario; los enlaces nuevos se incorporan periódicamente."""
+    user_id = await _authenticate(websocket, token)
+    if user_id is None:
+        return
+    await _stream_clicks(websocket, await _owner_codes(user_id), lambda: _owner_codes(user_id))
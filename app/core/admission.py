@@ -0,0 +1,118 @@
+"""
+Control de admisión.
+
+Combina tres señales (lag del event loop, espera por conexiones de BD y
+peticiones en curso) en una presión normalizada, donde 1.0 es el umbral
+configurado. Las rutas de menor prioridad se rechazan antes: primero el
+listado y la documentación, luego el resto de la API y por último las
+redirecciones.
+"""
+import asyncio
+import math
+from enum import IntEnum
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+
+from app.core.config import get_settings
+from app.core.prometheus import ADMISSION_PRESSURE, ADMISSION_SHED
+from app.db.session import pool_wait
+
+settings = get_settings()
+
+class Priority(IntEnum):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+
+# Presión a partir de la cual se rechaza cada prioridad
+SHED_AT = {Priority.LOW: 1.0, Priority.NORMAL: 1.5, Priority.HIGH: 2.0}
+
+# Nunca se rechazan: el orquestador y Prometheus deben poder ver la saturación
+EXEMPT_PATHS = ("/health", "/metrics")
+LOW_PRIORITY = {
+    ("GET", "/api/v1/urls/"),
+    ("GET", "/api/v1/users/"),
+    ("GET", "/docs"),
+    ("GET", "/redoc"),
+    ("GET", "/openapi.json"),
+}
+HIGH_PRIORITY_PREFIXES = ("/r/",)
+
+def route_priority(method: str, path: str) -> Priority:
+    if (method, path) in LOW_PRIORITY:
+        return Priority.LOW
+    if path.startswith(HIGH_PRIORITY_PREFIXES):
+        return Priority.HIGH
+    return Priority.NORMAL
+
+def _ratio(value: float, limit: float) -> float:
+    return value / limit if limit > 0 else 0.0
+
+class AdmissionController:
+    """Mantiene las señales de carga y decide si una petición entra."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.pool_wait = 0.0
+
+    async def sample(self) -> None:
+        """Trabajo periódico: mide el lag del loop y la espera del pool desde la última muestra."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        # Lo que tarda en volver el control mide la cola de callbacks pendientes
+        await asyncio.sleep(0)
+        self.loop_lag = loop.time() - start
+        self.pool_wait = pool_wait.sample()
+        ADMISSION_PRESSURE.set(self.pressure())
+
+    def pressure(self) -> float:
+        return max(
+            _ratio(self.loop_lag * 1000, settings.admission_loop_lag_ms),
+            _ratio(self.pool_wait * 1000, settings.admission_pool_wait_ms),
+            _ratio(self.in_flight, settings.admission_max_in_flight),
+        )
+
+    def admits(self, priority: Priority) -> bool:
+        return self.pressure() < SHED_AT[priority]
+
+    def ready(self) -> bool:
+        """Disponible mientras se sigan aceptando peticiones de prioridad normal."""
+        return self.admits(Priority.NORMAL)
+
+    def retry_after(self) -> int:
+        return max(1, min(30, math.ceil(self.pressure())))
+
+    def signals(self) -> dict:
+        return {
+            "pressure": round(self.pressure(), 3),
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "pool_wait_ms": round(self.pool_wait * 1000, 1),
+            "pool_waiting": pool_wait.waiting(),
+            "in_flight": self.in_flight,
+        }
+
+admission = AdmissionController()
+
+def setup_admission(app: FastAPI):
+    @app.middleware("http")
+    async def admission_middleware(request: Request, call_next):
+        path = request.url.path
+        if path.startswith(EXEMPT_PATHS):
+            return await call_next(request)
+
+        priority = route_priority(request.method, path)
+        if not admission.admits(priority):
+            ADMISSION_SHED.labels(priority.name.lower()).inc()
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Servicio saturado, reintente más tarde"},
+                headers={"Retry-After": str(admission.retry_after())},
+            )
+
+        admission.in_flight += 1
+        try:
+            return await call_next(request)
+        finally:
+            admission.in_flight -= 1
@@ -1,15 +1,128 @@
 from celery import Celery
+from celery.utils.time import get_exponential_backoff_interval
+from email.message import EmailMessage
+from typing import Iterable, Optional
+import logging
 import os
+import smtplib
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
+# SMTP (si no hay host configurado los correos solo se registran en el log)
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_FROM = os.getenv("SMTP_FROM", "no-reply@example.com")
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+
+logger = logging.getLogger(__name__)
+
 celery_app = Celery(
     "worker",
     broker=REDIS_URL,
     backend=REDIS_URL,
 )
 
+# Nadie consulta los resultados: no escribirlos en el backend
+celery_app.conf.task_ignore_result = True
+
+# Conexiones a Redis acotadas y con los mismos timeouts que el pool de la app
+REDIS_CELERY_MAX_CONNECTIONS = int(os.getenv("REDIS_CELERY_MAX_CONNECTIONS", "4"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "2"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+celery_app.conf.update(
+    broker_pool_limit=REDIS_CELERY_MAX_CONNECTIONS,
+    broker_transport_options={
+        "max_connections": REDIS_CELERY_MAX_CONNECTIONS,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+    },
+    redis_max_connections=REDIS_CELERY_MAX_CONNECTIONS,
+    redis_socket_timeout=REDIS_SOCKET_TIMEOUT,
+    redis_socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+    redis_backend_health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+)
+
+# Fallos de conexión: el lote se reintenta desde el primer correo que no salió
+RETRYABLE_SMTP_ERRORS = (
+    smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError,
+)
+# Respuesta "servicio no disponible, cerrando el canal": el servidor corta tras ella
+SMTP_CLOSING = 421
+
+class DeliveryInterrupted(Exception):
+    """La conexión se perdió tras procesar `done` correos del lote."""
+
+    def __init__(self, done: int):
+        super().__init__(f"Envío interrumpido tras {done} correos")
+        self.done = done
+
+def deliver_emails(
+    messages: Iterable[dict],
+    host: str = SMTP_HOST,
+    port: int = SMTP_PORT,
+    username: Optional[str] = SMTP_USER,
+    password: Optional[str] = SMTP_PASSWORD,
+    use_tls: bool = SMTP_USE_TLS,
+    sender: str = SMTP_FROM,
+) -> int:
+    """
+    Envía varios correos reutilizando una sola conexión SMTP; devuelve cuántos se enviaron.
+
+    Si la conexión falla lanza DeliveryInterrupted con los correos ya procesados
+    (enviados o rechazados), para no repetirlos al reintentar.
+    """
+    messages = list(messages)
+    if not host:
+        for message in messages:
+            print(f"[Celery] Sending email to {message['to_email']}: {message['subject']}\n{message['body']}")
+        return len(messages)
+
+    sent = done = 0
+    try:
+        with smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT) as smtp:
+            if use_tls:
+                smtp.starttls()
+            if username:
+                smtp.login(username, password)
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = sender
+                email["To"] = message["to_email"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                try:
+                    smtp.send_message(email)
+                    sent += 1
+                except smtplib.SMTPRecipientsRefused as exc:
+                    # Un destinatario inválido no debe frenar el resto del lote
+                    logger.warning(f"Correo rechazado para {message['to_email']}: {exc}")
+                except smtplib.SMTPResponseException as exc:
+                    # Remitente o contenido rechazados (552, 554...): tampoco
+                    if exc.smtp_code == SMTP_CLOSING:
+                        raise DeliveryInterrupted(done) from exc
+                    logger.warning(f"Correo rechazado para {message['to_email']}: {exc}")
+                done += 1
+    except RETRYABLE_SMTP_ERRORS as exc:
+        raise DeliveryInterrupted(done) from exc
+    return sent
+
+@celery_app.task(bind=True, max_retries=5)
+def send_email_batch_task(self, messages: list[dict]):
+    try:
+        deliver_emails(messages)
+    except DeliveryInterrupted as exc:
+        # Solo se reencolan los correos que no salieron
+        countdown = get_exponential_backoff_interval(
+            factor=1, retries=self.request.retries, maximum=600, full_jitter=True
+        )
+        raise self.retry(args=(messages[exc.done:],), exc=exc.__cause__, countdown=countdown)
+
 @celery_app.task
 def send_email_task(to_email: str, subject: str, body: str):
-    # Aquí iría la integración real con SendGrid, etc.
-    print(f"[Celery] Sending email to {to_email}: {subject}\n{body}")
+    deliver_emails([{"to_email": to_email, "subject": subject, "body": body}])
@@ -0,0 +1,34 @@
+"""IP del cliente teniendo en cuenta los proxies de confianza."""
+import ipaddress
+from functools import lru_cache
+
+from fastapi import Request
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+_PROXIES = tuple(ipaddress.ip_network(proxy, strict=False) for proxy in settings.trusted_proxies)
+
+@lru_cache(maxsize=1024)
+def _is_trusted(ip: str) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in _PROXIES)
+
+def get_client_ip(request: Request) -> str:
+    """
+    Dirección del cliente. Si la conexión llega de un proxy de confianza se
+    usa la última IP de X-Forwarded-For que no sea a su vez de un proxy: las
+    anteriores las puede escribir el propio cliente.
+    """
+    host = request.client.host if request.client else None
+    if host and _PROXIES and _is_trusted(host):
+        forwarded = request.headers.get("x-forwarded-for", "")
+        for candidate in reversed(forwarded.split(",")):
+            candidate = candidate.strip()
+            if candidate and not _is_trusted(candidate):
+                return candidate
+    return host or "unknown"
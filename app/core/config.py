@@ -21,6 +21,121 @@ class Settings(BaseSettings):
     redis_host: str = Field(default="redis")
     redis_port: int = Field(default=6379)
 
+    # Instrumentación SQL: umbral de consulta lenta (0 = sin log) y cabecera Server-Timing
+    slow_query_ms: float = Field(default=200.0)
+    sql_server_timing: bool = Field(default=True)
+
+    # Profiler por muestreo (endpoint /debug/profile y cabecera X-Profile)
+    profiler_max_seconds: float = Field(default=60.0)
+    profiler_request_interval_ms: float = Field(default=1.0)
+
+    # Pools de conexiones
+    db_pool_size: int = Field(default=10)
+    db_max_overflow: int = Field(default=10)
+    db_pool_timeout: float = Field(default=30.0)
+    # Resolver códigos con sentencias preparadas de asyncpg, sin ORM (no compatible con pgbouncer en modo transacción)
+    db_fast_lookup: bool = Field(default=False)
+    # Shards de enlaces: bases Postgres adicionales (la principal es el shard 0)
+    db_shard_urls: list[str] = Field(default=[])
+    # Cada worker relee el mapa bucket→shard con este intervalo
+    shard_map_refresh_interval: float = Field(default=10.0)
+    redis_max_connections: int = Field(default=20)
+    redis_warmup_connections: int = Field(default=10)
+    # Espera máxima por una conexión libre de Redis con el pool agotado
+    redis_pool_timeout: float = Field(default=5.0)
+    redis_socket_timeout: float = Field(default=2.0)
+    redis_socket_connect_timeout: float = Field(default=2.0)
+    redis_health_check_interval: int = Field(default=30)
+    # Claves por comando en los borrados masivos
+    redis_batch_size: int = Field(default=500)
+    # Conexiones propias del rate limiter (cliente síncrono) y de Celery al publicar
+    redis_limiter_max_connections: int = Field(default=4)
+    redis_celery_max_connections: int = Field(default=4)
+
+    # Caché de redirecciones
+    redirect_cache_ttl: int = Field(default=3600)
+    cache_warmup_top_n: int = Field(default=1000)
+    # TTL de las entradas negativas (códigos inexistentes)
+    redirect_negative_cache_ttl: int = Field(default=30)
+    # Coordinar misses entre workers con un lock corto en Redis
+    singleflight_redis_lock: bool = Field(default=False)
+    singleflight_lock_ttl_ms: int = Field(default=2000)
+    # Segundos entre volcados del contador de accesos (0 = escritura inmediata)
+    click_flush_interval: float = Field(default=1.0)
+    # User-agents distintos cuya clasificación se memoiza por worker
+    user_agent_cache_size: int = Field(default=4096)
+    # Vida de los sellos de versión de los ETags de lectura en Redis
+    etag_version_ttl: int = Field(default=86400)
+
+    # Envío de correos por lotes
+    email_batch_size: int = Field(default=100)
+    email_flush_interval: float = Field(default=0.2)
+
+    # Cuota de enlaces por usuario (0 = sin límite)
+    max_links_per_user: int = Field(default=0)
+    # Palabras vetadas en alias además de las incluidas, una por línea; *palabra* también como subcadena
+    alias_blocked_words_path: str = Field(default="")
+
+    # Borrados y cambios masivos: filas por sentencia y máximo por filtro
+    bulk_chunk_size: int = Field(default=500)
+    bulk_max_filter_rows: int = Field(default=10000)
+
+    # Barrido de enlaces expirados
+    expired_purge_interval: float = Field(default=60.0)
+    expired_purge_batch_size: int = Field(default=1000)
+
+    # Archivado de enlaces sin accesos recientes (0 días lo deshabilita)
+    archive_after_days: int = Field(default=30)
+    archive_interval: float = Field(default=3600.0)
+    archive_batch_size: int = Field(default=1000)
+
+    # Comprobación de destinos en segundo plano (intervalo 0 = deshabilitada)
+    link_health_interval: float = Field(default=0.0)
+    link_health_max_urls: int = Field(default=5000)  # por ejecución
+    link_health_batch_size: int = Field(default=200)
+    link_health_concurrency: int = Field(default=50)  # conexiones abiertas en total
+    link_health_per_host: int = Field(default=2)
+    link_health_rate: float = Field(default=50.0)  # peticiones por segundo (0 = sin límite)
+    link_health_timeout: float = Field(default=10.0)
+    link_health_recheck_hours: float = Field(default=24.0)
+    link_health_cache_ttl: float = Field(default=3600.0)
+    # Responder 410 en vez de redirigir a destinos que devuelven 404/410
+    block_broken_targets: bool = Field(default=False)
+
+    # Altas diferidas: Redis primero, Postgres por lotes
+    write_behind_batch_size: int = Field(default=500)
+    write_behind_flush_interval: float = Field(default=0.2)
+    write_behind_id_block: int = Field(default=100)
+    # Entradas sin confirmar durante este tiempo se reasignan a otro worker
+    write_behind_claim_idle_ms: int = Field(default=30000)
+    write_behind_reconcile_interval: float = Field(default=60.0)
+    write_behind_reconcile_grace: float = Field(default=300.0)
+
+    # Clics en vivo por WebSocket (0 = no se publican)
+    click_stream_publish_interval: float = Field(default=0.25)
+    click_stream_frame_interval: float = Field(default=0.5)
+    click_stream_queue_size: int = Field(default=100)
+    click_stream_send_timeout: float = Field(default=5.0)
+    click_stream_owner_refresh: float = Field(default=30.0)
+
+    # Control de admisión: umbrales de cada señal (0 = señal ignorada)
+    admission_sample_interval: float = Field(default=0.25)
+    admission_loop_lag_ms: float = Field(default=100.0)
+    admission_pool_wait_ms: float = Field(default=250.0)
+    admission_max_in_flight: int = Field(default=500)
+
+    # Snapshot compartido código→URL (deshabilitado si no hay ruta)
+    snapshot_path: Optional[str] = Field(default=None)
+    snapshot_refresh_interval: float = Field(default=5.0)
+    snapshot_compact_interval: float = Field(default=60.0)
+    snapshot_rebuild_interval: float = Field(default=3600.0)
+
+    # Base GeoIP local compilada con `python -m app.services.geoip_service` (deshabilitada si no hay ruta)
+    geoip_db_path: Optional[str] = Field(default=None)
+    geoip_flush_interval: float = Field(default=5.0)
+    # Proxies cuyo X-Forwarded-For se acepta (IPs o redes CIDR)
+    trusted_proxies: list[str] = Field(default=[])
+
     # Application
     app_port: int = Field(default=8000)
     secret_key: SecretStr = Field(default="your-secret-key")
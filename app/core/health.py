@@ -1,7 +1,27 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+
+from app.core.admission import admission
 
 router = APIRouter()
 
 @router.get("/health", tags=["health"])
 async def health_check():
     return {"status": "ok"}
+
+@router.get("/health/ready", tags=["health"])
+async def readiness_check(request: Request):
+    """Solo reporta disponibilidad tras el precalentamiento y mientras no haya saturación."""
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "starting"},
+        )
+    signals = admission.signals()
+    if not admission.ready():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "overloaded", **signals},
+            headers={"Retry-After": str(admission.retry_after())},
+        )
+    return {"status": "ready", **signals}
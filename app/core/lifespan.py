@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+from fastapi import FastAPI
+
+from app.core.admission import admission
+from app.core.config import get_settings
+from app.core.redis_client import close_redis, warm_up_redis_pool
+from app.db.session import async_session, close_engine, shard_sessions, warm_up_pool
+from app.db.sharding import refresh_shard_map, shard_map
+from app.services.click_stream_service import click_hub, click_publisher
+from app.services.geoip_service import geo_clicks
+from app.services.snapshot_service import snapshot_store
+from app.services.url_service import click_buffer, warm_up_cache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+ShutdownHook = Callable[[], Awaitable[None]]
+StartupHook = Callable[[], Awaitable[None]]
+PeriodicJob = Callable[[], Awaitable[object]]
+
+# Tareas que arrancan tras el precalentamiento
+_startup_hooks: list[StartupHook] = []
+# Tareas que deben vaciar trabajo pendiente antes de cerrar los pools
+_shutdown_hooks: list[ShutdownHook] = []
+# Trabajos en segundo plano: (nombre, intervalo en segundos, corrutina)
+_periodic_jobs: list[tuple[str, float, PeriodicJob]] = []
+_running_tasks: list[asyncio.Task] = []
+
+def register_startup_hook(hook: StartupHook) -> StartupHook:
+    """Registra una corrutina que se ejecuta al arrancar, tras precalentar los pools."""
+    if hook not in _startup_hooks:
+        _startup_hooks.append(hook)
+    return hook
+
+def register_shutdown_hook(hook: ShutdownHook) -> ShutdownHook:
+    """Registra una corrutina que se ejecuta al apagar, antes de cerrar los pools."""
+    if hook not in _shutdown_hooks:
+        _shutdown_hooks.append(hook)
+    return hook
+
+def register_periodic_job(name: str, interval: float, job: PeriodicJob) -> None:
+    """Registra un trabajo que se ejecuta cada `interval` segundos mientras la app está viva."""
+    # Cada punto de entrada registra sus trabajos; importar dos no los duplica
+    if interval > 0 and all(registered != name for registered, _, _ in _periodic_jobs):
+        _periodic_jobs.append((name, interval, job))
+
+async def _run_periodic(name: str, interval: float, job: PeriodicJob) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await job()
+        except Exception as exc:
+            logger.error(f"Error en el trabajo periódico {name}: {exc}", exc_info=True)
+
+async def _snapshot_refresh() -> None:
+    # En el hilo del loop: las búsquedas leen el mismo índice sin locks
+    snapshot_store.refresh()
+
+async def _snapshot_compact() -> None:
+    await asyncio.to_thread(snapshot_store.compact)
+
+async def _snapshot_rebuild() -> None:
+    await snapshot_store.rebuild(shard_sessions)
+
+async def _start_email_queue() -> None:
+    from app.services.email_service import email_queue
+
+    email_queue.start()
+
+def register_redirect_jobs() -> None:
+    """Trabajos que necesita cualquier proceso que sirva redirecciones."""
+    register_periodic_job("admission-sample", settings.admission_sample_interval, admission.sample)
+
+    # Mapa bucket→shard: los movimientos se ven en todos los workers tras un intervalo
+    if shard_map.sharded:
+        register_periodic_job("shard-map-refresh", settings.shard_map_refresh_interval, refresh_shard_map)
+
+    # Accesos acumulados en memoria
+    register_periodic_job("click-flush", settings.click_flush_interval, click_buffer.flush)
+    register_shutdown_hook(click_buffer.flush)
+
+    # Clics en vivo: un mensaje por worker e intervalo
+    register_periodic_job("click-publish", settings.click_stream_publish_interval, click_publisher.flush)
+    register_shutdown_hook(click_hub.close)
+
+    # Clics por país y ASN, resueltos en lote al volcar
+    register_periodic_job("geo-flush", settings.geoip_flush_interval, geo_clicks.flush)
+    register_shutdown_hook(geo_clicks.flush)
+
+    if snapshot_store:
+        register_periodic_job("snapshot-refresh", settings.snapshot_refresh_interval, _snapshot_refresh)
+
+def register_api_jobs() -> None:
+    """Trabajos de la API completa; se importan aquí para no cargarlos en los nodos de redirección."""
+    from app.services.email_service import email_queue
+    from app.services.expiration_service import run_cold_archive, run_expired_purge
+    from app.services.link_health_service import run_link_health
+    from app.services.write_behind_service import persister, run_reconcile
+
+    register_redirect_jobs()
+
+    # Correos publicados por lotes fuera del event loop
+    register_startup_hook(_start_email_queue)
+    register_periodic_job("email-flush", settings.email_flush_interval, email_queue.flush)
+    register_shutdown_hook(email_queue.flush)
+
+    # Altas diferidas: persistencia por lotes y verificación contra Postgres
+    register_periodic_job("write-behind-flush", settings.write_behind_flush_interval, persister.flush)
+    register_shutdown_hook(persister.flush)
+    register_periodic_job("write-behind-reconcile", settings.write_behind_reconcile_interval, run_reconcile)
+
+    register_periodic_job("expired-purge", settings.expired_purge_interval, run_expired_purge)
+    register_periodic_job(
+        "cold-archive", settings.archive_interval if settings.archive_after_days > 0 else 0, run_cold_archive
+    )
+    register_periodic_job("link-health", settings.link_health_interval, run_link_health)
+
+    if snapshot_store:
+        register_periodic_job("snapshot-compact", settings.snapshot_compact_interval, _snapshot_compact)
+        register_periodic_job("snapshot-rebuild", settings.snapshot_rebuild_interval, _snapshot_rebuild)
+
+async def warm_up() -> None:
+    """Abre los pools de BD y Redis y precarga los códigos más accedidos."""
+    db_connections = await warm_up_pool()
+    logger.info(f"Pool de BD precalentado con {db_connections} conexiones")
+    # Sin el mapa las peticiones irían al shard equivocado: si falla, no se arranca
+    await refresh_shard_map()
+
+    # Redis es una caché: si no está disponible la app sigue sirviendo desde la BD
+    try:
+        redis_connections = await warm_up_redis_pool()
+        logger.info(f"Pool de Redis precalentado con {redis_connections} conexiones")
+        async with async_session() as session:
+            cached = await warm_up_cache(session)
+        logger.info(f"Caché de redirecciones precargada con {cached} códigos")
+    except Exception as exc:
+        logger.warning(f"No se pudo precalentar Redis: {exc}")
+
+    if snapshot_store:
+        snapshot_store.refresh()
+
+async def start_background_jobs() -> None:
+    for hook in _startup_hooks:
+        await hook()
+    for name, interval, job in _periodic_jobs:
+        _running_tasks.append(asyncio.create_task(_run_periodic(name, interval, job), name=name))
+
+async def stop_background_jobs() -> None:
+    for task in _running_tasks:
+        task.cancel()
+    await asyncio.gather(*_running_tasks, return_exceptions=True)
+    _running_tasks.clear()
+
+async def drain() -> None:
+    """Vacía el trabajo pendiente y cierra los pools."""
+    await stop_background_jobs()
+    for hook in reversed(_shutdown_hooks):
+        try:
+            await hook()
+        except Exception as exc:
+            logger.error(f"Error al vaciar trabajo pendiente en {hook.__name__}: {exc}", exc_info=True)
+    await close_redis()
+    await close_engine()
+    if snapshot_store:
+        snapshot_store.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    await warm_up()
+    await start_background_jobs()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        # Dejar de reportar disponibilidad antes de drenar
+        app.state.ready = False
+        await drain()
@@ -0,0 +1,184 @@
+"""
+Profiler por muestreo para workers en producción.
+
+Un hilo toma la pila de cada hilo del proceso cada pocos milisegundos; el
+event loop no se instrumenta, así que el coste es el de leer las pilas. El
+resultado se exporta en formato collapsed (flamegraph.pl, speedscope) o como
+JSON de speedscope. Como el loop es compartido, el perfil de una petición
+incluye lo que el worker ejecute a la vez.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, Query, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.core.config import get_settings
+from app.middleware.docs_protect import check_admin_token
+
+settings = get_settings()
+router = APIRouter()
+
+PROFILE_HEADER = "X-Profile"
+FORMATS = ("collapsed", "speedscope")
+
+Frame = tuple[str, str, int]  # función, archivo, línea
+
+def _short_path(path: str) -> str:
+    cwd = os.getcwd()
+    if path.startswith(cwd):
+        return os.path.relpath(path, cwd)
+    parts = path.split(os.sep)
+    # En site-packages basta con el paquete y el módulo
+    return os.sep.join(parts[-2:])
+
+class SamplingProfiler:
+    """Muestrea las pilas de todos los hilos salvo el propio en un hilo aparte."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: Counter[tuple[Frame, ...]] = Counter()
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append((names.get(thread_id, str(thread_id)), "", 0))
+                self.samples[tuple(reversed(stack))] += 1
+
+    @staticmethod
+    def _label(frame: Frame) -> str:
+        name, path, line = frame
+        return f"{name} ({_short_path(path)}:{line})" if path else name
+
+    def collapsed(self) -> str:
+        """Una línea por pila distinta: `raíz;...;hoja muestras`."""
+        return "".join(
+            ";".join(self._label(frame) for frame in stack) + f" {count}\n"
+            for stack, count in self.samples.most_common()
+        )
+
+    def speedscope(self, name: str = "profile") -> dict:
+        frames: dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            # La raíz es el nombre del hilo: speedscope lo muestra como un marco más
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "short-link-guardian",
+            "shared": {
+                "frames": [
+                    {"name": fn, "file": _short_path(path), "line": line} if path else {"name": fn}
+                    for fn, path, line in frames
+                ]
+            },
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+    def response(self, fmt: str, name: str, headers: Optional[dict] = None) -> Response:
+        if fmt == "speedscope":
+            return JSONResponse(
+                self.speedscope(name),
+                headers={"Content-Disposition": f'attachment; filename="{name}.speedscope.json"', **(headers or {})},
+            )
+        return PlainTextResponse(self.collapsed(), headers=headers)
+
+# Un solo perfil a la vez por worker: dos hilos muestreando se medirían entre sí
+_profiling = asyncio.Lock()
+
+def _busy() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "Ya hay un perfil en curso en este worker"},
+    )
+
+@router.get("/debug/profile", tags=["debug"])
+async def profile_worker(
+    request: Request,
+    seconds: float = Query(10.0, gt=0),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+):
+    """Perfila este worker durante `seconds` segundos (solo admins)."""
+    error = check_admin_token(request)
+    if error:
+        return error
+    if _profiling.locked():
+        return _busy()
+    async with _profiling:
+        profiler = SamplingProfiler(interval_ms / 1000)
+        profiler.start()
+        try:
+            await asyncio.sleep(min(seconds, settings.profiler_max_seconds))
+        finally:
+            profiler.stop()
+    return profiler.response(format, f"worker-{os.getpid()}")
+
+def setup_request_profiling(app: FastAPI):
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        fmt = request.headers.get(PROFILE_HEADER)
+        if not fmt:
+            return await call_next(request)
+        error = check_admin_token(request)
+        if error:
+            return error
+        if fmt not in FORMATS:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": f"{PROFILE_HEADER} debe ser uno de {', '.join(FORMATS)}"},
+            )
+        if _profiling.locked():
+            return _busy()
+
+        async with _profiling:
+            profiler = SamplingProfiler(settings.profiler_request_interval_ms / 1000)
+            profiler.start()
+            try:
+                response = await call_next(request)
+                # Generar el cuerpo también forma parte de la petición
+                async for _ in response.body_iterator:
+                    pass
+            finally:
+                profiler.stop()
+        # El perfil sustituye al cuerpo; el estado original va en una cabecera
+        return profiler.response(fmt, "request", {"X-Profiled-Status": str(response.status_code)})
@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Request, Response
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 import time
 
 REQUEST_COUNT = Counter(
@@ -9,14 +9,114 @@ REQUEST_LATENCY = Histogram(
     "http_request_duration_seconds", "HTTP request latency", ["endpoint"]
 )
 
+# Single-flight de búsquedas de códigos
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Single-flight calls by role", ["flight", "role"]
+)
+SINGLEFLIGHT_WAITERS = Histogram(
+    "singleflight_waiters", "Coalesced waiters per executed flight", ["flight"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+SINGLEFLIGHT_LOCK_WAITS = Counter(
+    "singleflight_lock_waits_total", "Cross-worker lock waits by outcome", ["outcome"]
+)
+
+# Pool de Redis
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Connections in the shared Redis pool by state", ["state"]
+)
+REDIS_POOL_WAIT = Histogram(
+    "redis_pool_wait_seconds", "Time to check out a connection from the shared Redis pool",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+REDIS_PIPELINE_COMMANDS = Histogram(
+    "redis_pipeline_commands", "Commands sent per Redis pipeline round-trip",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+REDIS_PARSER = Gauge(
+    "redis_parser_info", "Redis response parser in use", ["parser"]
+)
+
+# Altas diferidas (write-behind)
+WRITE_BEHIND_ROWS = Counter(
+    "write_behind_rows_total", "Deferred URL creations by outcome", ["outcome"]
+)
+WRITE_BEHIND_LAG = Histogram(
+    "write_behind_persist_lag_seconds", "Time from acceptance to commit in Postgres",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+WRITE_BEHIND_BACKLOG = Gauge(
+    "write_behind_backlog", "Deferred URL creations waiting to be persisted"
+)
+WRITE_BEHIND_OLDEST_AGE = Gauge(
+    "write_behind_oldest_age_seconds", "Age of the oldest deferred creation not yet persisted"
+)
+WRITE_BEHIND_RECONCILED = Counter(
+    "write_behind_reconciled_total", "Reconciliation checks by result", ["result"]
+)
+
+# Clics en vivo por WebSocket
+CLICK_STREAM_CONNECTIONS = Gauge(
+    "click_stream_connections", "Open click stream WebSocket connections"
+)
+CLICK_STREAM_DROPPED = Counter(
+    "click_stream_dropped_total", "Click events dropped from full connection queues"
+)
+
+# Clientes de las redirecciones por tipo de user-agent
+REDIRECT_CLIENTS = Counter(
+    "redirect_clients_total", "Resolved redirects by user-agent class", ["client"]
+)
+
+# Comprobación de destinos
+LINK_HEALTH_CHECKS = Counter(
+    "link_health_checks_total", "Destination checks by verdict", ["result"]
+)
+
+# Lecturas condicionales con If-None-Match
+CONDITIONAL_READS = Counter(
+    "conditional_reads_total", "Reads with If-None-Match by outcome", ["result"]
+)
+
+# Borrados y cambios masivos por resultado de cada elemento
+BULK_ITEMS = Counter(
+    "bulk_items_total", "Items processed by bulk endpoints", ["operation", "status"]
+)
+
+# Control de admisión
+ADMISSION_PRESSURE = Gauge(
+    "admission_pressure", "Load pressure relative to the configured thresholds"
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_total", "Requests rejected by admission control", ["priority"]
+)
+
+# Consultas SQL
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement duration", ["operation"]
+)
+DB_REQUEST_QUERIES = Histogram(
+    "db_request_queries", "SQL statements per request", ["endpoint"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 10, 15, 20, 50),
+)
+DB_REQUEST_TIME = Histogram(
+    "db_request_duration_seconds", "Total SQL time per request", ["endpoint"]
+)
+
+def endpoint_label(request: Request) -> str:
+    # Usar la plantilla de la ruta evita una serie por cada código corto
+    route = request.scope.get("route")
+    return getattr(route, "path", request.url.path)
+
 def setup_prometheus(app: FastAPI):
     @app.middleware("http")
     async def prometheus_middleware(request: Request, call_next):
         start_time = time.time()
         response = await call_next(request)
         process_time = time.time() - start_time
-        REQUEST_COUNT.labels(request.method, request.url.path, response.status_code).inc()
-        REQUEST_LATENCY.labels(request.url.path).observe(process_time)
+        endpoint = endpoint_label(request)
+        REQUEST_COUNT.labels(request.method, endpoint, response.status_code).inc()
+        REQUEST_LATENCY.labels(endpoint).observe(process_time)
         return response
 
     @app.get("/metrics")
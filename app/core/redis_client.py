@@ -0,0 +1,116 @@
+"""
+Conexiones a Redis.
+
+Un pool por proceso para caché, locks, streams y pub/sub, creado desde
+Settings. Es bloqueante: con todas las conexiones en uso, un comando espera
+hasta `redis_pool_timeout` en vez de abrir otra, así que cada worker mantiene
+como mucho `redis_max_connections`, más las del limiter y las de Celery, que
+también están acotadas.
+"""
+import time
+from typing import Callable, Iterable
+
+import redis as sync_redis
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from redis.utils import HIREDIS_AVAILABLE
+
+from app.core.config import get_settings
+from app.core.prometheus import REDIS_PARSER, REDIS_PIPELINE_COMMANDS, REDIS_POOL_CONNECTIONS, REDIS_POOL_WAIT
+
+settings = get_settings()
+
+# redis-py usa hiredis para parsear respuestas si está instalado
+PARSER = "hiredis" if HIREDIS_AVAILABLE else "python"
+
+def connection_options() -> dict:
+    """Timeouts y health checks comunes a todos los clientes de Redis."""
+    return {
+        "socket_timeout": settings.redis_socket_timeout or None,
+        "socket_connect_timeout": settings.redis_socket_connect_timeout or None,
+        "socket_keepalive": True,
+        "health_check_interval": settings.redis_health_check_interval,
+    }
+
+class TimedBlockingPool(BlockingConnectionPool):
+    """Pool acotado que mide la espera por una conexión, incluida su apertura."""
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            REDIS_POOL_WAIT.observe(time.perf_counter() - start)
+
+def create_redis_pool(max_connections: int = settings.redis_max_connections) -> TimedBlockingPool:
+    return TimedBlockingPool.from_url(
+        settings.redis_url,
+        decode_responses=True,
+        max_connections=max_connections,
+        timeout=settings.redis_pool_timeout,
+        **connection_options(),
+    )
+
+def create_sync_redis_pool(max_connections: int) -> sync_redis.BlockingConnectionPool:
+    """Pool síncrono con las mismas opciones, para librerías que no usan asyncio (slowapi)."""
+    return sync_redis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=max_connections,
+        timeout=settings.redis_pool_timeout,
+        **connection_options(),
+    )
+
+# Pool compartido por todo el proceso; las conexiones se abren bajo demanda
+pool = create_redis_pool()
+redis = Redis(connection_pool=pool)
+
+def pool_stats() -> dict[str, int]:
+    return {
+        "in_use": len(pool._in_use_connections),
+        "idle": len(pool._available_connections),
+        "max": pool.max_connections,
+    }
+
+# Se leen al exportar las métricas: no hace falta un trabajo periódico
+for _state in ("in_use", "idle", "max"):
+    REDIS_POOL_CONNECTIONS.labels(_state).set_function(lambda state=_state: pool_stats()[state])
+REDIS_PARSER.labels(PARSER).set(1)
+
+async def pipelined(build: Callable[[Pipeline], object], transaction: bool = False) -> list:
+    """Envía en un solo round-trip los comandos que `build` encola; [] si no encoló ninguno."""
+    async with redis.pipeline(transaction=transaction) as pipe:
+        build(pipe)
+        if not len(pipe):
+            return []
+        REDIS_PIPELINE_COMMANDS.observe(len(pipe))
+        return await pipe.execute()
+
+async def delete_keys(keys: Iterable[str], chunk_size: int = settings.redis_batch_size) -> int:
+    """Borra muchas claves en un round-trip, con UNLINK de `chunk_size` claves como máximo por comando."""
+    keys = list(keys)
+
+    def build(pipe: Pipeline) -> None:
+        for start in range(0, len(keys), chunk_size):
+            pipe.unlink(*keys[start:start + chunk_size])
+
+    return sum(await pipelined(build))
+
+async def warm_up_redis_pool(size: int = settings.redis_warmup_connections) -> int:
+    """Abre `size` conexiones y las devuelve al pool para tenerlas listas."""
+    size = min(size, settings.redis_max_connections)
+    connections = []
+    try:
+        for _ in range(size):
+            connections.append(await pool.get_connection())
+    finally:
+        for conn in connections:
+            await pool.release(conn)
+    return len(connections)
+
+async def close_redis() -> None:
+    """Cierra el cliente y desconecta el pool."""
+    await redis.aclose(close_connection_pool=True)
+
+async def acquire_job_lock(name: str, ttl: float) -> bool:
+    """Lock de corta duración para que un trabajo periódico corra en un solo worker."""
+    return bool(await redis.set(f"job:{name}", "1", nx=True, px=int(ttl * 1000)))
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from app.core.prometheus import SINGLEFLIGHT_CALLS, SINGLEFLIGHT_WAITERS
+
+T = TypeVar("T")
+
+class SingleFlight(Generic[T]):
+    """
+    Agrupa llamadas concurrentes con la misma clave en una única ejecución.
+
+    La primera llamada lanza la tarea y las siguientes esperan su resultado. La
+    tarea no pertenece a ninguna petición: si quien la inició se cancela, el
+    resto sigue esperando el mismo resultado.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, tuple[asyncio.Task, list[int]]] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call:
+            task, waiters = call
+            waiters[0] += 1
+            SINGLEFLIGHT_CALLS.labels(self.name, "coalesced").inc()
+        else:
+            task = asyncio.ensure_future(fn())
+            waiters = [0]
+            self._calls[key] = (task, waiters)
+            task.add_done_callback(lambda done: self._finish(key, done, waiters))
+            SINGLEFLIGHT_CALLS.labels(self.name, "leader").inc()
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task, waiters: list[int]) -> None:
+        self._calls.pop(key, None)
+        # Marcar la excepción como consumida aunque todos los que esperaban se cancelaran
+        if not task.cancelled():
+            task.exception()
+        SINGLEFLIGHT_WAITERS.labels(self.name).observe(waiters[0])
@@ -0,0 +1,68 @@
+"""
+Búsqueda de códigos directamente sobre asyncpg.
+
+La consulta de resolución es siempre la misma: se prepara una vez por conexión
+del pool (la sentencia queda en el `info` de la conexión) y se ejecuta sin
+compilar SQL, sin sesión ni identity map, devolviendo una tupla. La conexión
+sale del mismo pool que usa SQLAlchemy, así que no abre conexiones extra.
+
+Las sentencias preparadas no sobreviven a pgbouncer en modo transacción:
+por eso va detrás de `db_fast_lookup`. Un cambio de esquema (p. ej. una
+migración que altera `urls`) invalida las ya preparadas; se descartan y se
+preparan de nuevo una vez.
+"""
+import time
+from typing import NamedTuple, Optional
+
+from asyncpg.exceptions import InvalidCachedStatementError, OutdatedSchemaCacheError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.db.instrumentation import record_query
+
+# Mismas columnas que ENTRY_COLUMNS: búsqueda index-only en ix_urls_code_covering
+LOOKUP_SQL = "SELECT id, original_url, expires_at, max_clicks, target_status FROM urls WHERE code = $1"
+# "cached plan must not change result type" y tipos cambiados tras un ALTER
+STALE_STATEMENT_ERRORS = (InvalidCachedStatementError, OutdatedSchemaCacheError)
+
+# El contador no está en el índice: solo para enlaces con max_clicks
+CONSUMED_SQL = "SELECT consumed_clicks FROM urls WHERE code = $1"
+
+class EntryRow(NamedTuple):
+    id: int
+    original_url: str
+    expires_at: object
+    max_clicks: Optional[int]
+    target_status: Optional[int]
+
+async def _prepared(raw) -> tuple:
+    statements = raw.info.get("fast_lookup")
+    if statements is None:
+        driver = raw.driver_connection
+        statements = (await driver.prepare(LOOKUP_SQL), await driver.prepare(CONSUMED_SQL))
+        raw.info["fast_lookup"] = statements
+    return statements
+
+async def _lookup(raw, code: str) -> tuple[Optional[EntryRow], Optional[int]]:
+    lookup, consumed = await _prepared(raw)
+    start = time.perf_counter()
+    record = await lookup.fetchrow(code)
+    record_query(LOOKUP_SQL, time.perf_counter() - start)
+    if record is None:
+        return None, None
+    row = EntryRow(*record)
+    if row.max_clicks is None:
+        return row, None
+    start = time.perf_counter()
+    count = await consumed.fetchval(code)
+    record_query(CONSUMED_SQL, time.perf_counter() - start)
+    return row, count
+
+async def fast_lookup(engine: AsyncEngine, code: str) -> tuple[Optional[EntryRow], Optional[int]]:
+    """Fila de resolución del código y, si tiene max_clicks, los usos ya consumidos."""
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        try:
+            return await _lookup(raw, code)
+        except STALE_STATEMENT_ERRORS:
+            raw.info.pop("fast_lookup", None)
+            return await _lookup(raw, code)
@@ -0,0 +1,124 @@
+"""
+Instrumentación de SQL.
+
+Los eventos del engine cuentan las sentencias y su duración. Dentro de una
+petición se acumulan en `QueryStats`, que el middleware publica como cabecera
+Server-Timing y en histogramas por endpoint. Las sentencias que superan
+`slow_query_ms` se registran normalizadas.
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from fastapi import FastAPI, Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+from app.core.prometheus import DB_QUERY_DURATION, DB_REQUEST_QUERIES, DB_REQUEST_TIME, endpoint_label
+
+settings = get_settings()
+logger = logging.getLogger("sql.slow")
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    duration: float = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Marcadores de asyncpg ($1::INTEGER), qmark y pyformat
+_PARAM = r"\s*(?:\$\d+(?:::\w+)?|\?|%\([^)]*\)s)\s*"
+_PARAM_LIST = re.compile(rf"\((?:{_PARAM},)+{_PARAM}\)")
+
+def normalize_sql(statement: str) -> str:
+    """Quita literales y colapsa listas de parámetros para agrupar sentencias equivalentes."""
+    statement = _STRING.sub("?", statement)
+    statement = _PARAM_LIST.sub("(...)", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_query(statement, time.perf_counter() - conn.info["query_start"].pop())
+
+def _handle_error(context):
+    # Una sentencia que falla no llega a after_cursor_execute: se cuenta aquí y su inicio
+    # no se queda en la conexión, que vuelve al pool y mediría mal la siguiente
+    conn = context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        record_query(context.statement or "", time.perf_counter() - starts.pop())
+
+def record_query(statement: str, elapsed: float) -> None:
+    """Contabiliza una sentencia; la usan también los accesos directos al driver."""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.add(elapsed)
+    DB_QUERY_DURATION.labels(_operation(statement)).observe(elapsed)
+    if settings.slow_query_ms > 0 and elapsed * 1000 >= settings.slow_query_ms:
+        logger.warning(f"Consulta lenta ({elapsed * 1000:.1f} ms): {normalize_sql(statement)}")
+
+def instrument_engine(engine: Engine) -> None:
+    """Registra los eventos en un engine síncrono (para el asíncrono, `engine.sync_engine`)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Acumula las consultas ejecutadas dentro del bloque en el contexto actual."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+def server_timing(stats: QueryStats) -> str:
+    return f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"'
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+@contextmanager
+def query_budget(max_queries: int) -> Iterator[QueryStats]:
+    """Para tests: falla si el bloque ejecuta más de `max_queries` consultas."""
+    with track_queries() as stats:
+        yield stats
+    assert stats.count <= max_queries, f"{stats.count} consultas, presupuesto de {max_queries}"
+
+def assert_query_budget(response, max_queries: int) -> None:
+    """Para tests: falla si la respuesta declara en Server-Timing más consultas de las permitidas."""
+    match = _SERVER_TIMING_DB.search(response.headers.get("server-timing", ""))
+    assert match, "La respuesta no incluye la cabecera Server-Timing de la BD"
+    count = int(match.group(1))
+    assert count <= max_queries, f"{count} consultas, presupuesto de {max_queries}"
+
+def setup_sql_metrics(app: FastAPI):
+    @app.middleware("http")
+    async def sql_metrics_middleware(request: Request, call_next):
+        with track_queries() as stats:
+            response: Response = await call_next(request)
+        endpoint = endpoint_label(request)
+        DB_REQUEST_QUERIES.labels(endpoint).observe(stats.count)
+        DB_REQUEST_TIME.labels(endpoint).observe(stats.duration)
+        if settings.sql_server_timing:
+            response.headers.append("Server-Timing", server_timing(stats))
+        return response
@@ -1,3 +1,6 @@
 from .user import User
 from .url import URL
+from .url_archive import URLArchive
+from .url_geo_stat import URLGeoStat
+from .url_shard import URLShard
 # Agrega aquí futuros modelos
@@ -1,14 +1,46 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, DateTime, Integer, Text
+from sqlalchemy import BigInteger, Column, String, DateTime, Integer, SmallInteger, Text, Index, ForeignKey
 
 from app.db.models.base import Base
 
+# Estados del destino que marcan un enlace como roto
+BROKEN_STATUSES = frozenset({404, 410})
+
 
 class URL(Base):
     __tablename__ = "urls"
 
-    id = Column(Integer, primary_key=True, index=True)
-    code = Column(String(10), unique=True, index=True, nullable=False)
+    # 64 bits: con shards el id lleva el bucket del código (ver app.db.sharding)
+    id = Column(BigInteger, primary_key=True)
+    # Hasta 32 caracteres para los alias personalizados
+    code = Column(String(32), nullable=False)
     original_url = Column(Text, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     access_count = Column(Integer, default=0)
+    # Usos de un enlace con max_clicks, incluidos los de bots: decide cuándo se agota
+    consumed_clicks = Column(Integer, nullable=False, default=0, server_default="0")
+    # Lo actualiza el volcado de accesos; decide cuándo un enlace pasa al archivo
+    last_accessed_at = Column(DateTime, nullable=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL", name="fk_urls_owner_id_users"), nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    max_clicks = Column(Integer, nullable=True)
+    # Digest de la URL canónica para deduplicar destinos con una búsqueda indexada
+    url_hash = Column(String(32), nullable=True, index=True)
+    # Última comprobación del destino: estado HTTP final (0 = sin respuesta)
+    target_status = Column(SmallInteger, nullable=True)
+    target_checked_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Único y con las columnas de la redirección: la búsqueda por código no toca la tabla
+        Index(
+            "ix_urls_code_covering", "code", unique=True,
+            postgresql_include=["id", "original_url", "expires_at", "max_clicks", "target_status"],
+        ),
+        # Rangos por fecha; created_at crece con la inserción
+        Index("ix_urls_created_at_brin", "created_at", postgresql_using="brin"),
+        # Listado "mis enlaces" con paginación por keyset
+        Index("ix_urls_owner_created", "owner_id", "created_at", "id"),
+        # Índices parciales: solo los enlaces con límite entran en el barrido
+        Index("ix_urls_expires_at", "expires_at", postgresql_where=expires_at.isnot(None)),
+        Index("ix_urls_max_clicks", "id", postgresql_where=max_clicks.isnot(None)),
+    )
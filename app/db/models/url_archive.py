@@ -0,0 +1,21 @@
+from sqlalchemy import BigInteger, Column, String, DateTime, Integer, LargeBinary, Index, ForeignKey
+
+from app.db.models.base import Base
+
+
+class URLArchive(Base):
+    """Enlaces sin accesos recientes, fuera de la tabla caliente."""
+    __tablename__ = "urls_archive"
+
+    # Mismo id que tenía en urls: al recuperarlo conserva su identidad
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    code = Column(String(32), unique=True, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL", name="fk_urls_archive_owner_id_users"), nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+    # Resto de columnas en JSON comprimido (ver archive_service)
+    payload = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index("ix_urls_archive_owner_created", "owner_id", "created_at", "id"),
+    )
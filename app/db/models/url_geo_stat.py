@@ -0,0 +1,14 @@
+from sqlalchemy import BigInteger, Column, String
+
+from app.db.models.base import Base
+
+
+class URLGeoStat(Base):
+    """Clics por enlace, país y ASN."""
+    __tablename__ = "url_geo_stats"
+
+    # Sin FK: los contadores sobreviven al archivado del enlace, que conserva su id
+    url_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    country = Column(String(2), primary_key=True)
+    asn = Column(BigInteger, primary_key=True, autoincrement=False)
+    clicks = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,13 @@
+from sqlalchemy import Boolean, Column, SmallInteger
+
+from app.db.models.base import Base
+
+
+class URLShard(Base):
+    """Shard de cada bucket de códigos; vive solo en la base principal."""
+    __tablename__ = "url_shards"
+
+    bucket = Column(SmallInteger, primary_key=True, autoincrement=False)
+    shard = Column(SmallInteger, nullable=False)
+    # Mientras se mueve no se crean códigos en el bucket ni se eliminan sus enlaces
+    moving = Column(Boolean, nullable=False, default=False, server_default="false")
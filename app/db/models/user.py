@@ -3,7 +3,7 @@ from app.db.models.base import Base
 
 class User(Base):
     __tablename__ = "users"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
@@ -12,5 +12,7 @@ class User(Base):
     role = Column(String, default="user")
     verification_token = Column(String, nullable=True)
     reset_token = Column(String, nullable=True)
+    # Contador incremental de enlaces propios; evita COUNT(*) en listados y cuotas
+    link_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -1,21 +1,110 @@
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
+from app.db.instrumentation import instrument_engine
 
 settings = get_settings()
 
 #echo = getattr(settings, "db_echo", False) #Todo: Cambiar a True cuando se esté en producción
 
-engine = create_async_engine(
-    settings.database_url,
-    echo=False,  # Controlado por variable de entorno/configuración
-    future=True,
-)
+class PoolWaitStats:
+    """Tiempo que las peticiones esperan por una conexión del pool."""
+
+    def __init__(self):
+        self._total = 0.0
+        self._count = 0
+        self._waiting: dict[int, float] = {}
+        self._next_token = 0
+
+    def start(self) -> int:
+        self._next_token += 1
+        self._waiting[self._next_token] = time.perf_counter()
+        return self._next_token
+
+    def finish(self, token: int) -> float:
+        waited = time.perf_counter() - self._waiting.pop(token)
+        self._total += waited
+        self._count += 1
+        return waited
+
+    def sample(self) -> float:
+        """Espera media desde la muestra anterior, o la del que más lleva esperando si es mayor."""
+        average = self._total / self._count if self._count else 0.0
+        self._total, self._count = 0.0, 0
+        oldest = min(self._waiting.values(), default=None)
+        current = time.perf_counter() - oldest if oldest is not None else 0.0
+        return max(average, current)
+
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+pool_wait = PoolWaitStats()
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Pool que mide cuánto tarda cada checkout, incluida la espera por una conexión libre."""
 
-async_session = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
+    def _do_get(self):
+        token = pool_wait.start()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.finish(token)
+
+def _create_engine(url: str):
+    shard_engine = create_async_engine(
+        url,
+        echo=False,  # Controlado por variable de entorno/configuración
+        future=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        poolclass=TimedQueuePool,
+    )
+    instrument_engine(shard_engine.sync_engine)
+    return shard_engine
+
+# Shard 0 es la base principal (usuarios, mapa de shards, secuencia de ids);
+# DB_SHARD_URLS añade bases que solo guardan enlaces
+engine = _create_engine(settings.database_url)
+shard_engines = [engine] + [_create_engine(url) for url in settings.db_shard_urls]
+
+shard_sessions = [
+    sessionmaker(shard_engine, class_=AsyncSession, expire_on_commit=False)
+    for shard_engine in shard_engines
+]
+async_session = shard_sessions[0]
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+async def warm_up_pool(size: int = settings.db_pool_size) -> int:
+    """Abre `size` conexiones a la vez en cada shard para que queden listas en el pool."""
+    async def _open(shard_engine):
+        conn = await shard_engine.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    results = await asyncio.gather(
+        *(_open(shard_engine) for shard_engine in shard_engines for _ in range(size)),
+        return_exceptions=True,
+    )
+    connections = [r for r in results if not isinstance(r, BaseException)]
+    # Devolver las conexiones al pool; quedan abiertas para las siguientes peticiones
+    for conn in connections:
+        await conn.close()
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        raise errors[0]
+    return len(connections)
+
+async def close_engine() -> None:
+    """Cierra todas las conexiones de los pools."""
+    for shard_engine in shard_engines:
+        await shard_engine.dispose()
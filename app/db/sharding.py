@@ -0,0 +1,131 @@
+"""
+Reparto de los enlaces entre varias bases Postgres.
+
+Cada código pertenece a uno de 64 buckets según su primer carácter y cada
+bucket vive en un shard según la tabla `url_shards` de la base principal; sin
+fila, el bucket está en el shard 0. Los ids creados con shards llevan el bucket
+en sus 6 bits bajos (`SHARDED_ID_BASE + secuencia * 64 + bucket`), así que el
+código y el id llevan a su shard sin consultar nada.
+
+Los enlaces anteriores (ids por debajo de SHARDED_ID_BASE, que caben en 32
+bits) se quedan en el shard 0: una búsqueda por código que no encuentra el
+enlace en su shard lo busca también ahí.
+"""
+import asyncio
+import string
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.url_shard import URLShard
+from app.db.session import async_session, shard_sessions
+
+SHARD_BUCKETS = 64
+# Por encima de cualquier id serial de 32 bits y múltiplo de SHARD_BUCKETS
+SHARDED_ID_BASE = 1 << 32
+
+_BUCKETS = {char: bucket for bucket, char in enumerate(string.digits + string.ascii_uppercase + string.ascii_lowercase)}
+
+T = TypeVar("T")
+
+def bucket_for_code(code: str) -> int:
+    """Bucket por el primer carácter; lo que no es alfanumérico va al 0."""
+    return _BUCKETS.get(code[:1], 0)
+
+def bucket_chars(bucket: int) -> list[str]:
+    """Primeros caracteres de los códigos de un bucket (los no alfanuméricos no se mueven)."""
+    return [char for char, value in _BUCKETS.items() if value == bucket]
+
+def is_sharded_id(url_id: int) -> bool:
+    return url_id >= SHARDED_ID_BASE
+
+class ShardMap:
+    """Copia en memoria del mapa bucket→shard de cada worker."""
+
+    def __init__(self, shard_count: int):
+        self.shard_count = shard_count
+        self.shards = [0] * SHARD_BUCKETS
+        self.moving: frozenset[int] = frozenset()
+
+    @property
+    def sharded(self) -> bool:
+        return self.shard_count > 1
+
+    def load(self, rows: Iterable) -> None:
+        shards, moving = [0] * SHARD_BUCKETS, set()
+        for row in rows:
+            if row.shard >= self.shard_count:
+                raise ValueError(f"El bucket {row.bucket} apunta al shard {row.shard}, que no está configurado")
+            shards[row.bucket] = row.shard
+            if row.moving:
+                moving.add(row.bucket)
+        self.shards, self.moving = shards, frozenset(moving)
+
+    def shard_for_code(self, code: str) -> int:
+        return self.shards[bucket_for_code(code)]
+
+    def shard_for_id(self, url_id: int) -> int:
+        return self.shards[url_id % SHARD_BUCKETS] if is_sharded_id(url_id) else 0
+
+    def shards_for_code(self, code: str) -> list[int]:
+        """Dónde puede estar un código: su shard y, para enlaces anteriores, el 0."""
+        shard = self.shard_for_code(code)
+        return [shard, 0] if shard else [0]
+
+    def is_moving(self, code: str) -> bool:
+        return bucket_for_code(code) in self.moving
+
+    def is_moving_id(self, url_id: int) -> bool:
+        """Solo se mueven los enlaces con id de shard."""
+        return is_sharded_id(url_id) and url_id % SHARD_BUCKETS in self.moving
+
+shard_map = ShardMap(len(shard_sessions))
+
+def make_url_id(sequence_value: int, code: str) -> int:
+    """Id de un enlace nuevo a partir de la secuencia de urls del shard 0."""
+    if not shard_map.sharded:
+        return sequence_value
+    return SHARDED_ID_BASE + sequence_value * SHARD_BUCKETS + bucket_for_code(code)
+
+async def refresh_shard_map() -> None:
+    if not shard_map.sharded:
+        return
+    async with async_session() as session:
+        result = await session.execute(select(URLShard.bucket, URLShard.shard, URLShard.moving))
+        shard_map.load(result.all())
+
+@asynccontextmanager
+async def shard_session(shard: int, db: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    """Sesión de un shard; en el 0 reutiliza `db` para compartir transacción con los usuarios."""
+    if shard == 0 and db is not None:
+        yield db
+        return
+    async with shard_sessions[shard]() as session:
+        yield session
+
+@asynccontextmanager
+async def users_session(shard: int, session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Sesión para tocar `users` desde el trabajo de un shard.
+
+    En el shard 0 es la misma y se confirma con él; en los demás es una sesión
+    de la base principal que se confirma al salir, sin atomicidad entre ambas.
+    """
+    if shard == 0:
+        yield session
+        return
+    async with async_session() as main:
+        yield main
+        await main.commit()
+
+async def scatter(query: Callable[[AsyncSession], Awaitable[T]], db: Optional[AsyncSession] = None) -> list[T]:
+    """Ejecuta `query` en todos los shards a la vez; en el 0 con `db` si se indica."""
+    async def run(shard: int) -> T:
+        async with shard_session(shard, db) as session:
+            return await query(session)
+
+    if len(shard_sessions) == 1:
+        return [await run(0)]
+    return list(await asyncio.gather(*(run(shard) for shard in range(len(shard_sessions)))))
@@ -2,28 +2,36 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
-from redis.asyncio import Redis
 import logging
 
 from app.api.v1 import user_routes, ws_routes, url_routes, redirect_routes
+from app.core import health
+from app.core.admission import setup_admission
+from app.core import profiler
 from app.core.config import get_settings
+from app.core.lifespan import lifespan, register_api_jobs
+from app.core.prometheus import setup_prometheus
+from app.core.redis_client import create_sync_redis_pool
+from app.db.instrumentation import setup_sql_metrics
 from app.middleware.error_handler import add_error_handling
 from app.middleware.docs_protect import DocsProtectMiddleware
 
 settings = get_settings()
 
-app = FastAPI(title="FastAPI Project Base")
+register_api_jobs()
+app = FastAPI(title="FastAPI Project Base", lifespan=lifespan)
 
 # Logging setup
 logging_level = logging.DEBUG if settings.debug else logging.INFO
 logging.basicConfig(level=logging_level)
 logger = logging.getLogger(__name__)
 
-# Redis connection
-redis = Redis.from_url(settings.redis_url, decode_responses=True)
-
 # Rate Limiter
-limiter = Limiter(key_func=get_remote_address, storage_uri=settings.redis_url)
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.redis_url,
+    storage_options={"connection_pool": create_sync_redis_pool(settings.redis_limiter_max_connections)},
+)
 app.state.limiter = limiter
 app.add_exception_handler(429, _rate_limit_exceeded_handler)
 
@@ -39,10 +47,22 @@ app.add_middleware(
 # Error handling
 add_error_handling(app)
 
+# Perfil de una petición bajo demanda (solo admins)
+profiler.setup_request_profiling(app)
+
+# Rechazo de carga antes de tocar los pools; las métricas lo envuelven para contar los 503
+setup_admission(app)
+
+# Métricas
+setup_sql_metrics(app)
+setup_prometheus(app)
+
 # Routers
 app.include_router(user_routes.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(url_routes.router, prefix="/api/v1/urls", tags=["urls"])
 app.include_router(redirect_routes.router, prefix="/r", tags=["redirect"])
 app.include_router(ws_routes.router)
+app.include_router(health.router)
+app.include_router(profiler.router)
 
 app.add_middleware(DocsProtectMiddleware)
@@ -1,21 +1,30 @@
-from fastapi import Request, status
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from jose import JWTError
 from app.core.security import decode_access_token
 import os
 
+def check_admin_token(request: Request) -> Optional[JSONResponse]:
+    """None si la petición trae un token de admin (cookie o Bearer); si no, la respuesta de error."""
+    token = request.cookies.get("access_token") or request.headers.get("Authorization", "").replace("Bearer ", "")
+    if not token:
+        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Not authenticated"})
+    try:
+        payload = decode_access_token(token)
+    except (HTTPException, JWTError):
+        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Invalid token"})
+    if payload.get("role") != "admin":
+        return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"detail": "Not enough permissions"})
+    return None
+
 class DocsProtectMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         env = os.getenv("ENV", "development")
         if env == "production" and request.url.path in ["/docs", "/redoc"]:
-            token = request.cookies.get("access_token") or request.headers.get("Authorization", "").replace("Bearer ", "")
-            if not token:
-                return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Not authenticated"})
-            try:
-                payload = decode_access_token(token)
-                if payload.get("role") != "admin":
-                    return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"detail": "Not enough permissions"})
-            except JWTError:
-                return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Invalid token"})
+            error = check_admin_token(request)
+            if error:
+                return error
         return await call_next(request)
@@ -0,0 +1,40 @@
+"""
+Punto de entrada para nodos dedicados a redirecciones.
+
+Solo monta la resolución de códigos, health y métricas: sin usuarios, i18n,
+bcrypt, Celery, CORS ni documentación, así que arranca antes, ocupa menos
+memoria por worker y cada redirección atraviesa dos middlewares.
+
+    uvicorn app.redirect_main:app --workers 4
+"""
+import logging
+
+from fastapi import FastAPI
+
+from app.api.v1 import redirect_routes
+from app.core import health
+from app.core.admission import setup_admission
+from app.core.config import get_settings
+from app.core.lifespan import lifespan, register_redirect_jobs
+from app.core.prometheus import setup_prometheus
+from app.middleware.error_handler import add_error_handling
+
+settings = get_settings()
+
+logging.basicConfig(level=logging.DEBUG if settings.debug else logging.INFO)
+
+register_redirect_jobs()
+app = FastAPI(
+    title="Short Link Guardian - redirecciones",
+    lifespan=lifespan,
+    openapi_url=None,
+    docs_url=None,
+    redoc_url=None,
+)
+
+add_error_handling(app)
+setup_admission(app)
+setup_prometheus(app)
+
+app.include_router(redirect_routes.router, prefix="/r", tags=["redirect"])
+app.include_router(health.router)
@@ -1,35 +1,69 @@
-from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, HttpUrl, validator, Field
+from datetime import datetime, timezone
+from typing import List, Optional
+from pydantic import BaseModel, HttpUrl, validator, model_validator, Field
 
 
-class URLBase(BaseModel):
-    original_url: HttpUrl = Field(..., description="URL original a acortar")
+# Alias personalizados: el primer carácter decide el shard (ver app.db.sharding)
+ALIAS_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_-]*$"
+ALIAS_MIN_LENGTH = 3
+ALIAS_MAX_LENGTH = 32
+
+
+# Altas y cambios masivos: elementos por petición
+BULK_MAX_ITEMS = 10000
 
-    @validator('original_url')
-    def validate_url(cls, v):
-        # Implementar validaciones de seguridad adicionales
-        blocked_domains = ["malicious.com", "phishing.com", "malware.com"]
-        url_str = str(v).lower()
 
-        # Verificar dominios bloqueados
-        for domain in blocked_domains:
-            if domain in url_str:
-                raise ValueError(f"El dominio {domain} está bloqueado por motivos de seguridad")
+def check_original_url(v):
+    # Implementar validaciones de seguridad adicionales
+    blocked_domains = ["malicious.com", "phishing.com", "malware.com"]
+    url_str = str(v).lower()
 
-        # Validar protocolo (solo permitir https y http)
-        if not url_str.startswith(('http://', 'https://')):
-            raise ValueError("Solo se permiten URLs con protocolos HTTP y HTTPS")
+    # Verificar dominios bloqueados
+    for domain in blocked_domains:
+        if domain in url_str:
+            raise ValueError(f"El dominio {domain} está bloqueado por motivos de seguridad")
 
-        # Límite de longitud para prevenir ataques de DOS
-        if len(url_str) > 2048:
-            raise ValueError("La URL es demasiado larga (máximo 2048 caracteres)")
+    # Validar protocolo (solo permitir https y http)
+    if not url_str.startswith(('http://', 'https://')):
+        raise ValueError("Solo se permiten URLs con protocolos HTTP y HTTPS")
 
+    # Límite de longitud para prevenir ataques de DOS
+    if len(url_str) > 2048:
+        raise ValueError("La URL es demasiado larga (máximo 2048 caracteres)")
+
+    return v
+
+
+def check_expires_at(v):
+    if v is None:
         return v
+    # Se almacena en UTC sin zona horaria, igual que created_at
+    if v.tzinfo is not None:
+        v = v.astimezone(timezone.utc).replace(tzinfo=None)
+    if v <= datetime.now(timezone.utc).replace(tzinfo=None):
+        raise ValueError("La fecha de expiración debe ser futura")
+    return v
+
+
+class URLBase(BaseModel):
+    original_url: HttpUrl = Field(..., description="URL original a acortar")
+
+    @validator('original_url')
+    def validate_url(cls, v):
+        return check_original_url(v)
 
 
 class URLCreate(URLBase):
-    pass
+    expires_at: Optional[datetime] = Field(None, description="Fecha de expiración (UTC)")
+    max_clicks: Optional[int] = Field(None, ge=1, description="Número máximo de accesos")
+    alias: Optional[str] = Field(
+        None, min_length=ALIAS_MIN_LENGTH, max_length=ALIAS_MAX_LENGTH, pattern=ALIAS_PATTERN,
+        description="Código personalizado (letras, dígitos, - y _); por defecto uno aleatorio"
+    )
+
+    @validator('expires_at')
+    def validate_expires_at(cls, v):
+        return check_expires_at(v)
 
 
 class URLResponse(URLBase):
@@ -37,6 +71,9 @@ class URLResponse(URLBase):
     code: str
     created_at: datetime
     access_count: int
+    expires_at: Optional[datetime] = None
+    max_clicks: Optional[int] = None
+    owner_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -48,6 +85,91 @@ class URLList(BaseModel):
     original_url: str
     created_at: datetime
     access_count: int
+    expires_at: Optional[datetime] = None
+    max_clicks: Optional[int] = None
+    owner_id: Optional[int] = None
 
     class Config:
         from_attributes = True
+
+
+class URLPage(BaseModel):
+    items: List[URLList]
+    next_cursor: Optional[str] = None
+    total: int
+
+
+class URLAccepted(BaseModel):
+    """Alta diferida: el código ya resuelve y la fila se guarda en segundo plano."""
+    id: int
+    code: str
+    original_url: str
+    owner_id: Optional[int] = None
+    status: str = "pending"
+
+
+class AliasAvailability(BaseModel):
+    alias: str
+    available: bool
+    suggestions: List[str] = Field(default_factory=list, description="Alternativas libres")
+
+
+class BulkFilter(BaseModel):
+    """Enlaces creados en un rango de fechas o hacia un mismo destino."""
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    original_url_prefix: Optional[str] = Field(None, min_length=8, max_length=2048)
+
+    @validator('created_after', 'created_before')
+    def to_utc(cls, v):
+        # created_at se guarda en UTC sin zona horaria
+        if v is not None and v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+    @model_validator(mode="after")
+    def require_condition(self):
+        if self.created_after is None and self.created_before is None and not self.original_url_prefix:
+            raise ValueError("El filtro necesita al menos una condición")
+        return self
+
+
+class BulkSelection(BaseModel):
+    """Enlaces afectados: por ids, por códigos o por filtro (solo uno de los tres)."""
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=BULK_MAX_ITEMS)
+    codes: Optional[List[str]] = Field(None, min_length=1, max_length=BULK_MAX_ITEMS)
+    filter: Optional[BulkFilter] = None
+
+    @model_validator(mode="after")
+    def require_one_selector(self):
+        if sum(selector is not None for selector in (self.ids, self.codes, self.filter)) != 1:
+            raise ValueError("Indica exactamente uno de ids, codes o filter")
+        return self
+
+
+class BulkUpdate(BulkSelection):
+    """Cambios a aplicar; `expires_at: null` quita la expiración."""
+    original_url: Optional[HttpUrl] = None
+    expires_at: Optional[datetime] = None
+
+    @validator('original_url')
+    def validate_url(cls, v):
+        return check_original_url(v) if v is not None else v
+
+    @validator('expires_at')
+    def validate_expires_at(cls, v):
+        return check_expires_at(v)
+
+    @model_validator(mode="after")
+    def require_changes(self):
+        if not {"original_url", "expires_at"} & self.model_fields_set:
+            raise ValueError("Indica al menos un cambio: original_url o expires_at")
+        if "original_url" in self.model_fields_set and self.original_url is None:
+            raise ValueError("original_url no puede ser nulo")
+        return self
+
+
+class GeoStat(BaseModel):
+    country: str = Field(..., description="Código ISO del país (ZZ si no se pudo resolver)")
+    asn: int = Field(..., description="Sistema autónomo de origen (0 si no se conoce)")
+    clicks: int
@@ -0,0 +1,214 @@
+"""
+Alias personalizados (`/r/rebajas-verano`).
+
+Un alias se valida contra las rutas reservadas, que solo se rechazan como
+alias completo, y contra las palabras vetadas. La mayoría se veta como
+palabra completa (el alias entero o un trozo entre - y _), para no rechazar
+"computadoras" o "Scunthorpe"; solo las que no aparecen dentro de palabras
+normales se buscan como subcadena, con un autómata de Aho-Corasick
+compilado una vez por proceso.
+La disponibilidad se decide primero con el snapshot y la caché de
+redirecciones; la base de datos solo se consulta si ninguno lo sabe, y la
+restricción única de `code` resuelve las carreras al insertar.
+"""
+import logging
+import re
+import secrets
+from collections import deque
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.models.url import URL
+from app.db.models.url_archive import URLArchive
+from app.db.sharding import shard_map, shard_session
+from app.schemas.url import ALIAS_MAX_LENGTH, ALIAS_MIN_LENGTH, ALIAS_PATTERN
+from app.services.snapshot_service import snapshot_store
+from app.services.url_service import (
+    CACHE_PREFIX, MISSING_MARKER, NOT_FOUND, check_code_exists, get_cached_url, redis
+)
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_ALIAS_RE = re.compile(ALIAS_PATTERN)
+
+# Rutas y nombres del servicio: vetados solo como alias completo
+RESERVED_ALIASES = frozenset({
+    "admin", "api", "docs", "redoc", "openapi", "health", "metrics", "static", "assets",
+    "login", "logout", "register", "signup", "account", "settings", "support", "help", "ws",
+})
+
+# Vetadas como alias completo o como trozo entre separadores: dentro de otras
+# palabras son habituales (computadoras, diputados, Scunthorpe, shiitake...)
+BLOCKED_TOKENS = (
+    "puta", "putas", "puto", "putos", "verga", "culero", "marica", "maricon",
+    "shit", "cunt", "nazi", "nazis", "porn", "porno",
+)
+
+# Vetadas también dentro de otra palabra: no forman parte de palabras normales
+BLOCKED_SUBSTRINGS = (
+    "mierda", "pendej", "cabron", "chinga", "fuck", "bitch", "nigger", "faggot",
+)
+
+# Separadores fuera y sustituciones habituales para esquivar el filtro
+_NORMALIZE = str.maketrans({"-": None, "_": None, "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t"})
+
+def normalize(text: str) -> str:
+    return text.lower().translate(_NORMALIZE)
+
+class WordMatcher:
+    """Autómata de Aho-Corasick: busca todas las palabras en una sola pasada por el texto."""
+
+    def __init__(self, words: Iterable[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._output: list[Optional[str]] = [None]
+        for word in words:
+            self._add(word)
+        self._link()
+
+    def _add(self, word: str) -> None:
+        node = 0
+        for char in word:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._goto[node][char] = child
+            node = child
+        if word:
+            self._output[node] = word
+
+    def _link(self) -> None:
+        # En anchura: el enlace de fallo de un nodo apunta siempre a uno menos profundo
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                if self._output[child] is None:
+                    self._output[child] = self._output[self._fail[child]]
+
+    def find(self, text: str) -> Optional[str]:
+        """Primera palabra contenida en `text`, o None."""
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            if self._output[node]:
+                return self._output[node]
+        return None
+
+def _load_blocked_words() -> tuple[frozenset[str], WordMatcher]:
+    """
+    Palabras completas y matcher de subcadenas.
+
+    ALIAS_BLOCKED_WORDS_PATH añade una palabra por línea, vetada como palabra
+    completa; entre asteriscos (`*palabra*`) se veta también como subcadena.
+    """
+    tokens, substrings = set(BLOCKED_TOKENS), set(BLOCKED_SUBSTRINGS)
+    if settings.alias_blocked_words_path:
+        try:
+            with open(settings.alias_blocked_words_path, encoding="utf-8") as source:
+                for line in source:
+                    word = line.strip()
+                    if not word or word.startswith("#"):
+                        continue
+                    if len(word) > 2 and word[0] == word[-1] == "*":
+                        substrings.add(word[1:-1])
+                    else:
+                        tokens.add(word)
+        except OSError as exc:
+            logger.error(f"No se pudo leer la lista de palabras vetadas: {exc}")
+    return frozenset(normalize(word) for word in tokens), WordMatcher(normalize(word) for word in substrings)
+
+blocked_tokens, blocked_substrings = _load_blocked_words()
+
+_SEPARATORS = re.compile(r"[-_]+")
+
+def _blocked_word(alias: str) -> Optional[str]:
+    whole = normalize(alias)
+    if whole in blocked_tokens:
+        return whole
+    for token in _SEPARATORS.split(alias):
+        if normalize(token) in blocked_tokens:
+            return normalize(token)
+    return blocked_substrings.find(whole)
+
+def alias_error(alias: str) -> Optional[str]:
+    """Motivo por el que un alias no se puede usar, o None si es válido."""
+    if not ALIAS_MIN_LENGTH <= len(alias) <= ALIAS_MAX_LENGTH or not _ALIAS_RE.match(alias):
+        return "Alias inválido: entre 3 y 32 letras, dígitos, - o _, empezando por letra o dígito"
+    if alias.lower() in RESERVED_ALIASES:
+        return "Alias reservado"
+    if _blocked_word(alias):
+        return "El alias contiene una palabra no permitida"
+    return None
+
+# Disponibilidad
+
+async def alias_available(db: AsyncSession, alias: str) -> bool:
+    """
+    Snapshot y caché primero; solo sin dato en ninguno se consulta la BD.
+
+    Una entrada negativa en caché se da por buena: si otro alta gana la
+    carrera, la restricción única lo rechaza al insertar.
+    """
+    if snapshot_store and snapshot_store.lookup(alias):
+        return False
+    cached = await get_cached_url(alias)
+    if cached is NOT_FOUND:
+        return True
+    if cached:
+        return False
+    return not await check_code_exists(db, alias)
+
+def alias_candidates(alias: str, count: int) -> list[str]:
+    """Variantes válidas del alias, de más a menos parecidas."""
+    base = alias[:ALIAS_MAX_LENGTH - 5].rstrip("-_")
+    year = datetime.now(timezone.utc).year
+    candidates = [f"{base}-{year}"]
+    candidates += [f"{base}-{n}" for n in range(2, count + 2)]
+    candidates += [f"{base}-{secrets.token_hex(2)}" for _ in range(count)]
+    return [
+        candidate for candidate in dict.fromkeys(candidates)
+        if candidate != alias and alias_error(candidate) is None
+    ]
+
+async def suggest_aliases(db: AsyncSession, alias: str, count: int) -> list[str]:
+    """Hasta `count` alternativas libres, comprobadas todas juntas con una sola consulta."""
+    candidates = [
+        candidate for candidate in alias_candidates(alias, count)
+        if not (snapshot_store and snapshot_store.lookup(candidate))
+    ]
+    try:
+        cached = await redis.mget([CACHE_PREFIX + candidate for candidate in candidates])
+    except RedisError as exc:
+        logger.warning(f"Caché no disponible al sugerir alias: {exc}")
+        cached = [None] * len(candidates)
+    unknown = [candidate for candidate, raw in zip(candidates, cached) if raw is None]
+    candidates = [candidate for candidate, raw in zip(candidates, cached) if raw in (None, MISSING_MARKER)]
+
+    # Las variantes comparten el primer carácter del alias: mismo bucket y mismo shard
+    taken: set[str] = set()
+    if unknown:
+        for shard in shard_map.shards_for_code(alias):
+            async with shard_session(shard, db) as session:
+                result = await session.execute(
+                    select(URL.code).where(URL.code.in_(unknown))
+                    .union_all(select(URLArchive.code).where(URLArchive.code.in_(unknown)))
+                )
+                taken.update(result.scalars())
+    return [candidate for candidate in candidates if candidate not in taken][:count]
@@ -0,0 +1,127 @@
+"""
+Archivo de enlaces fríos.
+
+Los enlaces sin accesos recientes se guardan en `urls_archive` con las
+columnas de búsqueda en claro y el resto en JSON comprimido con zlib y un
+diccionario de fragmentos habituales en URLs, que es lo que permite comprimir
+textos tan cortos. El digest no se guarda: se recalcula al recuperarlo.
+"""
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.url import URL
+from app.db.models.url_archive import URLArchive
+from app.services.canonical_url import canonicalize_url, url_digest
+
+# La 2 añade el estado del destino; la 1 se sigue leyendo (sin él)
+PAYLOAD_VERSION = 2
+_READABLE_VERSIONS = frozenset({1, PAYLOAD_VERSION})
+
+# Lo más frecuente al final: zlib alcanza antes las coincidencias cercanas
+_ZDICT = (
+    b"utm_campaign=utm_medium=utm_source=&ref=?id=.html.php.pdf/index"
+    b".es/.io/.net/.org/.co/.com.mx/docs.google.com/drive.google.com/"
+    b"linkedin.com/instagram.com/facebook.com/twitter.com/amazon.com/"
+    b"github.com/youtube.com/watch?v=.com/"
+    b'{"clicks":0,"last":null,"url":"http://www.'
+    b'{"clicks":1,"last":"20","url":"https://www.'
+)
+
+def encode_payload(
+    original_url: str,
+    access_count: Optional[int],
+    last_accessed_at: Optional[datetime],
+    target_status: Optional[int] = None,
+    target_checked_at: Optional[datetime] = None,
+) -> bytes:
+    data = {
+        "clicks": access_count or 0,
+        "last": last_accessed_at.isoformat() if last_accessed_at else None,
+        "url": original_url,
+    }
+    # Solo si se comprobó el destino: los no comprobados comprimen como en la versión 1
+    if target_checked_at is not None:
+        data["status"] = target_status
+        data["checked"] = target_checked_at.isoformat()
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=_ZDICT)
+    raw = json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+    return bytes([PAYLOAD_VERSION]) + compressor.compress(raw) + compressor.flush()
+
+def decode_payload(payload: bytes) -> dict:
+    if payload[0] not in _READABLE_VERSIONS:
+        raise ValueError(f"Versión de archivo desconocida: {payload[0]}")
+    decompressor = zlib.decompressobj(-15, zdict=_ZDICT)
+    return json.loads(decompressor.decompress(payload[1:]) + decompressor.flush())
+
+def archive_row(url, archived_at: datetime) -> dict:
+    """Valores para urls_archive a partir de una fila de urls."""
+    return {
+        "id": url.id,
+        "code": url.code,
+        "owner_id": url.owner_id,
+        "created_at": url.created_at,
+        "archived_at": archived_at,
+        "payload": encode_payload(
+            url.original_url, url.access_count, url.last_accessed_at, url.target_status, url.target_checked_at
+        ),
+    }
+
+def restore_row(archived) -> dict:
+    """Valores para urls a partir de una fila archivada."""
+    data = decode_payload(archived.payload)
+    return {
+        "id": archived.id,
+        "code": archived.code,
+        "owner_id": archived.owner_id,
+        "created_at": archived.created_at,
+        "original_url": data["url"],
+        "url_hash": url_digest(canonicalize_url(data["url"])),
+        "access_count": data["clicks"],
+        "last_accessed_at": datetime.fromisoformat(data["last"]) if data["last"] else None,
+        "target_status": data.get("status"),
+        "target_checked_at": datetime.fromisoformat(data["checked"]) if data.get("checked") else None,
+    }
+
+def _as_url(archived) -> URL:
+    # Instancia sin sesión, solo para mostrarla en las respuestas
+    return URL(**restore_row(archived))
+
+async def promote(db: AsyncSession, code: str) -> Optional[dict]:
+    """
+    Devuelve un enlace archivado a la tabla caliente (sin confirmar la transacción).
+
+    El DELETE bloquea la fila: si otro worker lo está recuperando a la vez,
+    esta llamada espera y devuelve None, y el enlace ya está en urls.
+    """
+    result = await db.execute(delete(URLArchive).where(URLArchive.code == code).returning(URLArchive))
+    archived = result.scalars().first()
+    if archived is None:
+        return None
+    values = restore_row(archived)
+    values["last_accessed_at"] = datetime.now(timezone.utc).replace(tzinfo=None)
+    await db.execute(insert(URL).values(**values))
+    return values
+
+async def get_archived(db: AsyncSession, url_id: int) -> Optional[URL]:
+    result = await db.execute(select(URLArchive).where(URLArchive.id == url_id))
+    archived = result.scalars().first()
+    return _as_url(archived) if archived else None
+
+async def delete_archived(db: AsyncSession, url_id: int) -> None:
+    await db.execute(delete(URLArchive).where(URLArchive.id == url_id))
+
+async def list_archived_for_owner(
+    db: AsyncSession, owner_id: int, limit: int, after: Optional[tuple[datetime, int]] = None
+) -> list[URL]:
+    """Enlaces archivados del usuario con el mismo orden y cursor que el listado de urls."""
+    query = select(URLArchive).where(URLArchive.owner_id == owner_id)
+    if after:
+        query = query.where(tuple_(URLArchive.created_at, URLArchive.id) < tuple_(*after))
+    query = query.order_by(URLArchive.created_at.desc(), URLArchive.id.desc()).limit(limit)
+    result = await db.execute(query)
+    return [_as_url(archived) for archived in result.scalars()]
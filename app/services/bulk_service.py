@@ -0,0 +1,225 @@
+"""
+Borrados y cambios masivos de enlaces.
+
+Cada lote es una sola sentencia `DELETE ... RETURNING` o `UPDATE ... RETURNING`
+de hasta `bulk_chunk_size` filas en su shard, confirmada por separado; la
+caché, el snapshot y los sellos de ETag se invalidan después, lote a lote.
+Los resultados se entregan por elemento en cuanto termina cada lote, y al
+final un resumen.
+
+Con ids o códigos los borrados alcanzan también al archivo frío; el filtro
+recorre solo la tabla caliente, hasta `bulk_max_filter_rows` filas. Un
+elemento de otro usuario se responde como no encontrado.
+"""
+from collections import Counter
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from sqlalchemy import Table, and_, delete, or_, select, true, update
+
+from app.core.config import get_settings
+from app.core.prometheus import BULK_ITEMS
+from app.db.models.url import URL
+from app.db.models.url_archive import URLArchive
+from app.db.models.url_geo_stat import URLGeoStat
+from app.db.session import shard_sessions
+from app.db.sharding import SHARD_BUCKETS, SHARDED_ID_BASE, shard_map, users_session
+from app.schemas.url import BulkFilter, BulkSelection, BulkUpdate
+from app.services.canonical_url import canonicalize_url, url_digest
+from app.services.etag_service import affected_versions, bump_versions
+from app.services.snapshot_service import record_created, record_deleted
+from app.services.url_service import invalidate_codes, invalidate_urls, release_link_slots
+from app.services.write_behind_service import record_removed
+
+settings = get_settings()
+
+DELETED = "deleted"
+UPDATED = "updated"
+NOT_FOUND = "not_found"
+# El bucket se está moviendo de shard: reintentar más tarde
+MOVING = "moving"
+
+# Condición sobre una tabla de enlaces (urls o urls_archive)
+Where = Callable[[Table], object]
+Apply = Callable[[int, Where], Awaitable[list]]
+
+def _owner_clause(table: Table, owner_id: Optional[int]):
+    """Sin propietario (administradores) no se restringe."""
+    return table.c.owner_id == owner_id if owner_id is not None else true()
+
+def _not_moving(table: Table):
+    if not shard_map.moving:
+        return true()
+    return or_(table.c.id < SHARDED_ID_BASE, (table.c.id % SHARD_BUCKETS).notin_(shard_map.moving))
+
+def _filter_clause(table: Table, bulk_filter: BulkFilter):
+    conditions = []
+    if bulk_filter.created_after is not None:
+        conditions.append(table.c.created_at >= bulk_filter.created_after)
+    if bulk_filter.created_before is not None:
+        conditions.append(table.c.created_at < bulk_filter.created_before)
+    if bulk_filter.original_url_prefix:
+        conditions.append(table.c.original_url.startswith(bulk_filter.original_url_prefix, autoescape=True))
+    return and_(*conditions)
+
+def _chunks(values: list, size: int) -> list[list]:
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+# Lotes
+
+async def _delete_chunk(shard: int, where: Where, owner_id: Optional[int], archive: bool) -> list:
+    tables = [URL.__table__, URLArchive.__table__] if archive else [URL.__table__]
+    rows = []
+    async with shard_sessions[shard]() as session:
+        for table in tables:
+            result = await session.execute(
+                delete(table)
+                .where(where(table), _owner_clause(table, owner_id), _not_moving(table))
+                .returning(table.c.id, table.c.code, table.c.owner_id)
+            )
+            rows.extend(result.all())
+        if rows:
+            await session.execute(delete(URLGeoStat).where(URLGeoStat.url_id.in_([row.id for row in rows])))
+            async with users_session(shard, session) as users:
+                await release_link_slots(users, (row.owner_id for row in rows))
+        await session.commit()
+
+    if rows:
+        await invalidate_urls((row.id, row.code) for row in rows)
+        await record_removed((row.id, row.code) for row in rows)
+        await bump_versions(affected_versions((row.id, row.owner_id) for row in rows))
+        for row in rows:
+            record_deleted(row.code)
+    return rows
+
+async def _update_chunk(shard: int, where: Where, owner_id: Optional[int], values: dict) -> list:
+    urls = URL.__table__
+    async with shard_sessions[shard]() as session:
+        result = await session.execute(
+            update(urls)
+            .where(where(urls), _owner_clause(urls, owner_id), _not_moving(urls))
+            .values(**values)
+            .returning(urls.c.id, urls.c.code, urls.c.owner_id, urls.c.original_url, urls.c.expires_at, urls.c.max_clicks)
+        )
+        rows = result.all()
+        await session.commit()
+
+    if rows:
+        # Los contadores de accesos siguen valiendo: solo cambian las entradas
+        await invalidate_codes(row.code for row in rows)
+        await bump_versions(affected_versions((row.id, row.owner_id) for row in rows))
+        for row in rows:
+            # El snapshot solo guarda enlaces sin límites
+            if row.expires_at is None and row.max_clicks is None:
+                record_created(row.code, row.id, row.original_url)
+            else:
+                record_deleted(row.code)
+    return rows
+
+# Recorridos
+
+def _item(row, status: str) -> dict:
+    return {"id": row.id, "code": row.code, "status": status}
+
+async def _apply_chunks(shard: int, column: str, values: list, apply: Apply, status: str,
+                        missing: list) -> AsyncIterator[dict]:
+    for chunk in _chunks(values, settings.bulk_chunk_size):
+        rows = await apply(shard, lambda table: table.c[column].in_(chunk))
+        for row in rows:
+            yield _item(row, status)
+        found = {getattr(row, column) for row in rows}
+        missing.extend(value for value in chunk if value not in found)
+
+async def _run_lists(selection: BulkSelection, apply: Apply, status: str) -> AsyncIterator[dict]:
+    """Ids o códigos agrupados por shard; los códigos anteriores al reparto se buscan luego en el 0."""
+    column = "id" if selection.ids is not None else "code"
+    values = list(dict.fromkeys(selection.ids if column == "id" else selection.codes))
+    by_shard: dict[int, list] = {}
+    for value in values:
+        if shard_map.is_moving_id(value) if column == "id" else shard_map.is_moving(value):
+            yield {column: value, "status": MOVING}
+            continue
+        shard = shard_map.shard_for_id(value) if column == "id" else shard_map.shard_for_code(value)
+        by_shard.setdefault(shard, []).append(value)
+
+    legacy, missing = [], []
+    for shard, pending in by_shard.items():
+        async for item in _apply_chunks(
+            shard, column, pending, apply, status, legacy if column == "code" and shard else missing
+        ):
+            yield item
+    async for item in _apply_chunks(0, column, legacy, apply, status, missing):
+        yield item
+    for value in missing:
+        yield {column: value, "status": NOT_FOUND}
+
+async def _run_filter(bulk_filter: BulkFilter, owner_id: Optional[int], apply: Apply, status: str) -> AsyncIterator[dict]:
+    """Recorre cada shard por id con keyset hasta `bulk_max_filter_rows` filas en total."""
+    remaining = settings.bulk_max_filter_rows
+    for shard in range(len(shard_sessions)):
+        after = 0
+        while remaining > 0:
+            size = min(settings.bulk_chunk_size, remaining)
+
+            def where(table: Table, after=after, size=size):
+                return table.c.id.in_(
+                    select(table.c.id)
+                    .where(_filter_clause(table, bulk_filter), _owner_clause(table, owner_id),
+                           _not_moving(table), table.c.id > after)
+                    .order_by(table.c.id)
+                    .limit(size)
+                    .scalar_subquery()
+                )
+
+            rows = await apply(shard, where)
+            for row in rows:
+                yield _item(row, status)
+            remaining -= len(rows)
+            if len(rows) < size:
+                break
+            after = max(row.id for row in rows)
+
+async def _run(operation: str, selection: BulkSelection, owner_id: Optional[int],
+               apply: Apply, status: str) -> AsyncIterator[dict]:
+    counts: Counter[str] = Counter()
+    if selection.filter is not None:
+        items = _run_filter(selection.filter, owner_id, apply, status)
+    else:
+        items = _run_lists(selection, apply, status)
+    async for item in items:
+        counts[item["status"]] += 1
+        yield item
+    for item_status, count in counts.items():
+        BULK_ITEMS.labels(operation, item_status).inc(count)
+    summary = {"summary": dict(counts)}
+    if selection.filter is not None:
+        # Puede haber más filas que cumplan el filtro: repetir la petición
+        summary["truncated"] = counts[status] >= settings.bulk_max_filter_rows
+    yield summary
+
+# API
+
+def bulk_delete(selection: BulkSelection, owner_id: Optional[int]) -> AsyncIterator[dict]:
+    """Borra los enlaces seleccionados; `owner_id` None solo para administradores."""
+    apply = partial(_delete_chunk, owner_id=owner_id, archive=selection.filter is None)
+    return _run("delete", selection, owner_id, apply, DELETED)
+
+def update_values(changes: BulkUpdate) -> dict:
+    values = {}
+    if "original_url" in changes.model_fields_set:
+        original_url = str(changes.original_url)
+        # Destino nuevo: sin comprobar todavía
+        values.update(
+            original_url=original_url,
+            url_hash=url_digest(canonicalize_url(original_url)),
+            target_status=None,
+            target_checked_at=None,
+        )
+    if "expires_at" in changes.model_fields_set:
+        values["expires_at"] = changes.expires_at
+    return values
+
+def bulk_update(changes: BulkUpdate, owner_id: Optional[int]) -> AsyncIterator[dict]:
+    """Aplica los mismos cambios a los enlaces seleccionados (los archivados no se tocan)."""
+    apply = partial(_update_chunk, owner_id=owner_id, values=update_values(changes))
+    return _run("update", changes, owner_id, apply, UPDATED)
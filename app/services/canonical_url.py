@@ -0,0 +1,38 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Longitud del digest en hexadecimal (128 bits)
+DIGEST_LENGTH = 32
+
+def canonicalize_url(url: str) -> str:
+    """
+    Forma canónica de una URL para detectar destinos idénticos.
+
+    Pasa esquema y host a minúsculas, quita el puerto por defecto, usa "/" como
+    ruta vacía y ordena los parámetros de la query por nombre; los repetidos
+    mantienen su orden relativo, que el destino puede interpretar. El
+    fragmento se conserva porque algunas aplicaciones lo usan para enrutar.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6
+
+    netloc = host
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo = f"{userinfo}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True), key=lambda pair: pair[0]))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, parts.fragment))
+
+def url_digest(canonical_url: str) -> str:
+    """Digest de ancho fijo de una URL canónica, usado como clave de búsqueda indexada."""
+    return hashlib.sha256(canonical_url.encode("utf-8")).hexdigest()[:DIGEST_LENGTH]
@@ -0,0 +1,177 @@
+"""
+Clics en vivo para los paneles.
+
+Cada worker agrupa sus clics y los publica en un único mensaje por intervalo;
+un solo suscriptor de Redis por worker reparte los eventos entre sus
+conexiones. Cada conexión tiene una cola acotada que descarta lo más antiguo,
+de modo que un cliente lento solo se retrasa a sí mismo.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, defaultdict, deque
+from typing import Iterable, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.config import get_settings
+from app.core.prometheus import CLICK_STREAM_DROPPED
+from app.core.redis_client import redis
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CHANNEL = "stream:clicks"
+RECONNECT_DELAY = 1.0
+LISTEN_TIMEOUT = 1.0
+
+class ClickPublisher:
+    """Acumula los clics del worker y los publica agrupados por código."""
+
+    def __init__(self, enabled: bool = settings.click_stream_publish_interval > 0):
+        self.enabled = enabled
+        self._pending: Counter[str] = Counter()
+
+    def add(self, code: str) -> None:
+        if self.enabled:
+            self._pending[code] += 1
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, Counter()
+        try:
+            await redis.publish(CHANNEL, json.dumps({"c": pending, "t": time.time()}, separators=(",", ":")))
+        except RedisError as exc:
+            # Los eventos en vivo son best-effort: el contador persistente no depende de ellos
+            logger.warning(f"No se pudieron publicar {len(pending)} códigos con clics: {exc}")
+            return 0
+        return len(pending)
+
+click_publisher = ClickPublisher()
+
+class Subscription:
+    """Cola de eventos de una conexión, acotada y con descarte de lo más antiguo."""
+
+    def __init__(self, codes: Iterable[str], max_size: int = settings.click_stream_queue_size):
+        self.codes = set(codes)
+        self.dropped = 0
+        self._queue: deque[tuple[float, dict[str, int]]] = deque(maxlen=max_size)
+        self._ready = asyncio.Event()
+
+    def push(self, timestamp: float, clicks: dict[str, int]) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+            CLICK_STREAM_DROPPED.inc()
+        self._queue.append((timestamp, clicks))
+        self._ready.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que haya eventos; False si vence el timeout."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def drain(self) -> Optional[dict]:
+        """Combina los eventos acumulados en un único frame."""
+        self._ready.clear()
+        if not self._queue:
+            return None
+        events, self._queue = list(self._queue), deque(maxlen=self._queue.maxlen)
+        clicks: Counter[str] = Counter()
+        for _, batch in events:
+            clicks.update(batch)
+        frame = {
+            "clicks": dict(clicks),
+            "from": events[0][0],
+            "to": events[-1][0],
+            "dropped": self.dropped,
+        }
+        self.dropped = 0
+        return frame
+
+class ClickHub:
+    """Suscriptor único de Redis por worker que reparte los eventos a las conexiones locales."""
+
+    def __init__(self):
+        self._by_code: dict[str, set[Subscription]] = defaultdict(set)
+        self._subscriptions: set[Subscription] = set()
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, codes: Iterable[str]) -> Subscription:
+        subscription = Subscription(codes)
+        self._subscriptions.add(subscription)
+        self._index(subscription, subscription.codes)
+        # El suscriptor solo existe mientras haya alguna conexión abierta
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen(), name="click-hub")
+        return subscription
+
+    def update(self, subscription: Subscription, codes: Iterable[str]) -> None:
+        codes = set(codes)
+        self._unindex(subscription, subscription.codes - codes)
+        self._index(subscription, codes - subscription.codes)
+        subscription.codes = codes
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+        self._unindex(subscription, subscription.codes)
+        if not self._subscriptions and self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    def connections(self) -> int:
+        return len(self._subscriptions)
+
+    def _index(self, subscription: Subscription, codes: Iterable[str]) -> None:
+        for code in codes:
+            self._by_code[code].add(subscription)
+
+    def _unindex(self, subscription: Subscription, codes: Iterable[str]) -> None:
+        for code in codes:
+            subscribers = self._by_code.get(code)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_code[code]
+
+    def dispatch(self, timestamp: float, clicks: dict[str, int]) -> None:
+        """Entrega a cada conexión solo los códigos que sigue; nunca espera a un cliente."""
+        targets: dict[Subscription, dict[str, int]] = defaultdict(dict)
+        for code, count in clicks.items():
+            for subscription in self._by_code.get(code, ()):
+                targets[subscription][code] = count
+        for subscription, batch in targets.items():
+            subscription.push(timestamp, batch)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(CHANNEL)
+                while True:
+                    # Con timeout propio: el socket_timeout del pool cortaría una espera indefinida
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=LISTEN_TIMEOUT)
+                    if message is None or message["type"] != "message":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                        self.dispatch(event["t"], event["c"])
+                    except (KeyError, TypeError, ValueError):
+                        logger.warning(f"Evento de clics ilegible en {CHANNEL}")
+            except RedisError as exc:
+                logger.warning(f"Suscripción a {CHANNEL} interrumpida: {exc}")
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+click_hub = ClickHub()
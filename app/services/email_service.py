@@ -1,4 +1,55 @@
-from app.core.celery_app import send_email_task
+import asyncio
+import logging
+
+from app.core.celery_app import send_email_batch_task
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class EmailQueue:
+    """
+    Buffer de correos pendientes que se publican en lotes.
+
+    Encolar nunca bloquea el event loop: la publicación en el broker se hace en
+    un hilo, con un único mensaje de Celery por lote.
+    """
+
+    def __init__(self, batch_size: int = settings.email_batch_size):
+        self.batch_size = batch_size
+        self._pending: list[dict] = []
+        self._started = False
+
+    def start(self) -> None:
+        """A partir de aquí los correos se acumulan hasta el siguiente volcado."""
+        self._started = True
+
+    async def enqueue(self, to_email: str, subject: str, body: str) -> None:
+        message = {"to_email": to_email, "subject": subject, "body": body}
+        if not self._started:
+            # Sin lifespan (scripts, tests) no hay volcado periódico: publicar ya
+            await asyncio.to_thread(send_email_batch_task.delay, [message])
+            return
+        self._pending.append(message)
+
+    async def flush(self) -> int:
+        """Publica los correos acumulados en lotes de `batch_size`."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        published = 0
+        try:
+            for batch in batches:
+                await asyncio.to_thread(send_email_batch_task.delay, batch)
+                published += len(batch)
+        except Exception:
+            # Devolver al buffer lo que no se pudo publicar
+            self._pending[:0] = pending[published:]
+            raise
+        return published
+
+email_queue = EmailQueue()
 
 async def send_email_background(to_email: str, subject: str, body: str):
-    send_email_task.delay(to_email, subject, body)
+    await email_queue.enqueue(to_email, subject, body)
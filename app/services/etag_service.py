@@ -0,0 +1,114 @@
+"""
+ETags débiles para las lecturas de enlaces.
+
+Cada recurso (un enlace, los enlaces de un usuario, el listado global) tiene
+un sello de versión aleatorio en Redis. Las lecturas leen el sello antes de
+consultar la base de datos y lo usan como ETag; las escrituras borran los
+sellos afectados después de confirmar, y la siguiente lectura crea uno nuevo.
+Con un `If-None-Match` que coincide se responde 304 sin tocar Postgres.
+
+Los sellos no son contadores: si una clave se pierde o expira, el sello nuevo
+no puede repetir uno antiguo, así que en el peor caso se sirve un 200 de más.
+"""
+import hashlib
+import logging
+import secrets
+from typing import Iterable, Optional
+
+from fastapi import Request, Response, status
+from redis.exceptions import RedisError
+
+from app.core.config import get_settings
+from app.core.prometheus import CONDITIONAL_READS
+from app.core.redis_client import delete_keys, redis
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = "ver:"
+# Listado global: cambia con cualquier alta, baja o clic
+ALL_URLS_VERSION = VERSION_PREFIX + "urls"
+# Revalidar siempre, pero permitir que el cliente guarde la respuesta
+CACHE_CONTROL = "private, no-cache"
+
+def url_version(url_id: int) -> str:
+    return f"{VERSION_PREFIX}url:{url_id}"
+
+def owner_version(owner_id: int) -> str:
+    return f"{VERSION_PREFIX}owner:{owner_id}"
+
+def affected_versions(rows: Iterable[tuple[int, Optional[int]]]) -> set[str]:
+    """Sellos que cambian al modificar enlaces (id, propietario)."""
+    keys = {ALL_URLS_VERSION}
+    for url_id, owner_id in rows:
+        keys.add(url_version(url_id))
+        if owner_id is not None:
+            keys.add(owner_version(owner_id))
+    return keys
+
+# Lee los sellos y crea con el valor propuesto los que falten, en un round-trip
+_READ_VERSIONS = """
+local versions = {}
+for i, key in ipairs(KEYS) do
+    local version = redis.call("get", key)
+    if not version then
+        version = ARGV[i]
+        redis.call("set", key, version, "ex", ARGV[#KEYS + 1])
+    end
+    versions[i] = version
+end
+return versions
+"""
+
+async def read_versions(*keys: str) -> Optional[list[str]]:
+    """Sellos actuales de las claves; None si Redis no responde (se sirve sin ETag)."""
+    proposed = [secrets.token_hex(6) for _ in keys]
+    try:
+        return await redis.eval(_READ_VERSIONS, len(keys), *keys, *proposed, settings.etag_version_ttl)
+    except RedisError as exc:
+        logger.warning(f"No se pudieron leer los sellos de versión: {exc}")
+        return None
+
+async def bump_versions(keys: Iterable[str]) -> None:
+    """Invalida los sellos; llamar después de confirmar la escritura en la base de datos."""
+    try:
+        await delete_keys(keys)
+    except RedisError as exc:
+        # Los ETags afectados siguen valiendo hasta que el sello expire
+        logger.warning(f"No se pudieron invalidar los sellos de versión: {exc}")
+
+def make_etag(*parts: object) -> str:
+    return 'W/"' + ".".join(str(part) for part in parts) + '"'
+
+def params_digest(*values: object) -> str:
+    """Resumen corto de los parámetros de una página, para que su ETag no valga en otra."""
+    raw = "|".join("" if value is None else str(value) for value in values)
+    return hashlib.blake2s(raw.encode(), digest_size=4).hexdigest()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Comparación débil de If-None-Match (RFC 9110 §13.1.2).
+
+    `*` no se trata: responder con el cuerpo completo siempre es correcto.
+    """
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+def check_not_modified(request: Request, response: Response, etag: Optional[str]) -> Optional[Response]:
+    """
+    Devuelve un 304 si el cliente ya tiene la versión `etag`; si no, la anota
+    en `response` para la respuesta completa. Sin sello no hace nada.
+    """
+    if etag is None:
+        return None
+    if_none_match = request.headers.get("if-none-match")
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        CONDITIONAL_READS.labels("not_modified").inc()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if if_none_match:
+        CONDITIONAL_READS.labels("modified").inc()
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,144 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.redis_client import acquire_job_lock
+from app.db.models.url import URL
+from app.db.models.url_archive import URLArchive
+from app.db.models.url_geo_stat import URLGeoStat
+from app.db.session import shard_sessions
+from app.db.sharding import users_session
+from app.services.archive_service import archive_row
+from app.services.etag_service import affected_versions, bump_versions
+from app.services.snapshot_service import record_deleted
+from app.services.url_service import invalidate_urls, release_link_slots
+from app.services.write_behind_service import record_removed
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+def _expired_batch(batch_size: int):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    # Recorre ix_urls_expires_at; SKIP LOCKED evita esperar filas en uso
+    return (
+        select(URL.id)
+        .where(URL.expires_at <= now)
+        .order_by(URL.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+def _exhausted_batch(batch_size: int):
+    # Recorre ix_urls_max_clicks, que solo contiene enlaces con límite
+    return (
+        select(URL.id)
+        .where(URL.max_clicks.isnot(None), URL.consumed_clicks >= URL.max_clicks)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+async def _purge(session: AsyncSession, shard: int, batch_query, batch_size: int) -> int:
+    """Borra por lotes, cada uno en su propia transacción corta."""
+    total = 0
+    while True:
+        result = await session.execute(
+            delete(URL)
+            .where(URL.id.in_(batch_query(batch_size).scalar_subquery()))
+            .returning(URL.id, URL.code, URL.owner_id)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        async with users_session(shard, session) as users:
+            await release_link_slots(users, (row.owner_id for row in rows))
+        if rows:
+            await session.execute(delete(URLGeoStat).where(URLGeoStat.url_id.in_([row.id for row in rows])))
+        await session.commit()
+        if not rows:
+            return total
+        await invalidate_urls((row.id, row.code) for row in rows)
+        await record_removed((row.id, row.code) for row in rows)
+        await bump_versions(affected_versions((row.id, row.owner_id) for row in rows))
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+async def purge_expired_urls(batch_size: int = settings.expired_purge_batch_size) -> int:
+    """Elimina los enlaces expirados o sin accesos disponibles de todos los shards."""
+    expired = exhausted = 0
+    for shard, factory in enumerate(shard_sessions):
+        async with factory() as session:
+            expired += await _purge(session, shard, _expired_batch, batch_size)
+            exhausted += await _purge(session, shard, _exhausted_batch, batch_size)
+    if expired or exhausted:
+        logger.info(f"Barrido de enlaces: {expired} expirados, {exhausted} agotados")
+    return expired + exhausted
+
+async def run_expired_purge() -> None:
+    """Trabajo periódico: solo un worker barre en cada intervalo."""
+    if await acquire_job_lock("purge-expired", settings.expired_purge_interval):
+        await purge_expired_urls()
+
+# Archivado de enlaces fríos
+
+def _cold_batch(cutoff: datetime, after: int, batch_size: int):
+    # Solo enlaces sin límites: los demás los retira el barrido al expirar
+    return (
+        select(URL.id)
+        .where(
+            URL.id > after,
+            func.coalesce(URL.last_accessed_at, URL.created_at) < cutoff,
+            URL.expires_at.is_(None),
+            URL.max_clicks.is_(None),
+        )
+        .order_by(URL.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+async def archive_cold_urls(
+    days: int = settings.archive_after_days, batch_size: int = settings.archive_batch_size
+) -> int:
+    """Mueve a urls_archive los enlaces sin accesos en los últimos `days` días."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = now - timedelta(days=days)
+    total = 0
+    # Cada shard archiva en su propia tabla urls_archive
+    for factory in shard_sessions:
+        total += await _archive_shard(factory, cutoff, now, batch_size)
+    if total:
+        logger.info(f"Archivado de enlaces: {total} sin accesos en {days} días")
+    return total
+
+async def _archive_shard(factory, cutoff: datetime, now: datetime, batch_size: int) -> int:
+    total, after = 0, 0
+    async with factory() as session:
+        while True:
+            ids = (await session.execute(_cold_batch(cutoff, after, batch_size))).scalars().all()
+            if not ids:
+                break
+            result = await session.execute(
+                delete(URL)
+                .where(URL.id.in_(ids))
+                .returning(*URL.__table__.c)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            # El enlace sigue existiendo: link_count del propietario no cambia
+            await session.execute(insert(URLArchive), [archive_row(row, now) for row in rows])
+            await session.commit()
+            await invalidate_urls((row.id, row.code) for row in rows)
+            await record_removed((row.id, row.code) for row in rows)
+            for row in rows:
+                record_deleted(row.code)
+            total += len(rows)
+            after = ids[-1]
+            if len(ids) < batch_size:
+                break
+    return total
+
+async def run_cold_archive() -> None:
+    if await acquire_job_lock("archive-cold", settings.archive_interval):
+        await archive_cold_urls()
@@ -0,0 +1,304 @@
+"""
+Resolución GeoIP local: país y ASN por IP sin servicios externos.
+
+La base se compila a partir de un CSV (o de un MMDB si está instalado
+`maxminddb`) a un archivo binario que cada worker mapea en memoria; el sistema
+operativo comparte sus páginas entre procesos. Formato (little-endian):
+
+    cabecera  : magic (8 bytes) | n4 (u64) | n6 (u64) | valores (u64)
+    v6_starts : n6 × u64, primeros 64 bits del inicio de cada rango IPv6
+    v6_ends   : n6 × u64
+    v4_starts : n4 × u32, ordenados y sin solapes
+    v4_ends   : n4 × u32
+    v4_values : n4 × u32, índice en la tabla de valores
+    v6_values : n6 × u32
+    valores   : n × (país 2 bytes | relleno 2 | ASN u32)
+
+Los rangos IPv6 se indexan por su prefijo /64, que es la granularidad de las
+bases de geolocalización. Cada búsqueda es una bisección sobre las columnas.
+
+Los clics no se resuelven en la petición: se acumulan (enlace, IP) en memoria
+y el volcado periódico los resuelve en lote y suma por país y ASN.
+"""
+import argparse
+import bisect
+import csv
+import ipaddress
+import logging
+import mmap
+import os
+import socket
+import struct
+import tempfile
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import get_settings
+from app.db.models.url_geo_stat import URLGeoStat
+from app.db.session import shard_sessions
+from app.db.sharding import shard_map
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SLGGEO01"
+HEADER = struct.Struct("<8sQQQ")
+VALUE = struct.Struct("<2sxxI")
+
+# País y ASN de las IPs que no están en la base (privadas, sin asignar)
+UNKNOWN_COUNTRY = "ZZ"
+
+@dataclass(frozen=True)
+class GeoInfo:
+    country: str
+    asn: int
+
+IPKey = tuple[int, int]  # versión, clave (IPv4 completa o prefijo /64 de IPv6)
+
+_V4_MAPPED = b"\x00" * 10 + b"\xff\xff"
+
+def ip_key(ip: str) -> Optional[IPKey]:
+    """Clave de búsqueda de una IP en texto; None si no es válida."""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except OSError:
+        return None
+    if packed.startswith(_V4_MAPPED):
+        return 4, int.from_bytes(packed[12:], "big")
+    return 6, int.from_bytes(packed[:8], "big")
+
+# Escritura
+
+Range = tuple[int, int, str, int]  # inicio, fin, país, ASN
+
+def _network_range(network) -> tuple[int, int, int]:
+    """(versión, inicio, fin) de una red; las IPv4 embebidas en IPv6 vuelven a IPv4."""
+    if network.version == 6 and network.network_address.ipv4_mapped:
+        network = ipaddress.ip_network(
+            f"{network.network_address.ipv4_mapped}/{max(0, network.prefixlen - 96)}"
+        )
+    if network.version == 4:
+        return 4, int(network.network_address), int(network.broadcast_address)
+    return 6, int(network.network_address) >> 64, int(network.broadcast_address) >> 64
+
+def read_csv(path: str) -> Iterator[tuple[int, Range]]:
+    """Filas `inicio,fin,país,asn` (IPs en texto) o `red_cidr,país,asn`; admite cabecera."""
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                if len(row) == 3:
+                    version, start, end = _network_range(ipaddress.ip_network(row[0].strip(), strict=False))
+                    country, asn = row[1], row[2]
+                else:
+                    first, last = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+                    version, start, _ = _network_range(ipaddress.ip_network(first))
+                    _, _, end = _network_range(ipaddress.ip_network(last))
+                    country, asn = row[2], row[3]
+            except ValueError:
+                # Cabecera u otra línea sin IPs
+                continue
+            yield version, (start, end, country.strip().upper() or UNKNOWN_COUNTRY, int(asn or 0))
+
+def read_mmdb(path: str) -> Iterator[tuple[int, Range]]:
+    """Recorre un MMDB con `country.iso_code` y/o `autonomous_system_number`."""
+    try:
+        import maxminddb
+    except ImportError as exc:
+        raise RuntimeError("Leer bases MMDB requiere el paquete maxminddb") from exc
+    with maxminddb.open_database(path) as reader:
+        for network, record in reader:
+            record = record or {}
+            country = (record.get("country") or record.get("registered_country") or {}).get("iso_code")
+            version, start, end = _network_range(network)
+            yield version, (start, end, country or UNKNOWN_COUNTRY, record.get("autonomous_system_number") or 0)
+
+def write_geoip_db(path: str, ranges: Iterable[tuple[int, Range]]) -> int:
+    """Escribe de forma atómica la base a partir de rangos (versión, (inicio, fin, país, asn))."""
+    by_version: dict[int, list[Range]] = {4: [], 6: []}
+    for version, item in ranges:
+        by_version[version].append(item)
+
+    values: dict[tuple[str, int], int] = {}
+    columns = {}
+    for version, items in by_version.items():
+        items.sort()
+        starts, ends, refs = array("Q" if version == 6 else "I"), array("Q" if version == 6 else "I"), array("I")
+        for start, end, country, asn in items:
+            if end < start or (ends and start <= ends[-1]):
+                raise ValueError(f"Rangos IPv{version} solapados o invertidos cerca de {start}")
+            starts.append(start)
+            ends.append(end)
+            refs.append(values.setdefault((country[:2], asn), len(values)))
+        columns[version] = (starts, ends, refs)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".geoip-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(HEADER.pack(MAGIC, len(columns[4][0]), len(columns[6][0]), len(values)))
+            # Primero las columnas de 8 bytes: todas quedan alineadas a su tamaño
+            for column in (columns[6][0], columns[6][1], columns[4][0], columns[4][1], columns[4][2], columns[6][2]):
+                column.tofile(out)
+            for country, asn in values:
+                out.write(VALUE.pack(country.encode("ascii"), asn))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(columns[4][0]) + len(columns[6][0])
+
+# Lectura
+
+class GeoIndex:
+    """Columnas de rangos mapeadas en memoria y búsqueda por bisección."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n4, n6, n_values = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} no es una base GeoIP válida")
+
+        self._view = view = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def column(count: int, fmt: str) -> memoryview:
+            nonlocal offset
+            size = count * struct.calcsize(fmt)
+            data = view[offset:offset + size].cast(fmt)
+            offset += size
+            return data
+
+        v6_starts, v6_ends = column(n6, "Q"), column(n6, "Q")
+        v4_starts, v4_ends, v4_values = column(n4, "I"), column(n4, "I"), column(n4, "I")
+        v6_values = column(n6, "I")
+        self._tables = {4: (v4_starts, v4_ends, v4_values), 6: (v6_starts, v6_ends, v6_values)}
+        # Pocos valores distintos: se materializan una vez
+        self._values = [
+            GeoInfo(country.decode("ascii"), asn)
+            for country, asn in VALUE.iter_unpack(view[offset:offset + n_values * VALUE.size])
+        ]
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts, _, _ in self._tables.values())
+
+    def _find(self, version: int, key: int) -> Optional[GeoInfo]:
+        starts, ends, values = self._tables[version]
+        position = bisect.bisect_right(starts, key) - 1
+        if position >= 0 and key <= ends[position]:
+            return self._values[values[position]]
+        return None
+
+    def lookup(self, ip: str) -> Optional[GeoInfo]:
+        key = ip_key(ip)
+        return self._find(*key) if key else None
+
+    def lookup_many(self, ips: Iterable[str]) -> dict[str, Optional[GeoInfo]]:
+        """Resuelve un lote; cada IP distinta se busca una sola vez."""
+        return {ip: self.lookup(ip) for ip in set(ips)}
+
+    def close(self) -> None:
+        for starts, ends, values in self._tables.values():
+            for view in (starts, ends, values):
+                view.release()
+        self._view.release()
+        self._mmap.close()
+
+def _open_index(path: Optional[str]) -> Optional[GeoIndex]:
+    if not path:
+        return None
+    try:
+        return GeoIndex(path)
+    except (OSError, ValueError) as exc:
+        # Sin base los clics se siguen contando, solo sin país
+        logger.warning(f"GeoIP deshabilitado: {exc}")
+        return None
+
+geo_index = _open_index(settings.geoip_db_path)
+
+def lookup_ip(ip: str) -> Optional[GeoInfo]:
+    return geo_index.lookup(ip) if geo_index else None
+
+# Agregación de clics por país y ASN
+
+class GeoClickBuffer:
+    """Acumula (enlace, IP) y al volcar resuelve las IPs en lote y suma por país y ASN."""
+
+    def __init__(self, index: Optional[GeoIndex]):
+        self.index = index
+        self._pending: Counter[tuple[int, str]] = Counter()
+
+    def add(self, url_id: int, ip: str) -> None:
+        if self.index is not None:
+            self._pending[(url_id, ip)] += 1
+
+    def aggregate(self, pending: Counter) -> Counter[tuple[int, str, int]]:
+        resolved = self.index.lookup_many(ip for _, ip in pending)
+        totals: Counter[tuple[int, str, int]] = Counter()
+        for (url_id, ip), hits in pending.items():
+            info = resolved[ip]
+            totals[(url_id, info.country, info.asn) if info else (url_id, UNKNOWN_COUNTRY, 0)] += hits
+        return totals
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, Counter()
+        # Orden fijo de filas: dos workers no se bloquean en orden inverso
+        rows = [
+            {"url_id": url_id, "country": country, "asn": asn, "clicks": clicks}
+            for (url_id, country, asn), clicks in sorted(self.aggregate(pending).items())
+        ]
+        statement = insert(URLGeoStat)
+        statement = statement.on_conflict_do_update(
+            index_elements=[URLGeoStat.url_id, URLGeoStat.country, URLGeoStat.asn],
+            set_={"clicks": URLGeoStat.clicks + statement.excluded.clicks},
+        )
+        # Los contadores viven en el shard del enlace
+        by_shard: dict[int, list[dict]] = {}
+        for row in rows:
+            by_shard.setdefault(shard_map.shard_for_id(row["url_id"]), []).append(row)
+        flushed = set()
+        try:
+            for shard, shard_rows in by_shard.items():
+                async with shard_sessions[shard]() as session:
+                    await session.execute(statement, shard_rows)
+                    await session.commit()
+                flushed.add(shard)
+        except Exception:
+            # Solo vuelve lo de los shards que no llegaron a confirmarse
+            self._pending.update({
+                key: hits for key, hits in pending.items() if shard_map.shard_for_id(key[0]) not in flushed
+            })
+            raise
+        return len(rows)
+
+geo_clicks = GeoClickBuffer(geo_index)
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Compila la base GeoIP local")
+    parser.add_argument("source", help="CSV (inicio,fin,país,asn o red,país,asn) o archivo .mmdb")
+    parser.add_argument("--path", default=settings.geoip_db_path)
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("Indica --path o configura GEOIP_DB_PATH")
+
+    reader = read_mmdb if args.source.endswith(".mmdb") else read_csv
+    count = write_geoip_db(args.path, reader(args.source))
+    print(f"Base GeoIP {args.path}: {count} rangos")
+
+if __name__ == "__main__":
+    _main()
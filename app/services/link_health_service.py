@@ -0,0 +1,324 @@
+"""
+Comprobación en segundo plano de los destinos de los enlaces.
+
+Recorre `urls` por id (keyset) en lotes y consulta cada destino con un único
+cliente HTTP asíncrono con pool de conexiones: HEAD primero y GET sin leer el
+cuerpo si el servidor no admite HEAD. Las peticiones se limitan por host y
+en total por segundo, y el resultado se cachea por (host, ruta) para no
+repetir la consulta cuando muchos enlaces apuntan al mismo destino. Las
+redirecciones se siguen a mano para volver a comprobar cada salto: no se
+consulta nada que resuelva a una dirección no pública, y la conexión va a la
+dirección comprobada sin volver a resolver el nombre (DNS rebinding).
+
+El estado final se guarda en `urls.target_status`; la redirección marca los
+enlaces cuyo destino devuelve 404 o 410 y, si se configura, los bloquea.
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import httpx
+from sqlalchemy import bindparam, or_, select, update
+
+from app.core.config import get_settings
+from app.core.prometheus import LINK_HEALTH_CHECKS
+from app.core.redis_client import acquire_job_lock, delete_keys, redis
+from app.db.models.url import BROKEN_STATUSES, URL
+from app.db.session import shard_sessions
+from app.services.snapshot_service import record_created, record_deleted
+from app.services.url_service import CACHE_PREFIX
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = "link-health:cursor"
+USER_AGENT = "ShortLinkGuardian-LinkCheck/1.0"
+
+# Respuestas a HEAD de servidores que solo implementan GET
+HEAD_UNSUPPORTED = frozenset({400, 403, 405, 501})
+
+# Hosts internos que nunca se consultan, además de las IPs no públicas
+_BLOCKED_HOSTS = {"localhost", "localhost.localdomain"}
+
+# Saltos de redirección que se siguen antes de darse por vencido
+MAX_REDIRECTS = 5
+
+def verdict(status: int) -> str:
+    if status in BROKEN_STATUSES:
+        return "broken"
+    if 0 < status < 400:
+        return "ok"
+    return "error"
+
+class RateLimiter:
+    """Reparte las peticiones en huecos de 1/rate segundos entre todas las tareas."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class ResultCache:
+    """LRU con TTL de estados por (host, ruta); compartido entre ejecuciones del worker."""
+
+    def __init__(self, ttl: float, maxsize: int = 100_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items: OrderedDict[tuple[str, str], tuple[float, int]] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> Optional[int]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return item[1]
+
+    def set(self, key: tuple[str, str], status: int) -> None:
+        self._items[key] = (time.monotonic() + self.ttl, status)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+result_cache = ResultCache(settings.link_health_cache_ttl)
+
+class HealthChecker:
+    """Consulta destinos con límites por host y globales sobre un cliente compartido."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        per_host: int = 2,
+        rate: float = 0.0,
+        cache: Optional[ResultCache] = None,
+        allow_private: bool = False,
+    ):
+        self.client = client
+        self.per_host = per_host
+        self.rate = RateLimiter(rate)
+        self.cache = cache if cache is not None else ResultCache(settings.link_health_cache_ttl)
+        # Con allow_private se pueden consultar servidores locales (tests)
+        self.allow_private = allow_private
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+    def _address_allowed(self, address: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+        return self.allow_private or address.is_global
+
+    def _key(self, url: str) -> Optional[tuple[str, str]]:
+        """(host, ruta) de un destino consultable; None si no debe consultarse."""
+        try:
+            parsed = httpx.URL(url)
+        except (httpx.InvalidURL, TypeError):
+            return None
+        host = parsed.host.lower()
+        if parsed.scheme not in ("http", "https") or not host:
+            return None
+        if not self.allow_private and host in _BLOCKED_HOSTS:
+            return None
+        try:
+            if not self._address_allowed(ipaddress.ip_address(host)):
+                return None
+        except ValueError:
+            pass
+        origin = f"{parsed.scheme}://{parsed.netloc.decode('ascii').lower()}"
+        return origin, parsed.raw_path.decode("ascii")
+
+    async def _resolve(self, host: str) -> list[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return [info[4][0] for info in infos]
+
+    async def _address_for(self, host: str) -> Optional[str]:
+        """IP a la que conectar para `host`; None si alguna de sus direcciones no es pública."""
+        try:
+            ipaddress.ip_address(host)
+            return host  # las IPs literales ya las filtra _key
+        except ValueError:
+            pass
+        addresses = await self._resolve(host)
+        # Las IPv6 con zona ("fe80::1%eth0") no son públicas en ningún caso
+        if not all("%" not in address and self._address_allowed(ipaddress.ip_address(address))
+                   for address in addresses):
+            return None
+        return addresses[0]
+
+    def _pinned(self, method: str, url: str, address: str) -> httpx.Request:
+        """Petición a `address` con el Host y el SNI del nombre original."""
+        target = httpx.URL(url)
+        return self.client.build_request(
+            method,
+            target.copy_with(host=address),
+            headers={"Host": target.netloc.decode("ascii")},
+            extensions={"sni_hostname": target.raw_host.decode("ascii")},
+        )
+
+    async def _probe(self, url: str) -> Optional[int]:
+        """Estado final siguiendo las redirecciones a mano; None si algún salto no es consultable."""
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                if self._key(url) is None:
+                    return None
+                address = await self._address_for(httpx.URL(url).raw_host.decode("ascii"))
+                if address is None:
+                    return None
+                response = await self.client.send(self._pinned("HEAD", url, address), follow_redirects=False)
+                if response.status_code in HEAD_UNSUPPORTED:
+                    # Solo importa el estado: el cuerpo no se descarga
+                    response = await self.client.send(
+                        self._pinned("GET", url, address), stream=True, follow_redirects=False
+                    )
+                    await response.aclose()
+                if not response.has_redirect_location:
+                    return response.status_code
+                # Relativa al nombre original, no a la IP a la que se conectó
+                url = str(httpx.URL(url).join(response.headers["Location"]))
+            return 0
+        except (httpx.HTTPError, socket.gaierror):
+            # Sin respuesta o el nombre no resuelve
+            return 0
+
+    async def check(self, url: str) -> Optional[int]:
+        """Estado HTTP final del destino (0 si no responde); None si no se consulta."""
+        key = self._key(url)
+        if key is None:
+            LINK_HEALTH_CHECKS.labels("skipped").inc()
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            LINK_HEALTH_CHECKS.labels("cached").inc()
+            return cached
+
+        # Varios enlaces al mismo destino en el lote comparten una sola consulta
+        task = self._inflight.get(key)
+        if task is not None:
+            LINK_HEALTH_CHECKS.labels("cached").inc()
+        else:
+            task = asyncio.ensure_future(self._fetch(key, url))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: tuple[str, str], url: str) -> Optional[int]:
+        async with self._hosts.setdefault(key[0], asyncio.Semaphore(self.per_host)):
+            await self.rate.wait()
+            status = await self._probe(url)
+        if status is None:
+            LINK_HEALTH_CHECKS.labels("skipped").inc()
+            return None
+        self.cache.set(key, status)
+        LINK_HEALTH_CHECKS.labels(verdict(status)).inc()
+        return status
+
+def create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=settings.link_health_timeout,
+        # Las redirecciones se siguen en _probe, comprobando cada salto
+        follow_redirects=False,
+        limits=httpx.Limits(
+            max_connections=settings.link_health_concurrency,
+            max_keepalive_connections=settings.link_health_concurrency,
+        ),
+        headers={"User-Agent": USER_AGENT},
+    )
+
+async def _next_batch(factory, after: int, stale_before: datetime, limit: int):
+    async with factory() as session:
+        result = await session.execute(
+            select(URL.id, URL.code, URL.original_url, URL.expires_at, URL.max_clicks, URL.target_status)
+            .where(
+                URL.id > after,
+                or_(URL.target_checked_at.is_(None), URL.target_checked_at < stale_before),
+            )
+            .order_by(URL.id)
+            .limit(limit)
+        )
+        return result.all()
+
+async def _store(factory, rows, statuses: list[Optional[int]], checked_at: datetime) -> None:
+    urls = URL.__table__
+    statement = (
+        update(urls)
+        .where(urls.c.id == bindparam("url_id"))
+        .values(target_status=bindparam("status"), target_checked_at=checked_at)
+    )
+    async with factory() as session:
+        await session.execute(
+            statement, [{"url_id": row.id, "status": status} for row, status in zip(rows, statuses)]
+        )
+        await session.commit()
+
+    # Solo los enlaces que cambian de rotos a sanos o al revés afectan a la redirección
+    changed = [
+        (row, status) for row, status in zip(rows, statuses)
+        if (row.target_status in BROKEN_STATUSES) != (status in BROKEN_STATUSES)
+    ]
+    if not changed:
+        return
+    await delete_keys([CACHE_PREFIX + row.code for row, _ in changed])
+    for row, status in changed:
+        if row.expires_at is None and row.max_clicks is None:
+            if status in BROKEN_STATUSES:
+                record_deleted(row.code)
+            else:
+                record_created(row.code, row.id, row.original_url)
+
+async def check_targets(checker: HealthChecker, max_urls: int, batch_size: int) -> Counter:
+    """
+    Comprueba hasta `max_urls` destinos no revisados recientemente, repartidos entre los shards.
+
+    Cada shard continúa desde el último id visitado por la ejecución anterior;
+    al llegar al final de la tabla la siguiente vuelve a empezar.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    stale_before = now - timedelta(hours=settings.link_health_recheck_hours)
+    per_shard = -(-max_urls // len(shard_sessions))
+    totals: Counter = Counter()
+    for shard, factory in enumerate(shard_sessions):
+        cursor_key = CURSOR_KEY if shard == 0 else f"{CURSOR_KEY}:{shard}"
+        cursor = int(await redis.get(cursor_key) or 0)
+        checked = 0
+        while checked < per_shard:
+            # La sesión no se mantiene abierta mientras se consultan los destinos
+            rows = await _next_batch(factory, cursor, stale_before, min(batch_size, per_shard - checked))
+            if not rows:
+                cursor = 0
+                break
+            statuses = await asyncio.gather(*(checker.check(row.original_url) for row in rows))
+            await _store(factory, rows, statuses, now)
+            totals.update("skipped" if status is None else verdict(status) for status in statuses)
+            checked += len(rows)
+            cursor = rows[-1].id
+        await redis.set(cursor_key, cursor)
+    return totals
+
+async def run_link_health() -> None:
+    if not await acquire_job_lock("link-health", settings.link_health_interval):
+        return
+    async with create_client() as client:
+        checker = HealthChecker(
+            client,
+            per_host=settings.link_health_per_host,
+            rate=settings.link_health_rate,
+            cache=result_cache,
+        )
+        totals = await check_targets(checker, settings.link_health_max_urls, settings.link_health_batch_size)
+    if totals:
+        logger.info(f"Destinos comprobados: {dict(totals)}")
@@ -0,0 +1,224 @@
+"""
+Movimiento de buckets de códigos entre shards sin parar el servicio.
+
+    python -m app.services.shard_rebalance init --shard 1
+    python -m app.services.shard_rebalance move --bucket 12 --to 1
+    python -m app.services.shard_rebalance status
+
+Mover un bucket copia sus filas (urls, urls_archive, url_geo_stats) en varias
+pasadas idempotentes mientras el servicio sigue escribiendo en el origen:
+
+1. copia inicial; las escrituras siguen en el origen
+2. el bucket pasa a `moving`: no se crean códigos en él ni se eliminan sus
+   enlaces; tras un intervalo de refresco todos los workers lo saben
+3. nueva pasada y el mapa apunta al destino; otro intervalo después, una
+   última pasada recoge los clics que los workers con el mapa anterior
+   escribieron aún en el origen, y se borran allí las filas
+
+Cada pasada hace upsert en el destino y borra de él lo que ya no existe en el
+origen. Los contadores se trasladan como incremento: lo que creció el origen
+desde la pasada anterior se suma a lo que ya tiene el destino, así no se
+pierden los clics que los workers con el mapa nuevo anotaron allí. Solo se
+mueven los enlaces con ids de shard: los anteriores se quedan en el shard 0.
+"""
+import argparse
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import Table, and_, delete, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.core.config import get_settings
+from app.db.models.url import URL
+from app.db.models.url_archive import URLArchive
+from app.db.models.url_geo_stat import URLGeoStat
+from app.db.models.url_shard import URLShard
+from app.db.session import async_session, close_engine, shard_engines, shard_sessions
+from app.db.sharding import SHARD_BUCKETS, SHARDED_ID_BASE, refresh_shard_map, shard_map
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Tabla, columna con el id del enlace, columnas de conflicto, contadores (se suman
+# los incrementos) y marcas de tiempo (se queda la más reciente)
+SHARDED_TABLES: list[tuple[Table, str, tuple[str, ...], tuple[str, ...], tuple[str, ...]]] = [
+    # Por código: en urls particionada no hay clave primaria en id
+    (URL.__table__, "id", ("code",), ("access_count", "consumed_clicks"), ("last_accessed_at",)),
+    (URLArchive.__table__, "id", ("id",), (), ()),
+    (URLGeoStat.__table__, "url_id", ("url_id", "country", "asn"), ("clicks",), ()),
+]
+
+def bucket_filter(table: Table, id_column: str, bucket: int):
+    column = table.c[id_column]
+    return and_(column >= SHARDED_ID_BASE, column % SHARD_BUCKETS == bucket)
+
+def upsert(table: Table, conflict: tuple[str, ...], counters: tuple[str, ...] = (),
+           latest: tuple[str, ...] = (), accumulate: bool = False):
+    """Con `accumulate` los contadores llegan como incremento y se suman a los del destino."""
+    statement = insert(table)
+
+    def value(column):
+        excluded = statement.excluded[column.name]
+        if accumulate and column.name in counters:
+            return column + excluded
+        if column.name in latest:
+            return func.greatest(column, excluded)
+        return excluded
+
+    set_ = {column.name: value(column) for column in table.c if column.name not in conflict}
+    return statement.on_conflict_do_update(index_elements=list(conflict), set_=set_)
+
+def carry_counters(rows: list[dict], keys: list[str], counters: tuple[str, ...],
+                   carried: dict[tuple, dict[str, int]]) -> tuple[list[dict], list[dict]]:
+    """
+    Separa las filas que se copian tal cual de las que ya se copiaron en otra
+    pasada; en estas los contadores pasan a ser lo que creció el origen desde
+    entonces. `carried` guarda lo copiado por clave primaria.
+    """
+    fresh, carry = [], []
+    for row in rows:
+        key = tuple(row[name] for name in keys)
+        previous = carried.get(key)
+        carried[key] = {name: row[name] or 0 for name in counters}
+        if previous is None:
+            fresh.append(row)
+        else:
+            carry.append(row | {name: (row[name] or 0) - previous[name] for name in counters})
+    return fresh, carry
+
+async def _copy_table(table: Table, id_column: str, conflict, counters, latest, bucket: int,
+                      source: int, target: int, batch_size: int, carried: dict) -> tuple[int, int]:
+    """Copia las filas del bucket y borra del destino las que ya no están en el origen."""
+    keys = list(table.primary_key.columns)
+    key_names = [key.name for key in keys]
+    where = bucket_filter(table, id_column, bucket)
+    statements = (
+        upsert(table, conflict, counters, latest),
+        upsert(table, conflict, counters, latest, accumulate=True),
+    )
+    copied, seen, after = 0, set(), None
+    async with shard_sessions[source]() as src, shard_sessions[target]() as dst:
+        while True:
+            query = select(table).where(where).order_by(*keys).limit(batch_size)
+            if after is not None:
+                query = query.where(tuple_(*keys) > tuple_(*after))
+            rows = (await src.execute(query)).mappings().all()
+            if not rows:
+                break
+            batches = carry_counters([dict(row) for row in rows], key_names, counters, carried)
+            for statement, batch in zip(statements, batches):
+                if batch:
+                    await dst.execute(statement, batch)
+            await dst.commit()
+            seen.update(tuple(row[key.name] for key in keys) for row in rows)
+            copied += len(rows)
+            after = tuple(rows[-1][key.name] for key in keys)
+
+        stale = [
+            key for key in (await dst.execute(select(*keys).where(where))).all()
+            if tuple(key) not in seen
+        ]
+        for start in range(0, len(stale), batch_size):
+            chunk = [tuple(key) for key in stale[start:start + batch_size]]
+            await dst.execute(delete(table).where(tuple_(*keys).in_(chunk)))
+            await dst.commit()
+    return copied, len(stale)
+
+async def sync_bucket(bucket: int, source: int, target: int, batch_size: int,
+                      carried: dict[str, dict]) -> dict[str, tuple[int, int]]:
+    """Una pasada; `carried` conserva entre pasadas los contadores copiados de cada tabla."""
+    return {
+        table.name: await _copy_table(
+            table, id_column, conflict, counters, latest, bucket, source, target, batch_size,
+            carried.setdefault(table.name, {}),
+        )
+        for table, id_column, conflict, counters, latest in SHARDED_TABLES
+    }
+
+async def _delete_bucket(bucket: int, shard: int, batch_size: int) -> int:
+    total = 0
+    async with shard_sessions[shard]() as session:
+        for table, id_column, *_ in SHARDED_TABLES:
+            keys = list(table.primary_key.columns)
+            batch = select(*keys).where(bucket_filter(table, id_column, bucket)).limit(batch_size)
+            while True:
+                result = await session.execute(delete(table).where(tuple_(*keys).in_(batch)))
+                await session.commit()
+                total += result.rowcount
+                if result.rowcount < batch_size:
+                    break
+    return total
+
+async def set_bucket(bucket: int, shard: int, moving: bool) -> None:
+    statement = insert(URLShard).values(bucket=bucket, shard=shard, moving=moving)
+    statement = statement.on_conflict_do_update(
+        index_elements=[URLShard.bucket], set_={"shard": shard, "moving": moving}
+    )
+    async with async_session() as session:
+        await session.execute(statement)
+        await session.commit()
+
+async def move_bucket(bucket: int, target: int, batch_size: int, wait: Optional[float] = None) -> None:
+    await refresh_shard_map()
+    source = shard_map.shards[bucket]
+    if source == target:
+        logger.info(f"El bucket {bucket} ya está en el shard {target}")
+        return
+    wait = 2 * settings.shard_map_refresh_interval if wait is None else wait
+    # Sin estado en disco: si el movimiento se interrumpe, la siguiente copia inicial lo rehace
+    carried: dict[str, dict] = {}
+
+    logger.info(f"Bucket {bucket}: copia inicial {source}→{target}: {await sync_bucket(bucket, source, target, batch_size, carried)}")
+    await set_bucket(bucket, source, moving=True)
+    await asyncio.sleep(wait)
+    logger.info(f"Bucket {bucket}: segunda pasada: {await sync_bucket(bucket, source, target, batch_size, carried)}")
+    await set_bucket(bucket, target, moving=True)
+    await asyncio.sleep(wait)
+    logger.info(f"Bucket {bucket}: pasada final: {await sync_bucket(bucket, source, target, batch_size, carried)}")
+    removed = await _delete_bucket(bucket, source, batch_size)
+    await set_bucket(bucket, target, moving=False)
+    logger.info(f"Bucket {bucket} movido al shard {target}; {removed} filas borradas del {source}")
+
+async def init_shard(shard: int) -> None:
+    """Crea las tablas de enlaces en un shard nuevo, sin las FK a users (que no existe allí)."""
+    if shard == 0:
+        raise ValueError("El shard 0 es la base principal: se migra con Alembic")
+    async with shard_engines[shard].begin() as conn:
+        for table, *_ in SHARDED_TABLES:
+            await conn.execute(CreateTable(table, if_not_exists=True, include_foreign_key_constraints=[]))
+            for index in table.indexes:
+                await conn.execute(CreateIndex(index, if_not_exists=True))
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Reparto de buckets de códigos entre shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init = commands.add_parser("init", help="Crea las tablas de enlaces en un shard")
+    init.add_argument("--shard", type=int, required=True)
+    move = commands.add_parser("move", help="Mueve un bucket a otro shard sin parar el servicio")
+    move.add_argument("--bucket", type=int, required=True, choices=range(SHARD_BUCKETS), metavar="0-63")
+    move.add_argument("--to", type=int, required=True)
+    move.add_argument("--batch-size", type=int, default=1000)
+    move.add_argument("--wait", type=float, default=None, help="Segundos entre fases (2 × SHARD_MAP_REFRESH_INTERVAL)")
+    commands.add_parser("status", help="Muestra el shard de cada bucket")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    shard = {"init": getattr(args, "shard", 0), "move": getattr(args, "to", 0)}.get(args.command, 0)
+    if not 0 <= shard < len(shard_sessions):
+        parser.error(f"Hay {len(shard_sessions)} shards configurados (DB_SHARD_URLS)")
+    try:
+        if args.command == "init":
+            await init_shard(args.shard)
+        elif args.command == "move":
+            await move_bucket(args.bucket, args.to, args.batch_size, args.wait)
+        else:
+            await refresh_shard_map()
+            for bucket, shard in enumerate(shard_map.shards):
+                print(f"{bucket:2d} → {shard}{' (moviendo)' if bucket in shard_map.moving else ''}")
+    finally:
+        await close_engine()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
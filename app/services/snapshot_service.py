@@ -0,0 +1,427 @@
+"""
+Snapshot binario código→URL compartido entre workers mediante mmap.
+
+Formato del archivo (little-endian):
+
+    cabecera  : magic (8 bytes) | n (u64) | tamaño del blob (u64)
+    codes     : n × i64, códigos codificados en base62 biyectiva, ordenados
+    ids       : n × i64, id de cada URL
+    offsets   : (n + 1) × u64, posición de cada URL dentro del blob
+    blob      : URLs originales concatenadas en UTF-8
+
+Los enlaces creados o eliminados después del último snapshot se anotan en un
+log delta (`<ruta>.delta`) que cada worker lee de forma incremental. La
+compactación fusiona snapshot y delta sin consultar la base de datos. El
+archivo debe residir en un volumen compartido por todos los workers del nodo.
+"""
+import argparse
+import asyncio
+import bisect
+import fcntl
+import heapq
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from contextlib import AsyncExitStack, contextmanager
+from typing import AsyncIterator, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import func, or_, select
+
+from app.core.config import get_settings
+from app.db.models.url import BROKEN_STATUSES, URL
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SLGSNAP1"
+HEADER = struct.Struct("<8sQQ")
+
+# Alfabeto en orden ASCII: así el orden numérico coincide con (longitud, código)
+CODE_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+MAX_CODE_LENGTH = 10  # 62^10 cabe en un entero de 64 bits con signo
+_DIGITS = {char: value for value, char in enumerate(CODE_ALPHABET)}
+
+def encode_code(code: str) -> Optional[int]:
+    """Codifica un código en base62 biyectiva; None si no es representable."""
+    if not code or len(code) > MAX_CODE_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        digit = _DIGITS.get(char)
+        if digit is None:
+            return None
+        value = value * 62 + digit + 1
+    return value
+
+def decode_code(value: int) -> str:
+    chars = []
+    while value:
+        value, digit = divmod(value - 1, 62)
+        chars.append(CODE_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+# Escritura
+
+class SnapshotWriter:
+    """
+    Escribe un snapshot por partes: las entradas llegan ordenadas por código
+    y el archivo se publica de forma atómica en `commit`. Las URLs van a un
+    temporal; en memoria solo quedan los arrays de códigos, ids y offsets.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.codes, self.ids, self.offsets = array("q"), array("q"), array("Q", [0])
+        self._blob = tempfile.TemporaryFile(dir=self.directory)
+        self._last_key = 0
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._blob.close()
+
+    def add(self, entries: Iterable[tuple[int, int, str]]) -> None:
+        for key, url_id, original_url in entries:
+            if key <= self._last_key:
+                raise ValueError("Las entradas del snapshot deben estar ordenadas y sin duplicados")
+            self._last_key = key
+            data = original_url.encode("utf-8")
+            self._blob.write(data)
+            self.codes.append(key)
+            self.ids.append(url_id)
+            self.offsets.append(self.offsets[-1] + len(data))
+
+    def commit(self) -> int:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(HEADER.pack(MAGIC, len(self.codes), self.offsets[-1]))
+                self.codes.tofile(out)
+                self.ids.tofile(out)
+                self.offsets.tofile(out)
+                self._blob.seek(0)
+                while chunk := self._blob.read(1 << 20):
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return len(self.codes)
+
+def write_snapshot(path: str, entries: Iterable[tuple[int, int, str]]) -> int:
+    """Escribe de forma atómica un snapshot a partir de (código, id, url) ordenados por código."""
+    with SnapshotWriter(path) as writer:
+        writer.add(entries)
+        return writer.commit()
+
+# Lectura
+
+class SnapshotIndex:
+    """Vista de solo lectura sobre un archivo de snapshot mapeado en memoria."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.stat = os.fstat(file.fileno())
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, blob_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} no es un snapshot válido")
+
+        self._view = view = memoryview(self._mmap)
+        start = HEADER.size
+        self.codes = view[start:start + 8 * count].cast("q")
+        start += 8 * count
+        self.ids = view[start:start + 8 * count].cast("q")
+        start += 8 * count
+        self.offsets = view[start:start + 8 * (count + 1)].cast("Q")
+        start += 8 * (count + 1)
+        self.blob = view[start:start + blob_size]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _url_at(self, position: int) -> str:
+        return str(self.blob[self.offsets[position]:self.offsets[position + 1]], "utf-8")
+
+    def get(self, key: int) -> Optional[tuple[int, str]]:
+        position = bisect.bisect_left(self.codes, key)
+        if position < len(self.codes) and self.codes[position] == key:
+            return self.ids[position], self._url_at(position)
+        return None
+
+    def __iter__(self) -> Iterator[tuple[int, int, str]]:
+        for position in range(len(self.codes)):
+            yield self.codes[position], self.ids[position], self._url_at(position)
+
+    def close(self) -> None:
+        for view in (self.codes, self.ids, self.offsets, self.blob, self._view):
+            view.release()
+        self._mmap.close()
+
+# Log delta
+
+@contextmanager
+def _locked(path: str, flags: int):
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, flags)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _parse_delta_line(line: str) -> Optional[tuple[str, Optional[tuple[int, str]]]]:
+    parts = line.rstrip("\n").split("\t")
+    if parts[0] == "+" and len(parts) == 4:
+        return parts[1], (int(parts[2]), parts[3])
+    if parts[0] == "-" and len(parts) == 2:
+        return parts[1], None
+    return None
+
+def _read_changes(path: str) -> dict[int, Optional[tuple[int, str]]]:
+    changes: dict[int, Optional[tuple[int, str]]] = {}
+    with open(path, "r", encoding="utf-8") as delta:
+        for line in delta:
+            parsed = _parse_delta_line(line)
+            key = encode_code(parsed[0]) if parsed else None
+            if key is not None:
+                changes[key] = parsed[1]
+    return changes
+
+class SnapshotStore:
+    """Snapshot mapeado más el log delta, con recarga incremental por worker."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.delta_path = f"{path}.delta"
+        # Las escrituras al delta toman el lock compartido; la rotación, el exclusivo
+        self.append_lock_path = f"{path}.lock"
+        self.build_lock_path = f"{path}.build.lock"
+        self._index: Optional[SnapshotIndex] = None
+        self._delta: dict[str, Optional[tuple[int, str]]] = {}
+        self._delta_inode: Optional[int] = None
+        self._delta_offset = 0
+
+    def lookup(self, code: str) -> Optional[tuple[int, str]]:
+        """Devuelve (id, url) sin tocar Redis ni la base de datos, o None si no está."""
+        if code in self._delta:
+            return self._delta[code]
+        if self._index is None:
+            return None
+        key = encode_code(code)
+        return self._index.get(key) if key is not None else None
+
+    # Recarga
+
+    def refresh(self) -> None:
+        """Vuelve a mapear el snapshot si cambió y lee las entradas nuevas del delta."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        current = self._index.stat if self._index else None
+        if stat and (current is None or (stat.st_ino, stat.st_mtime_ns) != (current.st_ino, current.st_mtime_ns)):
+            index = SnapshotIndex(self.path)
+            if self._index:
+                self._index.close()
+            self._index = index
+            # El snapshot nuevo ya incluye todo lo rotado; basta con el delta actual
+            self._delta = {}
+            self._delta_inode = None
+            logger.info(f"Snapshot cargado con {len(index)} códigos")
+        self._read_delta()
+
+    def _read_delta(self) -> None:
+        try:
+            delta = open(self.delta_path, "rb")
+        except FileNotFoundError:
+            return
+        with delta:
+            inode = os.fstat(delta.fileno()).st_ino
+            if inode != self._delta_inode:
+                # Delta rotado: se conservan las entradas leídas hasta recargar el snapshot
+                self._delta_inode = inode
+                self._delta_offset = 0
+            delta.seek(self._delta_offset)
+            for line in delta:
+                if not line.endswith(b"\n"):
+                    break  # Escritura en curso; se leerá en la siguiente recarga
+                self._delta_offset += len(line)
+                parsed = _parse_delta_line(line.decode("utf-8"))
+                if parsed:
+                    self._delta[parsed[0]] = parsed[1]
+
+    def close(self) -> None:
+        if self._index:
+            self._index.close()
+            self._index = None
+
+    # Escritura del delta
+
+    def _append(self, line: str) -> None:
+        with _locked(self.append_lock_path, fcntl.LOCK_SH):
+            with open(self.delta_path, "a", encoding="utf-8") as delta:
+                delta.write(line)
+
+    def record_created(self, code: str, url_id: int, original_url: str) -> None:
+        self._append(f"+\t{code}\t{url_id}\t{original_url}\n")
+
+    def record_deleted(self, code: str) -> None:
+        self._append(f"-\t{code}\n")
+
+    def _rotate_delta(self) -> Optional[str]:
+        """Aparta el delta actual; las escrituras siguientes van a un archivo nuevo."""
+        rotated = f"{self.delta_path}.{os.getpid()}"
+        with _locked(self.append_lock_path, fcntl.LOCK_EX):
+            try:
+                os.replace(self.delta_path, rotated)
+            except FileNotFoundError:
+                return None
+        return rotated
+
+    # Reconstrucción
+
+    def compact(self) -> Optional[int]:
+        """Fusiona snapshot y delta en un snapshot nuevo; None si no hay nada que hacer."""
+        try:
+            with _locked(self.build_lock_path, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                rotated = self._rotate_delta()
+                if rotated is None:
+                    return None
+                changes = _read_changes(rotated)
+                base = SnapshotIndex(self.path) if os.path.exists(self.path) else None
+                try:
+                    count = write_snapshot(self.path, _merge(base or (), changes))
+                finally:
+                    if base:
+                        base.close()
+                os.unlink(rotated)
+                return count
+        except BlockingIOError:
+            return None
+
+    async def rebuild(self, session_factories: Sequence, batch_size: int = 10000) -> Optional[int]:
+        """Exporta la tabla completa desde la base de datos (todos los shards)."""
+        try:
+            with _locked(self.build_lock_path, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                # Lo anotado antes de la exportación ya está reflejado en la BD
+                rotated = self._rotate_delta()
+                query = (
+                    select(URL.code, URL.id, URL.original_url)
+                    # Los enlaces con expiración, límite o destino roto se validan vía caché/BD
+                    .where(
+                        URL.expires_at.is_(None),
+                        URL.max_clicks.is_(None),
+                        or_(URL.target_status.is_(None), URL.target_status.notin_(BROKEN_STATUSES)),
+                    )
+                    .order_by(func.length(URL.code), URL.code.collate("C"))
+                    .execution_options(yield_per=batch_size)
+                )
+                async with AsyncExitStack() as stack:
+                    sessions = [await stack.enter_async_context(factory()) for factory in session_factories]
+                    # Cada shard llega ordenado: se mezclan sus cursores sin reunir la tabla
+                    entries = _merge_sorted([_entries(await session.stream(query)) for session in sessions])
+                    with SnapshotWriter(self.path) as writer:
+                        batch = []
+                        async for entry in entries:
+                            batch.append(entry)
+                            if len(batch) >= batch_size:
+                                await asyncio.to_thread(writer.add, batch)
+                                batch = []
+                        await asyncio.to_thread(writer.add, batch)
+                        count = await asyncio.to_thread(writer.commit)
+                if rotated:
+                    os.unlink(rotated)
+                return count
+        except BlockingIOError:
+            return None
+
+async def _entries(rows: AsyncIterator) -> AsyncIterator[tuple[int, int, str]]:
+    async for row in rows:
+        key = encode_code(row.code)
+        if key is not None:
+            yield key, row.id, row.original_url
+
+async def _merge_sorted(
+    streams: list[AsyncIterator[tuple[int, int, str]]],
+) -> AsyncIterator[tuple[int, int, str]]:
+    """Mezcla k flujos ordenados por código con una sola entrada de cada uno en memoria."""
+    heap = []
+    for index, stream in enumerate(streams):
+        entry = await anext(stream, None)
+        if entry is not None:
+            heap.append((entry, index))
+    heapq.heapify(heap)
+    while heap:
+        entry, index = heap[0]
+        yield entry
+        following = await anext(streams[index], None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following, index))
+
+def _merge(
+    base: Iterable[tuple[int, int, str]],
+    changes: dict[int, Optional[tuple[int, str]]],
+) -> Iterator[tuple[int, int, str]]:
+    """Recorre el snapshot ordenado aplicando altas y bajas del delta."""
+    pending = sorted(changes.items())
+    position = 0
+    for key, url_id, original_url in base:
+        while position < len(pending) and pending[position][0] < key:
+            change_key, change = pending[position]
+            if change:
+                yield change_key, change[0], change[1]
+            position += 1
+        if position < len(pending) and pending[position][0] == key:
+            change = pending[position][1]
+            if change:
+                yield key, change[0], change[1]
+            position += 1
+            continue
+        yield key, url_id, original_url
+    for change_key, change in pending[position:]:
+        if change:
+            yield change_key, change[0], change[1]
+
+snapshot_store: Optional[SnapshotStore] = (
+    SnapshotStore(settings.snapshot_path) if settings.snapshot_path else None
+)
+
+def record_created(code: str, url_id: int, original_url: str) -> None:
+    """Anota un enlace nuevo; solo deben anotarse los que no tienen límites."""
+    if snapshot_store:
+        snapshot_store.record_created(code, url_id, original_url)
+
+def record_deleted(code: str) -> None:
+    if snapshot_store:
+        snapshot_store.record_deleted(code)
+
+async def _main() -> None:
+    from app.db.session import close_engine, shard_sessions
+
+    parser = argparse.ArgumentParser(description="Genera el snapshot código→URL")
+    parser.add_argument("command", choices=["build", "compact"])
+    parser.add_argument("--path", default=settings.snapshot_path)
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("Indica --path o configura SNAPSHOT_PATH")
+
+    store = SnapshotStore(args.path)
+    if args.command == "compact":
+        count = store.compact()
+    else:
+        count = await store.rebuild(shard_sessions)
+        await close_engine()
+    print(f"Snapshot {args.path}: {count if count is not None else 'sin cambios'}")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,543 @@
+import asyncio
+import base64
+import json
+import logging
+import secrets
+import string
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Iterable, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import Integer, bindparam, case, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.prometheus import SINGLEFLIGHT_LOCK_WAITS
+from app.core.redis_client import delete_keys, pipelined, redis
+from app.core.singleflight import SingleFlight
+from app.db.models.url import BROKEN_STATUSES, URL
+from app.db.models.url_archive import URLArchive
+from app.db.models.user import User
+from app.db.fast_lookup import fast_lookup
+from app.db.session import shard_engines
+from app.db.sharding import scatter, shard_map, shard_session, shard_sessions
+from app.services.canonical_url import canonicalize_url
+from app.services.archive_service import list_archived_for_owner, promote
+from app.services.etag_service import affected_versions, bump_versions
+from app.services.snapshot_service import record_created, snapshot_store
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "url:"
+LOCK_PREFIX = "lock:url:"
+# Contador de accesos en Redis para enlaces con max_clicks
+CLICKS_PREFIX = "clicks:"
+# El contador sobrevive a su entrada: si caducara antes, el siguiente INCR empezaría de cero
+CLICKS_TTL_MARGIN = 60
+# Valor guardado para códigos inexistentes
+MISSING_MARKER = "-"
+
+# Configuración para la generación de códigos cortos
+CODE_LENGTH = 6
+ALLOWED_CHARS = string.ascii_letters + string.digits
+
+def generate_short_code(length: int = CODE_LENGTH) -> str:
+    """Genera un código aleatorio para la URL corta, fuera de los buckets que se están moviendo."""
+    while True:
+        code = ''.join(secrets.choice(ALLOWED_CHARS) for _ in range(length))
+        if not shard_map.is_moving(code):
+            return code
+
+@dataclass(frozen=True)
+class CachedURL:
+    """Datos mínimos de una URL necesarios para resolver una redirección."""
+    id: int
+    original_url: str
+    # Límites que viajan con la entrada para validarlos sin consultar la BD
+    expires_at: Optional[float] = None  # Epoch en segundos
+    max_clicks: Optional[int] = None
+    # El comprobador de destinos vio un 404/410 en la última visita
+    broken: bool = False
+
+    @property
+    def is_limited(self) -> bool:
+        return self.expires_at is not None or self.max_clicks is not None
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return self.expires_at is not None and self.expires_at <= (now or time.time())
+
+    def cache_ttl(self) -> int:
+        """TTL en caché; nunca sobrevive a la expiración del enlace."""
+        if self.expires_at is None:
+            return settings.redirect_cache_ttl
+        return max(1, min(settings.redirect_cache_ttl, int(self.expires_at - time.time())))
+
+    def clicks_ttl(self) -> int:
+        """TTL del contador de accesos; al caducar se vuelve a sembrar desde consumed_clicks."""
+        return self.cache_ttl() + CLICKS_TTL_MARGIN
+
+    def to_json(self) -> str:
+        data = {"id": self.id, "url": self.original_url}
+        if self.expires_at is not None:
+            data["exp"] = self.expires_at
+        if self.max_clicks is not None:
+            data["max"] = self.max_clicks
+        if self.broken:
+            data["brk"] = 1
+        return json.dumps(data, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CachedURL":
+        data = json.loads(raw)
+        return cls(
+            id=data["id"],
+            original_url=data["url"],
+            expires_at=data.get("exp"),
+            max_clicks=data.get("max"),
+            broken=bool(data.get("brk")),
+        )
+
+    @classmethod
+    def from_model(cls, url) -> "CachedURL":
+        """Construye la entrada desde un modelo URL o una fila con las mismas columnas."""
+        expires_at = url.expires_at
+        return cls(
+            id=url.id,
+            original_url=url.original_url,
+            expires_at=expires_at.replace(tzinfo=timezone.utc).timestamp() if expires_at else None,
+            max_clicks=url.max_clicks,
+            broken=getattr(url, "target_status", None) in BROKEN_STATUSES,
+        )
+
+# Columnas necesarias para construir una entrada de caché
+ENTRY_COLUMNS = (URL.id, URL.original_url, URL.expires_at, URL.max_clicks, URL.target_status)
+
+# Entrada negativa: el código no existe
+NOT_FOUND = CachedURL(id=0, original_url="")
+
+# Caché de redirecciones en Redis
+
+async def get_cached_url(code: str) -> Optional[CachedURL]:
+    """Devuelve la entrada cacheada, NOT_FOUND si se sabe que no existe o None si no hay dato."""
+    try:
+        raw = await redis.get(CACHE_PREFIX + code)
+    except RedisError as exc:
+        logger.warning(f"Caché no disponible al leer {code}: {exc}")
+        return None
+    if not raw:
+        return None
+    return NOT_FOUND if raw == MISSING_MARKER else CachedURL.from_json(raw)
+
+async def cache_urls(
+    entries: Iterable[tuple[str, CachedURL]],
+    consumed: Optional[dict[int, int]] = None,
+) -> int:
+    """Guarda varias entradas en la caché con un solo round-trip; `consumed` siembra los contadores."""
+    count = 0
+
+    def build(pipe) -> None:
+        nonlocal count
+        for code, entry in entries:
+            if entry.is_expired():
+                continue
+            pipe.set(CACHE_PREFIX + code, entry.to_json(), ex=entry.cache_ttl())
+            if entry.max_clicks is not None:
+                clicks_key = CLICKS_PREFIX + str(entry.id)
+                if consumed is not None:
+                    # Inicializar el contador solo si no existe para no perder accesos
+                    pipe.set(clicks_key, consumed.get(entry.id) or 0, nx=True)
+                pipe.expire(clicks_key, entry.clicks_ttl())
+            count += 1
+
+    try:
+        await pipelined(build)
+    except RedisError as exc:
+        logger.warning(f"No se pudo escribir en la caché: {exc}")
+        return 0
+    return count
+
+async def cache_missing(code: str) -> None:
+    try:
+        # NX: no pisa la entrada de un alta que llegó entre la consulta y la escritura
+        await redis.set(CACHE_PREFIX + code, MISSING_MARKER, ex=settings.redirect_negative_cache_ttl, nx=True)
+    except RedisError as exc:
+        logger.warning(f"No se pudo escribir en la caché: {exc}")
+
+async def invalidate_codes(codes: Iterable[str]) -> None:
+    """Invalida en un solo round-trip las entradas de varios códigos, sin tocar sus contadores."""
+    keys = [CACHE_PREFIX + code for code in codes]
+    if not keys:
+        return
+    try:
+        await delete_keys(keys)
+    except RedisError as exc:
+        logger.warning(f"No se pudo invalidar la caché: {exc}")
+
+async def invalidate_urls(rows: Iterable[tuple[int, str]]) -> None:
+    """Invalida en un solo round-trip las entradas y contadores de varias URLs (id, código)."""
+    keys = []
+    for url_id, code in rows:
+        keys.extend((CACHE_PREFIX + code, CLICKS_PREFIX + str(url_id)))
+    if not keys:
+        return
+    try:
+        await delete_keys(keys)
+    except RedisError as exc:
+        logger.warning(f"No se pudo invalidar la caché: {exc}")
+
+async def consume_click(entry: CachedURL) -> bool:
+    """Cuenta un acceso a un enlace con max_clicks; False si ya agotó sus accesos."""
+    key = CLICKS_PREFIX + str(entry.id)
+
+    def build(pipe) -> None:
+        pipe.incr(key)
+        # Un contador creado aquí (p. ej. tras un desalojo) tampoco queda sin TTL
+        pipe.expire(key, entry.clicks_ttl())
+
+    try:
+        clicks, _ = await pipelined(build, transaction=True)
+    except RedisError as exc:
+        logger.warning(f"No se pudo contar el acceso a {entry.id}: {exc}")
+        return True
+    return clicks <= entry.max_clicks
+
+# Resolución de códigos
+
+# Misses concurrentes del mismo código comparten una sola consulta por worker
+_lookup_flight: SingleFlight[Optional[CachedURL]] = SingleFlight("redirect")
+
+async def resolve_code(code: str) -> Optional[CachedURL]:
+    """Resuelve un código corto: snapshot local, luego caché y por último la base de datos."""
+    if snapshot_store:
+        hit = snapshot_store.lookup(code)
+        if hit:
+            # El snapshot solo contiene enlaces sin expiración ni límite de accesos
+            return CachedURL(id=hit[0], original_url=hit[1])
+
+    entry = await get_cached_url(code)
+    if entry:
+        return None if entry is NOT_FOUND else entry
+
+    return await _lookup_flight.do(code, lambda: _load_url(code))
+
+async def _load_url(code: str) -> Optional[CachedURL]:
+    """Consulta la base de datos; con lock en Redis solo un worker lo hace a la vez."""
+    if not settings.singleflight_redis_lock:
+        return await _query_and_cache(code)
+
+    token = secrets.token_hex(8)
+    try:
+        acquired = await redis.set(LOCK_PREFIX + code, token, nx=True, px=settings.singleflight_lock_ttl_ms)
+    except RedisError as exc:
+        logger.warning(f"No se pudo tomar el lock de {code}: {exc}")
+        return await _query_and_cache(code)
+
+    if not acquired:
+        entry = await _wait_for_cache(code)
+        if entry:
+            SINGLEFLIGHT_LOCK_WAITS.labels("hit").inc()
+            return None if entry is NOT_FOUND else entry
+        SINGLEFLIGHT_LOCK_WAITS.labels("timeout").inc()
+        return await _query_and_cache(code)
+
+    try:
+        return await _query_and_cache(code)
+    finally:
+        await _release_lock(code, token)
+
+async def _wait_for_cache(code: str) -> Optional[CachedURL]:
+    """Espera a que el worker que tiene el lock rellene la caché."""
+    deadline = asyncio.get_running_loop().time() + settings.singleflight_lock_ttl_ms / 1000
+    delay = 0.005
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(delay)
+        entry = await get_cached_url(code)
+        if entry:
+            return entry
+        delay = min(delay * 2, 0.1)
+    return None
+
+# Borra el lock solo si sigue siendo nuestro
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+async def _release_lock(code: str, token: str) -> None:
+    try:
+        await redis.eval(_RELEASE_LOCK, 1, LOCK_PREFIX + code, token)
+    except RedisError as exc:
+        logger.warning(f"No se pudo liberar el lock de {code}: {exc}")
+
+async def _orm_lookup(session: AsyncSession, code: str) -> tuple[Optional[object], Optional[int]]:
+    # Solo columnas de ix_urls_code_covering: búsqueda index-only
+    result = await session.execute(select(*ENTRY_COLUMNS).where(URL.code == code))
+    row = result.first()
+    if row is None or row.max_clicks is None:
+        return row, None
+    # El contador cambia en cada acceso y no está en el índice: solo si hay límite
+    return row, await session.scalar(select(URL.consumed_clicks).where(URL.id == row.id))
+
+async def _query_and_cache(code: str) -> Optional[CachedURL]:
+    row, consumed = None, None
+    # Normalmente un único shard; los enlaces anteriores al reparto siguen en el 0
+    for shard in shard_map.shards_for_code(code):
+        # Sesión propia: la consulta no depende de la petición que la inició
+        async with shard_sessions[shard]() as session:
+            if settings.db_fast_lookup:
+                row, used = await fast_lookup(shard_engines[shard], code)
+            else:
+                row, used = await _orm_lookup(session, code)
+            if row and row.max_clicks is not None:
+                consumed = {row.id: used}
+            if not row:
+                row = await _promote_archived(session, code)
+        if row:
+            break
+    if not row:
+        await cache_missing(code)
+        return None
+
+    entry = CachedURL.from_model(row)
+    await cache_urls([(code, entry)], consumed)
+    return entry
+
+async def _promote_archived(session: AsyncSession, code: str):
+    """Recupera un enlace del archivo frío; None si tampoco está ahí."""
+    values = await promote(session, code)
+    if values is None:
+        # Otro worker pudo recuperarlo entre las dos consultas
+        result = await session.execute(select(*ENTRY_COLUMNS).where(URL.code == code))
+        return result.first()
+    await session.commit()
+    # Solo se archivan enlaces sin límites: vuelven también al snapshot
+    record_created(code, values["id"], values["original_url"])
+    return SimpleNamespace(expires_at=None, max_clicks=None, **values)
+
+async def check_code_exists(db: AsyncSession, code: str) -> bool:
+    """Verifica si un código ya existe en su shard (o en el 0, si es anterior), incluido el archivo frío."""
+    for shard in shard_map.shards_for_code(code):
+        async with shard_session(shard, db) as session:
+            result = await session.execute(
+                select(URL.id).where(URL.code == code)
+                .union_all(select(URLArchive.id).where(URLArchive.code == code))
+                .limit(1)
+            )
+            if result.first() is not None:
+                return True
+    return False
+
+# Deduplicación
+
+async def find_duplicate(
+    db: AsyncSession, canonical_url: str, url_hash: str, owner_id: Optional[int] = None
+) -> Optional[URL]:
+    """Busca un enlace sin límites del mismo propietario y destino canónico usando ix_urls_url_hash."""
+    owner_filter = URL.owner_id == owner_id if owner_id is not None else URL.owner_id.is_(None)
+
+    async def query(session: AsyncSession) -> list[URL]:
+        result = await session.execute(
+            select(URL)
+            .where(URL.url_hash == url_hash, owner_filter, URL.expires_at.is_(None), URL.max_clicks.is_(None))
+            .order_by(URL.id)
+            .limit(5)
+        )
+        return list(result.scalars())
+
+    # El destino no decide el shard: se pregunta a todos
+    candidates = [url for urls in await scatter(query, db) for url in urls]
+    # El digest está truncado: se confirma comparando la forma canónica
+    for url in sorted(candidates, key=lambda url: url.id):
+        if canonicalize_url(url.original_url) == canonical_url:
+            return url
+    return None
+
+# Enlaces por propietario
+
+async def reserve_link_slot(db: AsyncSession, owner_id: int) -> bool:
+    """Incrementa el contador de enlaces del usuario; False si ya alcanzó su cuota."""
+    statement = (
+        update(User)
+        .where(User.id == owner_id)
+        .values(link_count=User.link_count + 1)
+        .returning(User.link_count)
+        .execution_options(synchronize_session=False)
+    )
+    if settings.max_links_per_user > 0:
+        statement = statement.where(User.link_count < settings.max_links_per_user)
+    result = await db.execute(statement)
+    return result.first() is not None
+
+async def _adjust_link_counts(db: AsyncSession, owner_ids: Iterable[Optional[int]], sign: int) -> None:
+    counts = Counter(owner_id for owner_id in owner_ids if owner_id is not None)
+    if not counts:
+        return
+    users = User.__table__
+    await db.execute(
+        update(users)
+        .where(users.c.id == bindparam("owner"))
+        .values(link_count=users.c.link_count + bindparam("delta")),
+        [{"owner": owner_id, "delta": sign * count} for owner_id, count in counts.items()],
+    )
+
+async def add_link_slots(db: AsyncSession, owner_ids: Iterable[Optional[int]]) -> None:
+    """Suma los enlaces creados a cada propietario en un solo UPDATE."""
+    await _adjust_link_counts(db, owner_ids, 1)
+
+async def release_link_slots(db: AsyncSession, owner_ids: Iterable[Optional[int]]) -> None:
+    """Descuenta los enlaces eliminados de cada propietario en un solo UPDATE."""
+    await _adjust_link_counts(db, owner_ids, -1)
+
+def encode_cursor(url: URL) -> str:
+    raw = f"{url.created_at.isoformat()}|{url.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Optional[tuple[datetime, int]]:
+    try:
+        created_at, url_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(url_id)
+    except ValueError:
+        return None
+
+async def list_owner_urls(
+    db: AsyncSession, owner_id: int, limit: int, after: Optional[tuple[datetime, int]] = None
+) -> list[URL]:
+    """
+    Enlaces del usuario, del más reciente al más antiguo, recorriendo ix_urls_owner_created.
+
+    Incluye los archivados: ambas tablas de cada shard se recorren con el mismo
+    cursor y se mezclan, así que el cursor sigue siendo válido aunque un enlace
+    cambie de tabla o de shard.
+    """
+    query = select(URL).where(URL.owner_id == owner_id)
+    if after:
+        query = query.where(tuple_(URL.created_at, URL.id) < tuple_(*after))
+    query = query.order_by(URL.created_at.desc(), URL.id.desc()).limit(limit)
+
+    async def page(session: AsyncSession) -> list[URL]:
+        result = await session.execute(query)
+        return list(result.scalars()) + await list_archived_for_owner(session, owner_id, limit, after)
+
+    urls = [url for urls in await scatter(page, db) for url in urls]
+    urls.sort(key=lambda url: (url.created_at, url.id), reverse=True)
+    return urls[:limit]
+
+# Contador de accesos
+
+class ClickBuffer:
+    """Acumula accesos en memoria y los vuelca a la base de datos en un único UPDATE."""
+
+    def __init__(self):
+        self._pending: Counter[int] = Counter()
+        # Usos de enlaces con max_clicks, incluidos los de bots
+        self._consumed: Counter[int] = Counter()
+
+    def add(self, url_id: int, counted: bool = True, consumed: bool = False) -> None:
+        if counted:
+            self._pending[url_id] += 1
+        if consumed:
+            self._consumed[url_id] += 1
+
+    async def flush(self) -> int:
+        if not self._pending and not self._consumed:
+            return 0
+        pending, self._pending = self._pending, Counter()
+        consumed, self._consumed = self._consumed, Counter()
+        by_shard: dict[int, list[dict]] = {}
+        for url_id in pending.keys() | consumed.keys():
+            by_shard.setdefault(shard_map.shard_for_id(url_id), []).append(
+                {"url_id": url_id, "hits": pending[url_id], "used": consumed[url_id]}
+            )
+        urls = URL.__table__
+        hits = bindparam("hits", type_=Integer)
+        statement = (
+            update(urls)
+            .where(urls.c.id == bindparam("url_id"))
+            .values(
+                access_count=urls.c.access_count + hits,
+                consumed_clicks=urls.c.consumed_clicks + bindparam("used", type_=Integer),
+                # Los usos de bots no cuentan como acceso para el archivado
+                last_accessed_at=case((hits > 0, func.timezone("utc", func.now())), else_=urls.c.last_accessed_at),
+            )
+        )
+
+        async def flush_shard(shard: int, rows: list[dict]) -> None:
+            try:
+                async with shard_sessions[shard]() as session:
+                    await session.execute(statement, rows)
+                    # Propietarios de los enlaces tocados, para invalidar sus listados
+                    owners = await session.execute(
+                        select(URL.id, URL.owner_id).where(URL.id.in_([row["url_id"] for row in rows]))
+                    )
+                    await session.commit()
+            except Exception:
+                # Conservar los accesos para el siguiente intento; += descarta los ceros
+                self._pending += Counter({row["url_id"]: row["hits"] for row in rows})
+                self._consumed += Counter({row["url_id"]: row["used"] for row in rows})
+                raise
+            await bump_versions(affected_versions(owners.all()))
+
+        results = await asyncio.gather(
+            *(flush_shard(shard, rows) for shard, rows in by_shard.items()), return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+        return sum(len(rows) for rows in by_shard.values())
+
+click_buffer = ClickBuffer()
+
+async def record_access(db: AsyncSession, url_id: int, counted: bool = True, consumed: bool = False) -> None:
+    """
+    Registra un acceso; con volcado periódico no toca la base de datos.
+
+    `counted` suma al contador de accesos y `consumed` gasta uno de los
+    max_clicks del enlace: un bot gasta sin contar.
+    """
+    if settings.click_flush_interval > 0:
+        click_buffer.add(url_id, counted, consumed)
+        return
+    values = {}
+    if counted:
+        values.update(access_count=URL.access_count + 1, last_accessed_at=func.timezone("utc", func.now()))
+    if consumed:
+        values["consumed_clicks"] = URL.consumed_clicks + 1
+    if not values:
+        return
+    async with shard_session(shard_map.shard_for_id(url_id), db) as session:
+        result = await session.execute(
+            update(URL)
+            .where(URL.id == url_id)
+            .values(**values)
+            .returning(URL.id, URL.owner_id)
+        )
+        rows = result.all()
+        await session.commit()
+    await bump_versions(affected_versions(rows))
+
+async def warm_up_cache(db: AsyncSession, top_n: int = settings.cache_warmup_top_n) -> int:
+    """Precarga en la caché los `top_n` códigos con más accesos."""
+    if top_n <= 0:
+        return 0
+    query = (
+        select(URL.code, *ENTRY_COLUMNS, URL.access_count, URL.consumed_clicks)
+        .order_by(URL.access_count.desc().nulls_last())
+        .limit(top_n)
+    )
+
+    async def top(session: AsyncSession) -> list:
+        return (await session.execute(query)).all()
+
+    rows = [row for rows in await scatter(top, db) for row in rows]
+    rows = sorted(rows, key=lambda row: row.access_count or 0, reverse=True)[:top_n]
+    return await cache_urls(
+        ((row.code, CachedURL.from_model(row)) for row in rows),
+        {row.id: row.consumed_clicks for row in rows},
+    )
@@ -0,0 +1,457 @@
+"""
+Altas diferidas (write-behind).
+
+El enlace se escribe primero en Redis, donde ya resuelve, y se encola en un
+stream; los workers lo persisten en Postgres por lotes mediante un grupo de
+consumidores. Cada alta queda además en `WRITTEN_KEY` hasta que la
+reconciliación comprueba que Redis y Postgres coinciden. Los enlaces que
+salen de `urls` antes (borrados, purgados o archivados) dejan una lápida
+para que la reconciliación no los tome por perdidos y los resucite.
+"""
+import json
+import logging
+import os
+import socket
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.prometheus import (
+    WRITE_BEHIND_BACKLOG, WRITE_BEHIND_LAG, WRITE_BEHIND_OLDEST_AGE,
+    WRITE_BEHIND_RECONCILED, WRITE_BEHIND_ROWS,
+)
+from app.core.redis_client import acquire_job_lock, pipelined, redis
+from app.db.models.url import URL
+from app.db.models.url_archive import URLArchive
+from app.db.session import async_session, shard_sessions
+from app.db.sharding import make_url_id, scatter, shard_map, users_session
+from app.services.etag_service import affected_versions
+from app.services.snapshot_service import record_created, snapshot_store
+from app.services.url_service import (
+    CACHE_PREFIX, CLICKS_PREFIX, CODE_LENGTH, ENTRY_COLUMNS, CachedURL, add_link_slots,
+    cache_urls, generate_short_code,
+)
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "urls:pending"
+GROUP = "url-persisters"
+# Altas pendientes de reconciliar, puntuadas por fecha de aceptación
+WRITTEN_KEY = "urls:written"
+# Altas descartadas al persistir: código → motivo
+FAILED_KEY = "urls:failed"
+FAILED_TTL = 86400
+# Lápidas por id de enlaces que ya no están en `urls`; duran lo mismo que los descartes
+REMOVED_PREFIX = "urls:removed:"
+
+# Sin consultar la BD no se puede descartar una colisión con un código
+# existente: los códigos diferidos son más largos para hacerla improbable
+DEFERRED_CODE_LENGTH = CODE_LENGTH + 2
+MAX_CODE_ATTEMPTS = 5
+
+# Reserva el código, encola el alta y la marca para reconciliar en un solo paso
+_ACCEPT_SCRIPT = """
+if not redis.call('SET', KEYS[1], ARGV[1], 'NX') then
+    return 0
+end
+redis.call('XADD', KEYS[2], '*', 'data', ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+if ARGV[4] == '1' then
+    redis.call('SET', KEYS[4], 0, 'NX')
+end
+return 1
+"""
+
+# Reencola un alta perdida; la caché solo se restaura si no hay otra entrada
+_REQUEUE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'NX')
+redis.call('XADD', KEYS[2], '*', 'data', ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+return 1
+"""
+
+@dataclass(frozen=True)
+class PendingURL:
+    """Alta aceptada que todavía no está en Postgres."""
+    id: int
+    code: str
+    original_url: str
+    url_hash: str
+    created_at: str  # ISO, UTC sin zona horaria como en la tabla
+    owner_id: Optional[int] = None
+    expires_at: Optional[str] = None
+    max_clicks: Optional[int] = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"), sort_keys=True)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "PendingURL":
+        return cls(**json.loads(raw))
+
+    def to_row(self) -> dict:
+        return {
+            "id": self.id,
+            "code": self.code,
+            "original_url": self.original_url,
+            "url_hash": self.url_hash,
+            "created_at": datetime.fromisoformat(self.created_at),
+            "access_count": 0,
+            "consumed_clicks": 0,
+            "owner_id": self.owner_id,
+            "expires_at": datetime.fromisoformat(self.expires_at) if self.expires_at else None,
+            "max_clicks": self.max_clicks,
+        }
+
+    def entry(self) -> CachedURL:
+        expires_at = None
+        if self.expires_at:
+            expires_at = datetime.fromisoformat(self.expires_at).replace(tzinfo=timezone.utc).timestamp()
+        return CachedURL(
+            id=self.id,
+            original_url=self.original_url,
+            expires_at=expires_at,
+            max_clicks=self.max_clicks,
+        )
+
+def enqueued_at(message_id: str) -> float:
+    """Epoch en segundos codificado en el id de una entrada del stream."""
+    return int(message_id.split("-", 1)[0]) / 1000
+
+class IdAllocator:
+    """Reserva ids de la secuencia de urls por bloques para no consultar la BD en cada alta."""
+
+    def __init__(self, block_size: int = settings.write_behind_id_block):
+        self.block_size = block_size
+        self._ids: list[int] = []
+
+    async def next_id(self) -> int:
+        if not self._ids:
+            async with async_session() as session:
+                result = await session.execute(
+                    text("SELECT nextval(pg_get_serial_sequence('urls', 'id')) FROM generate_series(1, :n)"),
+                    {"n": self.block_size},
+                )
+                # Los ids sin usar al reiniciar solo dejan huecos en la secuencia
+                self._ids.extend(reversed(result.scalars().all()))
+        return self._ids.pop()
+
+id_allocator = IdAllocator()
+
+async def accept_url(
+    original_url: str,
+    url_hash: str,
+    owner_id: Optional[int] = None,
+    expires_at: Optional[datetime] = None,
+    max_clicks: Optional[int] = None,
+) -> PendingURL:
+    """Acepta un alta sin esperar a Postgres: el código resuelve en cuanto se devuelve."""
+    sequence_value = await id_allocator.next_id()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for _ in range(MAX_CODE_ATTEMPTS):
+        code = generate_short_code(DEFERRED_CODE_LENGTH)
+        if snapshot_store and snapshot_store.lookup(code):
+            continue
+        url_id = make_url_id(sequence_value, code)
+        pending = PendingURL(
+            id=url_id,
+            code=code,
+            original_url=original_url,
+            url_hash=url_hash,
+            created_at=now.isoformat(),
+            owner_id=owner_id,
+            expires_at=expires_at.isoformat() if expires_at else None,
+            max_clicks=max_clicks,
+        )
+        # Sin TTL hasta que la fila esté en Postgres: la caché es la única copia
+        accepted = await redis.eval(
+            _ACCEPT_SCRIPT, 4,
+            CACHE_PREFIX + code, STREAM_KEY, WRITTEN_KEY, CLICKS_PREFIX + str(url_id),
+            pending.entry().to_json(), time.time(), pending.to_json(), "1" if max_clicks else "0",
+        )
+        if accepted:
+            WRITE_BEHIND_ROWS.labels("accepted").inc()
+            return pending
+    raise RuntimeError("No se pudo reservar un código libre")
+
+# Persistencia por lotes
+
+async def _insert_rows(session: AsyncSession, shard: int, rows: list[PendingURL]) -> set[str]:
+    """Inserta las filas y devuelve los códigos guardados; los conflictos se omiten."""
+    result = await session.execute(
+        insert(URL)
+        .values([pending.to_row() for pending in rows])
+        .on_conflict_do_nothing()
+        .returning(URL.code)
+    )
+    inserted = set(result.scalars())
+    async with users_session(shard, session) as users:
+        await add_link_slots(users, (pending.owner_id for pending in rows if pending.code in inserted))
+    return inserted
+
+async def _insert_batch(shard: int, rows: list[PendingURL]) -> tuple[set[str], dict[str, str]]:
+    """Guarda un lote; si falla entero, fila a fila para aislar las que no se pueden guardar."""
+    try:
+        async with shard_sessions[shard]() as session:
+            inserted = await _insert_rows(session, shard, rows)
+            await session.commit()
+        return inserted, {}
+    except IntegrityError:
+        logger.warning("Lote de altas diferidas rechazado; reintentando fila a fila")
+
+    inserted, failed = set(), {}
+    async with shard_sessions[shard]() as session:
+        for pending in rows:
+            try:
+                inserted |= await _insert_rows(session, shard, [pending])
+                await session.commit()
+            except IntegrityError as exc:
+                await session.rollback()
+                failed[pending.code] = type(exc.orig).__name__ if exc.orig else "integrity"
+    return inserted, failed
+
+async def _persist(rows: list[PendingURL]) -> tuple[set[str], dict[str, str]]:
+    """Devuelve los códigos que ya están en Postgres y los descartados con su motivo."""
+    by_shard: dict[int, list[PendingURL]] = {}
+    for pending in rows:
+        by_shard.setdefault(shard_map.shard_for_id(pending.id), []).append(pending)
+    inserted, failed = set(), {}
+    for shard, shard_rows in by_shard.items():
+        shard_inserted, shard_failed = await _insert_batch(shard, shard_rows)
+        inserted |= shard_inserted
+        failed.update(shard_failed)
+
+    skipped = {p.id: p.code for p in rows if p.code not in inserted and p.code not in failed}
+    if skipped:
+        # Los ids salen de la secuencia: si ya existe, es una entrega repetida de la misma alta
+        async def existing(session: AsyncSession) -> list[int]:
+            result = await session.execute(select(URL.id).where(URL.id.in_(skipped)))
+            return list(result.scalars())
+
+        stored = {url_id for ids in await scatter(existing) for url_id in ids}
+        for url_id, code in skipped.items():
+            if url_id in stored:
+                inserted.add(code)
+            else:
+                failed[code] = "conflict"
+    return inserted, failed
+
+class WriteBehindPersister:
+    """Consume el stream de altas y las persiste; cada worker es un consumidor del grupo."""
+
+    def __init__(self, batch_size: int = settings.write_behind_batch_size):
+        self.batch_size = batch_size
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+
+    async def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            await redis.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+        self._group_ready = True
+
+    async def _read(self) -> list[tuple[str, dict]]:
+        # Primero lo que dejaron sin confirmar otros workers caídos
+        _, messages, *_ = await redis.xautoclaim(
+            STREAM_KEY, GROUP, self.consumer,
+            min_idle_time=settings.write_behind_claim_idle_ms, count=self.batch_size,
+        )
+        if messages:
+            return messages
+        streams = await redis.xreadgroup(GROUP, self.consumer, {STREAM_KEY: ">"}, count=self.batch_size)
+        return streams[0][1] if streams else []
+
+    async def flush(self) -> int:
+        """Persiste lotes hasta vaciar lo pendiente; devuelve cuántas filas se guardaron."""
+        await self._ensure_group()
+        total = 0
+        while True:
+            messages = await self._read()
+            if messages:
+                total += await self._handle(messages)
+            if len(messages) < self.batch_size:
+                break
+        await self._observe_backlog()
+        return total
+
+    async def _handle(self, messages: list[tuple[str, dict]]) -> int:
+        rows: dict[str, PendingURL] = {}
+        dead = []
+        for message_id, fields in messages:
+            try:
+                rows[message_id] = PendingURL.from_json(fields["data"])
+            except (KeyError, TypeError, ValueError):
+                dead.append(message_id)
+
+        inserted, failed = await _persist(list(rows.values())) if rows else (set(), {})
+        persisted = [(message_id, p) for message_id, p in rows.items() if p.code in inserted]
+
+        now = time.time()
+        pipe = redis.pipeline(transaction=False)
+        for message_id, pending in persisted:
+            # Ya hay copia en Postgres: la entrada pasa a ser caché normal
+            pipe.expire(CACHE_PREFIX + pending.code, pending.entry().cache_ttl())
+            if pending.max_clicks is not None:
+                pipe.expire(CLICKS_PREFIX + str(pending.id), pending.entry().clicks_ttl())
+            WRITE_BEHIND_LAG.observe(now - enqueued_at(message_id))
+        if persisted:
+            # Los listados ya incluyen las filas nuevas
+            pipe.unlink(*affected_versions((p.id, p.owner_id) for _, p in persisted))
+        if failed:
+            # El código puede pertenecer a otro enlace: que el siguiente miss lea la BD
+            pipe.delete(
+                *(CACHE_PREFIX + code for code in failed),
+                *(CLICKS_PREFIX + str(p.id) for p in rows.values() if p.code in failed),
+            )
+            pipe.hset(FAILED_KEY, mapping=failed)
+            pipe.expire(FAILED_KEY, FAILED_TTL)
+        message_ids = [message_id for message_id, _ in messages]
+        pipe.xack(STREAM_KEY, GROUP, *message_ids)
+        pipe.xdel(STREAM_KEY, *message_ids)
+        await pipe.execute()
+
+        for _, pending in persisted:
+            if pending.expires_at is None and pending.max_clicks is None:
+                record_created(pending.code, pending.id, pending.original_url)
+
+        if failed:
+            logger.warning(f"Altas diferidas descartadas: {failed}")
+        if dead:
+            logger.error(f"Entradas ilegibles en {STREAM_KEY}: {dead}")
+        WRITE_BEHIND_ROWS.labels("persisted").inc(len(persisted))
+        WRITE_BEHIND_ROWS.labels("failed").inc(len(failed))
+        WRITE_BEHIND_ROWS.labels("dead").inc(len(dead))
+        return len(persisted)
+
+    async def _observe_backlog(self) -> None:
+        def build(pipe) -> None:
+            pipe.xlen(STREAM_KEY)
+            pipe.xrange(STREAM_KEY, count=1)
+
+        backlog, oldest = await pipelined(build)
+        WRITE_BEHIND_BACKLOG.set(backlog)
+        WRITE_BEHIND_OLDEST_AGE.set(time.time() - enqueued_at(oldest[0][0]) if oldest else 0)
+
+persister = WriteBehindPersister()
+
+# Reconciliación
+
+async def record_removed(rows: Iterable[tuple[int, str]]) -> None:
+    """
+    Deja una lápida por cada enlace (id, código) que sale de `urls`.
+
+    Solo las altas diferidas pasan por la reconciliación y sus códigos tienen
+    DEFERRED_CODE_LENGTH caracteres: el resto no necesita lápida.
+    """
+    keys = [REMOVED_PREFIX + str(url_id) for url_id, code in rows if len(code) == DEFERRED_CODE_LENGTH]
+    if not keys:
+        return
+
+    def build(pipe) -> None:
+        for key in keys:
+            pipe.set(key, 1, ex=FAILED_TTL)
+
+    try:
+        await pipelined(build)
+    except RedisError as exc:
+        logger.warning(f"No se pudieron registrar los enlaces retirados: {exc}")
+
+async def _removed_ids(pending: list[PendingURL]) -> set[int]:
+    """Ids de altas que ya salieron de `urls`: con lápida o en el archivo frío."""
+    if not pending:
+        return set()
+    ids = [p.id for p in pending]
+    tombstones = await redis.mget([REMOVED_PREFIX + str(url_id) for url_id in ids])
+    removed = {url_id for url_id, tombstone in zip(ids, tombstones) if tombstone}
+
+    async def archived(session: AsyncSession) -> list[int]:
+        result = await session.execute(select(URLArchive.id).where(URLArchive.id.in_(ids)))
+        return list(result.scalars())
+
+    return removed | {url_id for found in await scatter(archived) for url_id in found}
+
+async def _oldest_pending() -> Optional[float]:
+    oldest = await redis.xrange(STREAM_KEY, count=1)
+    return enqueued_at(oldest[0][0]) if oldest else None
+
+async def reconcile(
+    grace: float = settings.write_behind_reconcile_grace,
+    batch_size: int = settings.write_behind_batch_size,
+) -> dict[str, int]:
+    """
+    Compara las altas aceptadas hace más de `grace` segundos con Postgres.
+
+    Las que faltan y no se descartaron ni se retiraron después se vuelven a
+    encolar; si el código pertenece a otro enlace, la caché se corrige con lo
+    que hay en la BD.
+    """
+    cutoff = time.time() - grace
+    oldest = await _oldest_pending()
+    if oldest is not None:
+        # Lo aceptado después de la entrada más antigua sin persistir aún no es concluyente
+        cutoff = min(cutoff, oldest)
+    members = await redis.zrangebyscore(WRITTEN_KEY, "-inf", cutoff, start=0, num=batch_size)
+    results = {"ok": 0, "repaired": 0, "mismatch": 0, "failed": 0, "removed": 0}
+    if not members:
+        return results
+
+    pending = [PendingURL.from_json(member) for member in members]
+    codes = [p.code for p in pending]
+
+    async def lookup(session: AsyncSession) -> list:
+        return (await session.execute(select(URL.code, *ENTRY_COLUMNS).where(URL.code.in_(codes)))).all()
+
+    stored = {row.code: CachedURL.from_model(row) for rows in await scatter(lookup) for row in rows}
+    failed = dict(zip(codes, await redis.hmget(FAILED_KEY, codes)))
+    removed = await _removed_ids([p for p in pending if p.code not in stored and not failed[p.code]])
+
+    corrected = []
+    for member, p in zip(members, pending):
+        entry = stored.get(p.code)
+        if entry is not None and (entry.id, entry.original_url) == (p.id, p.original_url):
+            results["ok"] += 1
+        elif entry is not None:
+            corrected.append((p.code, entry))
+            await redis.hset(FAILED_KEY, p.code, "conflict")
+            results["mismatch"] += 1
+        elif failed[p.code]:
+            results["failed"] += 1
+        elif p.id in removed:
+            # Se persistió y luego se borró o archivó: no hay nada que reparar
+            results["removed"] += 1
+        else:
+            # Se perdió entre Redis y Postgres: vuelve al stream con la misma identidad
+            await redis.eval(
+                _REQUEUE_SCRIPT, 3,
+                CACHE_PREFIX + p.code, STREAM_KEY, WRITTEN_KEY,
+                p.entry().to_json(), time.time(), member,
+            )
+            results["repaired"] += 1
+            continue
+        await redis.zrem(WRITTEN_KEY, member)
+
+    if corrected:
+        await cache_urls(corrected)
+    for result_name, count in results.items():
+        WRITE_BEHIND_RECONCILED.labels(result_name).inc(count)
+    if results["repaired"] or results["mismatch"]:
+        logger.warning(f"Reconciliación de altas diferidas: {results}")
+    return results
+
+async def run_reconcile() -> None:
+    """Trabajo periódico: solo un worker reconcilia en cada intervalo."""
+    if await acquire_job_lock("write-behind-reconcile", settings.write_behind_reconcile_interval):
+        await reconcile()
@@ -0,0 +1,107 @@
+"""
+Formas de llegar a la app: en el mismo proceso (ASGI directo) o por un socket
+local contra un uvicorn en otro proceso.
+"""
+import asyncio
+import importlib
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+# Puntos de entrada comparables: la API completa y el nodo de redirecciones
+APPS = {"full": "app.main", "redirect": "app.redirect_main"}
+
+def load_app(name: str):
+    return importlib.import_module(APPS[name]).app
+
+def disable_rate_limits(app) -> None:
+    """Los límites por IP cortarían la carga a las pocas peticiones."""
+    limiters = [getattr(app.state, "limiter", None)]
+    # Solo los routers ya cargados: importar el resto falsearía la memoria medida
+    for module in ("app.api.v1.redirect_routes", "app.api.v1.url_routes"):
+        if module in sys.modules:
+            limiters.append(sys.modules[module].limiter)
+    for limiter in filter(None, limiters):
+        limiter.enabled = False
+
+class InProcessDriver:
+    """Llama a la app ASGI sin red: mide el coste del código y de BD/Redis."""
+
+    name = "inprocess"
+
+    def __init__(self, concurrency: int, app: str = "full"):
+        self.concurrency = concurrency
+        self.app = app
+        self.client: httpx.AsyncClient
+
+    async def __aenter__(self) -> "InProcessDriver":
+        app = load_app(self.app)
+        disable_rate_limits(app)
+        self._lifespan = app.router.lifespan_context(app)
+        await self._lifespan.__aenter__()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.client.aclose()
+        await self._lifespan.__aexit__(*exc_info)
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class SocketDriver:
+    """Levanta `benchmarks.serve` en otro proceso y lo carga por HTTP sobre TCP local."""
+
+    name = "socket"
+    startup_timeout = 30.0
+    poll_interval = 0.05
+
+    def __init__(self, concurrency: int, app: str = "full"):
+        self.concurrency = concurrency
+        self.app = app
+        self.client: httpx.AsyncClient
+        self.startup_time = 0.0
+
+    async def __aenter__(self) -> "SocketDriver":
+        port = _free_port()
+        started = time.perf_counter()
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.serve", "--port", str(port), "--app", self.app]
+        )
+        self.client = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        await self._wait_ready()
+        # Del exec del intérprete a la primera respuesta de /health/ready
+        self.startup_time = time.perf_counter() - started
+        return self
+
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
+    async def _wait_ready(self) -> None:
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError("El servidor de benchmark terminó al arrancar")
+            try:
+                if (await self.client.get("/health/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(self.poll_interval)
+        raise RuntimeError("El servidor de benchmark no estuvo listo a tiempo")
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.client.aclose()
+        self._process.terminate()
+        self._process.wait(timeout=10)
+
+DRIVERS = {driver.name: driver for driver in (InProcessDriver, SocketDriver)}
@@ -0,0 +1,78 @@
+"""
+Arranque en frío y memoria de cada punto de entrada.
+
+Uso: python -m benchmarks.footprint --runs 5          # solo importación, sin BD
+     python -m benchmarks.footprint --serve           # además, uvicorn hasta /health/ready
+
+La importación se mide en un intérprete nuevo por ejecución. Con --serve se
+mide también el tiempo hasta la primera respuesta de /health/ready y la RSS
+del servidor ya listo (Linux), lo que necesita Postgres y Redis.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+from benchmarks.drivers import APPS, SocketDriver
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+}}))
+"""
+
+def measure_import(app: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE.format(module=APPS[app])],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def rss_kb(pid: int) -> Optional[int]:
+    """RSS actual de un proceso según /proc; None fuera de Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return None
+
+async def measure_serve(app: str) -> dict:
+    async with SocketDriver(1, app) as driver:
+        return {"ready_ms": driver.startup_time * 1000, "rss_kb": rss_kb(driver.pid)}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="Arranca uvicorn y mide hasta /health/ready")
+    args = parser.parse_args()
+
+    for app in APPS:
+        samples = [measure_import(app) for _ in range(args.runs)]
+        line = (
+            f"{app:<8} import={statistics.median(s['import_ms'] for s in samples):8.1f}ms "
+            f"rss={max(s['max_rss_kb'] for s in samples) / 1024:6.1f}MB "
+            f"modules={samples[-1]['modules']}"
+        )
+        if args.serve:
+            served = [asyncio.run(measure_serve(app)) for _ in range(args.runs)]
+            rss = [s["rss_kb"] for s in served if s["rss_kb"] is not None]
+            line += f" ready={statistics.median(s['ready_ms'] for s in served):8.1f}ms"
+            if rss:
+                line += f" serving_rss={max(rss) / 1024:6.1f}MB"
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
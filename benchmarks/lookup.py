@@ -0,0 +1,99 @@
+"""
+Búsqueda de un código: ORM frente a asyncpg directo.
+
+Uso: python -m benchmarks.lookup --codes 10000 --iterations 20000
+
+Compara, con las mismas claves y de una en una, la consulta ORM con entidad
+completa (`select(URL).where(URL.code == code)`), la de columnas que usa la
+resolución por defecto y el camino directo de `db_fast_lookup`. Mide la
+latencia de cada búsqueda y el tiempo de CPU del proceso por búsqueda, que es
+lo que ahorra el camino directo: la consulta en Postgres es la misma.
+
+Necesita Postgres con las migraciones aplicadas; no usa Redis.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import select
+
+from benchmarks.seed import seed_codes
+from benchmarks.stats import percentile
+from benchmarks.workload import ZipfSampler
+from app.db.fast_lookup import fast_lookup
+from app.db.models.url import URL
+from app.db.session import async_session, close_engine, engine, warm_up_pool
+from app.services.url_service import _orm_lookup
+
+Lookup = Callable[[str], Awaitable[object]]
+
+async def orm_entity(code: str):
+    async with async_session() as session:
+        result = await session.execute(select(URL).where(URL.code == code))
+        return result.scalars().first()
+
+async def orm_columns(code: str):
+    async with async_session() as session:
+        return await _orm_lookup(session, code)
+
+async def asyncpg_direct(code: str):
+    return await fast_lookup(engine, code)
+
+VARIANTS: dict[str, Lookup] = {
+    "orm-entity": orm_entity,
+    "orm-columns": orm_columns,
+    "asyncpg": asyncpg_direct,
+}
+
+async def measure(lookup: Lookup, keys: list[str], warmup: int) -> dict:
+    for code in keys[:warmup]:
+        await lookup(code)
+    latencies = []
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for code in keys:
+        start = time.perf_counter()
+        if not await lookup(code):
+            raise RuntimeError(f"Código sin resolver: {code}")
+        latencies.append(time.perf_counter() - start)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    latencies.sort()
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "cpu_us": cpu / len(keys) * 1e6,
+        "rps": len(keys) / wall,
+    }
+
+async def _main(args) -> None:
+    codes = await seed_codes(args.codes)
+    await warm_up_pool(1)
+    sampler = ZipfSampler(codes, s=args.zipf, seed=args.seed)
+    keys = [sampler.sample() for _ in range(args.iterations)]
+    try:
+        results = {name: await measure(lookup, keys, args.warmup) for name, lookup in VARIANTS.items()}
+    finally:
+        await close_engine()
+
+    baseline = results["orm-entity"]
+    for name, result in results.items():
+        print(
+            f"{name:<12} p50={result['p50_ms']:7.3f}ms p95={result['p95_ms']:7.3f}ms "
+            f"p99={result['p99_ms']:7.3f}ms cpu={result['cpu_us']:7.1f}µs/búsqueda "
+            f"({result['cpu_us'] / baseline['cpu_us']:.2f}×) rps={result['rps']:8.1f}"
+        )
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codes", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(_main(parser.parse_args()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Benchmarks de redirección, alta y login.
+
+Uso: python -m benchmarks.run --driver inprocess --scenario all
+     python -m benchmarks.run --scenario redirect --save-baseline
+     python -m benchmarks.run --scenario redirect --compare  # sale con 1 si hay regresión
+     python -m benchmarks.run --driver socket --app redirect  # nodo de redirecciones
+
+Necesita Postgres y Redis (docker-compose up db redis) con las migraciones aplicadas.
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Awaitable, Callable
+
+import httpx
+
+from benchmarks.drivers import APPS, DRIVERS
+from benchmarks.seed import BENCH_EMAIL, BENCH_PASSWORD, seed_codes, seed_user
+from benchmarks.stats import Result, compare, load_baseline, save_baseline
+from benchmarks.workload import Mix, ZipfSampler
+
+Send = Callable[[], Awaitable[int]]
+SCENARIOS = ("redirect", "create", "mixed", "login")
+# El nodo de redirecciones no monta la API de enlaces ni la de usuarios
+APP_SCENARIOS = {"full": SCENARIOS, "redirect": ("redirect",)}
+
+async def _drive(send: Send, total: int, concurrency: int) -> tuple[list[float], Counter, float]:
+    """Lanza `total` peticiones con `concurrency` clientes en bucle cerrado."""
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+    issued = itertools.count()
+
+    async def client():
+        while next(issued) < total:
+            start = time.perf_counter()
+            try:
+                status = await send()
+            except httpx.HTTPError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+async def _bursts(send: Send, bursts: int, size: int) -> tuple[list[float], Counter, float]:
+    """Ráfagas de `size` peticiones simultáneas, una tras otra."""
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+
+    async def timed():
+        start = time.perf_counter()
+        try:
+            status = await send()
+        except httpx.HTTPError:
+            status = 0
+        latencies.append(time.perf_counter() - start)
+        statuses[status] += 1
+
+    started = time.perf_counter()
+    for _ in range(bursts):
+        await asyncio.gather(*(timed() for _ in range(size)))
+    return latencies, statuses, time.perf_counter() - started
+
+def _senders(client: httpx.AsyncClient, sampler: ZipfSampler, mix: Mix) -> dict[str, Send]:
+    async def redirect() -> int:
+        # get_url_info
+        return (await client.get(f"/r/api/url/{sampler.sample()}")).status_code
+
+    async def create() -> int:
+        # create_url
+        url = f"https://example.com/bench/new/{uuid.uuid4().hex}"
+        return (await client.post("/api/v1/urls/", json={"original_url": url})).status_code
+
+    async def mixed() -> int:
+        return await (redirect() if mix.is_read() else create())
+
+    async def login() -> int:
+        # authenticate_user: dominado por bcrypt
+        data = {"username": BENCH_EMAIL, "password": BENCH_PASSWORD}
+        return (await client.post("/api/v1/users/login", data=data)).status_code
+
+    return {"redirect": redirect, "create": create, "mixed": mixed, "login": login}
+
+async def run(args: argparse.Namespace) -> list[Result]:
+    codes = await seed_codes(args.codes, args.seed)
+    await seed_user()
+    sampler = ZipfSampler(codes, args.zipf, args.seed)
+    mix = Mix(args.read_ratio, args.seed)
+    scenarios = APP_SCENARIOS[args.app] if args.scenario == "all" else (args.scenario,)
+
+    results = []
+    async with DRIVERS[args.driver](args.concurrency, args.app) as driver:
+        senders = _senders(driver.client, sampler, mix)
+        for scenario in scenarios:
+            send = senders[scenario]
+            if scenario == "login":
+                latencies, statuses, elapsed = await _bursts(send, args.login_bursts, args.login_burst_size)
+                concurrency = args.login_burst_size
+            else:
+                await _drive(send, args.warmup, args.concurrency)
+                latencies, statuses, elapsed = await _drive(send, args.requests, args.concurrency)
+                concurrency = args.concurrency
+            results.append(
+                Result.from_samples(scenario, driver.name, latencies, statuses, elapsed, concurrency, args.app)
+            )
+    return results
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--driver", choices=sorted(DRIVERS), default="inprocess")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--app", choices=sorted(APPS), default="full", help="Punto de entrada a cargar")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--codes", type=int, default=10000, help="Códigos sembrados")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponente de la distribución de popularidad")
+    parser.add_argument("--read-ratio", type=float, default=0.9, help="Proporción de lecturas en 'mixed'")
+    parser.add_argument("--login-bursts", type=int, default=10)
+    parser.add_argument("--login-burst-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Compara con la baseline guardada")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Regresión relativa permitida")
+    args = parser.parse_args()
+    if args.scenario != "all" and args.scenario not in APP_SCENARIOS[args.app]:
+        parser.error(f"El escenario {args.scenario} no está disponible en la app {args.app}")
+
+    results = asyncio.run(run(args))
+    failed = False
+    for result in results:
+        print(result.summary())
+        if args.compare:
+            baseline = load_baseline(result)
+            if baseline is None:
+                print(f"  sin baseline para {result.driver}/{result.scenario}")
+            else:
+                for regression in compare(result, baseline, args.tolerance):
+                    print(f"  REGRESIÓN {regression}")
+                    failed = True
+        if args.save_baseline:
+            print(f"  baseline guardada en {save_baseline(result)}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Datos de benchmark deterministas: códigos y un usuario para los logins."""
+import random
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.security import hash_password
+from app.db.models.url import URL
+from app.db.models.user import User
+from app.db.session import async_session
+from app.services.canonical_url import canonicalize_url, url_digest
+from app.services.url_service import ALLOWED_CHARS, CODE_LENGTH
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "Bench-passw0rd!"
+CHUNK = 1000
+
+def bench_codes(count: int, seed: int = 42) -> list[str]:
+    rng = random.Random(seed)
+    codes: dict[str, None] = {}
+    while len(codes) < count:
+        codes["".join(rng.choice(ALLOWED_CHARS) for _ in range(CODE_LENGTH))] = None
+    return list(codes)
+
+async def seed_codes(count: int, seed: int = 42) -> list[str]:
+    """Inserta `count` enlaces (los existentes se respetan) y devuelve sus códigos."""
+    codes = bench_codes(count, seed)
+    async with async_session() as session:
+        for start in range(0, len(codes), CHUNK):
+            rows = []
+            for code in codes[start:start + CHUNK]:
+                original_url = f"https://example.com/bench/{code}"
+                rows.append({
+                    "code": code,
+                    "original_url": original_url,
+                    "url_hash": url_digest(canonicalize_url(original_url)),
+                    "access_count": 0,
+                })
+            await session.execute(insert(URL).values(rows).on_conflict_do_nothing())
+        await session.commit()
+    return codes
+
+async def seed_user() -> None:
+    async with async_session() as session:
+        await session.execute(
+            insert(User)
+            .values(email=BENCH_EMAIL, hashed_password=hash_password(BENCH_PASSWORD), is_active=True, role="user")
+            .on_conflict_do_nothing(index_elements=["email"])
+        )
+        await session.commit()
@@ -0,0 +1,20 @@
+"""Servidor para el driver por socket: la app sin límites por IP."""
+import argparse
+
+import uvicorn
+
+from benchmarks.drivers import APPS, disable_rate_limits, load_app
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--app", choices=sorted(APPS), default="full")
+    args = parser.parse_args()
+
+    app = load_app(args.app)
+    disable_rate_limits(app)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
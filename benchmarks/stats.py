@@ -0,0 +1,94 @@
+"""Percentiles, resultados y comparación con baselines guardadas."""
+import json
+import math
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Percentil por rango más cercano sobre valores ya ordenados."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+@dataclass
+class Result:
+    scenario: str
+    driver: str
+    requests: int
+    errors: int
+    elapsed: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    rps: float
+    concurrency: int
+    statuses: dict[str, int] = field(default_factory=dict)
+    recorded_at: float = field(default_factory=time.time)
+    # Punto de entrada medido (ver benchmarks.drivers.APPS)
+    app: str = "full"
+
+    @classmethod
+    def from_samples(
+        cls, scenario: str, driver: str, latencies: list[float], statuses: dict[int, int],
+        elapsed: float, concurrency: int, app: str = "full",
+    ) -> "Result":
+        values = sorted(latencies)
+        errors = sum(count for status, count in statuses.items() if status >= 400 or status == 0)
+        return cls(
+            scenario=scenario,
+            driver=driver,
+            requests=len(values),
+            errors=errors,
+            elapsed=round(elapsed, 3),
+            p50_ms=round(percentile(values, 50) * 1000, 3),
+            p95_ms=round(percentile(values, 95) * 1000, 3),
+            p99_ms=round(percentile(values, 99) * 1000, 3),
+            rps=round(len(values) / elapsed, 1) if elapsed else 0.0,
+            concurrency=concurrency,
+            statuses={str(status): count for status, count in sorted(statuses.items())},
+            app=app,
+        )
+
+    def summary(self) -> str:
+        return (
+            f"{self.app:<8} {self.driver:<10} {self.scenario:<10} n={self.requests:<6} err={self.errors:<5} "
+            f"p50={self.p50_ms:8.2f}ms p95={self.p95_ms:8.2f}ms p99={self.p99_ms:8.2f}ms "
+            f"rps={self.rps:9.1f}"
+        )
+
+def _baseline_path(result: Result) -> str:
+    name = f"{result.driver}-{result.scenario}"
+    if result.app != "full":
+        name = f"{result.app}-{name}"
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def save_baseline(result: Result) -> str:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = _baseline_path(result)
+    with open(path, "w") as fh:
+        json.dump(asdict(result), fh, indent=2, sort_keys=True)
+        fh.write("\n")
+    return path
+
+def load_baseline(result: Result) -> Optional[Result]:
+    try:
+        with open(_baseline_path(result)) as fh:
+            return Result(**json.load(fh))
+    except FileNotFoundError:
+        return None
+
+def compare(result: Result, baseline: Result, tolerance: float) -> list[str]:
+    """Regresiones respecto a la baseline que superan la tolerancia relativa."""
+    regressions = []
+    for metric in ("p50_ms", "p95_ms", "p99_ms"):
+        current, previous = getattr(result, metric), getattr(baseline, metric)
+        if previous and current > previous * (1 + tolerance):
+            regressions.append(f"{metric}: {previous} -> {current}")
+    if baseline.rps and result.rps < baseline.rps * (1 - tolerance):
+        regressions.append(f"rps: {baseline.rps} -> {result.rps}")
+    return regressions
@@ -0,0 +1,33 @@
+"""Generadores de carga: códigos con popularidad Zipf y mezcla de lecturas/escrituras."""
+import bisect
+import itertools
+import random
+from typing import Sequence
+
+class ZipfSampler:
+    """
+    Elige elementos con probabilidad proporcional a 1 / rango^s.
+
+    El orden de popularidad se baraja con la misma semilla, así los códigos
+    más visitados no dependen del orden de inserción.
+    """
+
+    def __init__(self, items: Sequence[str], s: float = 1.1, seed: int = 42):
+        self._random = random.Random(seed)
+        self._items = list(items)
+        self._random.shuffle(self._items)
+        self._cumulative = list(itertools.accumulate(1 / rank ** s for rank in range(1, len(self._items) + 1)))
+
+    def sample(self) -> str:
+        point = self._random.random() * self._cumulative[-1]
+        return self._items[bisect.bisect_left(self._cumulative, point)]
+
+class Mix:
+    """Decide para cada petición si es lectura o escritura según `read_ratio`."""
+
+    def __init__(self, read_ratio: float, seed: int = 42):
+        self.read_ratio = read_ratio
+        self._random = random.Random(seed)
+
+    def is_read(self) -> bool:
+        return self._random.random() < self.read_ratio
@@ -0,0 +1,54 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.admission import Priority, admission, route_priority, setup_admission
+from app.core.config import get_settings
+
+# Umbral de espera del pool en segundos
+POOL_WAIT_LIMIT = get_settings().admission_pool_wait_ms / 1000
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    setup_admission(app)
+
+    @app.get("/api/v1/urls/")
+    async def list_urls():
+        return []
+
+    @app.get("/r/{code}")
+    async def redirect(code: str):
+        return {"code": code}
+
+    @app.get("/health/ready")
+    async def ready():
+        return {"status": "ready"}
+
+    yield TestClient(app)
+    admission.loop_lag = admission.pool_wait = 0.0
+
+
+def test_route_priorities():
+    assert route_priority("GET", "/api/v1/urls/") is Priority.LOW
+    assert route_priority("POST", "/api/v1/urls/") is Priority.NORMAL
+    assert route_priority("GET", "/r/api/url/abc123") is Priority.HIGH
+
+
+def test_low_priority_routes_are_shed_first(client):
+    # Pool esperando 1.2 veces el umbral: se rechaza el listado, no las redirecciones
+    admission.pool_wait = 1.2 * POOL_WAIT_LIMIT
+
+    response = client.get("/api/v1/urls/")
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/r/abc123").status_code == 200
+    assert client.get("/health/ready").status_code == 200
+
+
+def test_everything_but_health_is_shed_under_extreme_pressure(client):
+    admission.pool_wait = 3 * POOL_WAIT_LIMIT
+
+    assert client.get("/r/abc123").status_code == 503
+    assert client.get("/health/ready").status_code == 200
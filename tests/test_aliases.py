@@ -0,0 +1,46 @@
+from app.services.alias_service import WordMatcher, alias_candidates, alias_error
+
+
+def test_matcher_finds_words_inside_others():
+    matcher = WordMatcher(["he", "she", "his", "hers"])
+    assert matcher.find("ushers") == "she"
+    assert matcher.find("ahishers") == "his"
+    assert matcher.find("xhxex") is None
+    assert WordMatcher([]).find("anything") is None
+
+
+def test_alias_rules():
+    assert alias_error("summer-sale") is None
+    assert alias_error("Rebajas_2026") is None
+    assert alias_error("-summer") is not None
+    assert alias_error("ab") is not None
+    assert alias_error("x" * 33) is not None
+    assert alias_error("summer sale") is not None
+    # Las rutas solo como alias completo
+    assert alias_error("Admin") == "Alias reservado"
+    assert alias_error("admin-panel") is None
+
+
+def test_blocked_words_as_tokens_or_substrings():
+    assert alias_error("oferta-sh1t") is not None
+    assert alias_error("SHIT") is not None
+    assert alias_error("pu-ta") is not None
+    assert alias_error("mi_porno") is not None
+    # Solo las que no forman parte de palabras normales se buscan dentro de otras
+    assert alias_error("tusfuckingofertas") is not None
+    assert alias_error("superpendejada") is not None
+
+
+def test_ordinary_words_containing_blocked_tokens_are_allowed():
+    for alias in (
+        "computadoras", "diputados", "reputation", "computation", "Scunthorpe",
+        "shiitake-2026", "nazionale", "mushitake", "ofertas-computadoras", "deputation_x",
+    ):
+        assert alias_error(alias) is None, alias
+
+
+def test_candidates_are_valid_and_keep_the_first_character():
+    candidates = alias_candidates("s" * 32, 5)
+    assert len(candidates) >= 5
+    assert all(alias_error(candidate) is None for candidate in candidates)
+    assert all(candidate[0] == "s" and candidate != "s" * 32 for candidate in candidates)
@@ -0,0 +1,64 @@
+import json
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import archive_service
+from app.services.archive_service import archive_row, decode_payload, encode_payload, restore_row
+from app.services.canonical_url import canonicalize_url, url_digest
+
+
+def _url(**overrides):
+    data = dict(
+        id=42,
+        code="aB3dE5",
+        owner_id=7,
+        created_at=datetime(2024, 1, 1, 12),
+        original_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        access_count=3,
+        last_accessed_at=datetime(2024, 2, 1, 8, 30),
+        target_status=404,
+        target_checked_at=datetime(2024, 3, 1),
+    )
+    data.update(overrides)
+    return SimpleNamespace(**data)
+
+
+def test_payload_round_trips():
+    payload = encode_payload("https://example.com/a?utm_source=x", 5, None)
+    assert decode_payload(payload) == {"clicks": 5, "last": None, "url": "https://example.com/a?utm_source=x"}
+
+
+def test_payload_is_smaller_than_plain_json():
+    url = "https://github.com/Fabiankop/short-link-guardian-backend"
+    raw = json.dumps({"clicks": 0, "last": None, "url": url}, separators=(",", ":"))
+    assert len(encode_payload(url, 0, None)) < len(raw) * 0.7
+
+
+def test_unknown_payload_version_is_rejected():
+    payload = encode_payload("https://example.com/", 0, None)
+    with pytest.raises(ValueError):
+        decode_payload(b"\x09" + payload[1:])
+
+
+def test_restore_recomputes_digest_and_keeps_columns():
+    url = _url()
+    row = archive_row(url, datetime(2024, 6, 1))
+    restored = restore_row(SimpleNamespace(**row))
+    assert restored["url_hash"] == url_digest(canonicalize_url(url.original_url))
+    for column in (
+        "id", "code", "owner_id", "created_at", "original_url", "access_count", "last_accessed_at",
+        "target_status", "target_checked_at",
+    ):
+        assert restored[column] == getattr(url, column)
+
+
+def test_version_1_payloads_restore_without_target_status():
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=archive_service._ZDICT)
+    raw = json.dumps({"clicks": 2, "last": None, "url": "https://example.com/"}, separators=(",", ":")).encode()
+    payload = b"\x01" + compressor.compress(raw) + compressor.flush()
+    restored = restore_row(SimpleNamespace(**(archive_row(_url(), datetime(2024, 6, 1)) | {"payload": payload})))
+    assert restored["access_count"] == 2
+    assert restored["target_status"] is None and restored["target_checked_at"] is None
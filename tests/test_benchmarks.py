@@ -0,0 +1,32 @@
+from collections import Counter
+
+from benchmarks.stats import Result, compare, percentile
+from benchmarks.workload import ZipfSampler
+
+
+def test_zipf_sampler_is_skewed_and_reproducible():
+    items = [f"c{i}" for i in range(1000)]
+    a, b = ZipfSampler(items, s=1.1, seed=7), ZipfSampler(items, s=1.1, seed=7)
+    assert [a.sample() for _ in range(50)] == [b.sample() for _ in range(50)]
+
+    counts = Counter(a.sample() for _ in range(20000))
+    top = sum(count for _, count in counts.most_common(10))
+    # Con s=1.1 los 10 más populares concentran bastante más del 1% uniforme
+    assert top / 20000 > 0.3
+
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = Result.from_samples("redirect", "inprocess", [0.001] * 100, {200: 100}, 0.1, 10)
+    slower = Result.from_samples("redirect", "inprocess", [0.002] * 100, {200: 100}, 0.2, 10)
+
+    assert compare(baseline, baseline, 0.2) == []
+    regressions = compare(slower, baseline, 0.2)
+    assert any(r.startswith("p95_ms") for r in regressions)
+    assert any(r.startswith("rps") for r in regressions)
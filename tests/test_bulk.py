@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.db import sharding
+from app.db.models.url import URL
+from app.schemas.url import BulkFilter, BulkSelection, BulkUpdate
+from app.services import bulk_service
+from app.services.bulk_service import _filter_clause, _not_moving, _run, update_values
+
+
+def _fake_apply(stored: dict[int, dict[str, int]], calls: list):
+    """Cada shard con sus códigos → id; devuelve las filas del lote que existen."""
+    async def apply(shard, where):
+        chunk = where(URL.__table__).right.value
+        calls.append((shard, list(chunk)))
+        return [
+            SimpleNamespace(id=stored[shard][code], code=code)
+            for code in chunk if code in stored.get(shard, {})
+        ]
+    return apply
+
+
+async def _collect(items):
+    return [item async for item in items]
+
+
+@pytest.mark.asyncio
+async def test_codes_are_chunked_per_shard_and_legacy_ones_retried_on_zero(monkeypatch):
+    monkeypatch.setattr(sharding.shard_map, "shard_count", 2)
+    monkeypatch.setattr(sharding.shard_map, "shards", [1] * sharding.SHARD_BUCKETS)
+    monkeypatch.setattr(sharding.shard_map, "moving", frozenset({sharding.bucket_for_code("m")}))
+    monkeypatch.setattr(bulk_service.settings, "bulk_chunk_size", 2)
+    calls = []
+    apply = _fake_apply({1: {"aaa": 10, "bbb": 11}, 0: {"old": 3}}, calls)
+    selection = BulkSelection(codes=["aaa", "bbb", "old", "aaa", "zzz", "mmm"])
+
+    items = await _collect(_run("delete", selection, None, apply, "deleted"))
+
+    assert calls == [(1, ["aaa", "bbb"]), (1, ["old", "zzz"]), (0, ["old", "zzz"])]
+    assert items == [
+        {"code": "mmm", "status": "moving"},
+        {"id": 10, "code": "aaa", "status": "deleted"},
+        {"id": 11, "code": "bbb", "status": "deleted"},
+        {"id": 3, "code": "old", "status": "deleted"},
+        {"code": "zzz", "status": "not_found"},
+        {"summary": {"moving": 1, "deleted": 3, "not_found": 1}},
+    ]
+
+
+def test_filter_skips_moving_buckets(monkeypatch):
+    monkeypatch.setattr(sharding.shard_map, "moving", frozenset({5}))
+    urls = URL.__table__
+    clause = _filter_clause(urls, BulkFilter(original_url_prefix="https://promo.example/")) & _not_moving(urls)
+    sql = str(clause.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    # El prefijo se escapa: un % o _ en la URL no actúa como comodín
+    assert "urls.original_url LIKE 'https:////promo.example//' || '%%' ESCAPE '/'" in sql
+    assert "urls.id < 4294967296 OR (urls.id %% 64 NOT IN (5))" in sql
+
+
+def test_update_resets_the_destination_check_and_can_clear_expiry():
+    values = update_values(BulkUpdate(ids=[1], original_url="https://example.com/new", expires_at=None))
+    assert values["original_url"] == "https://example.com/new"
+    assert values["url_hash"] and values["target_status"] is None
+    assert "expires_at" in values and values["expires_at"] is None
+    assert "expires_at" not in update_values(BulkUpdate(ids=[1], original_url="https://example.com/new"))
@@ -0,0 +1,25 @@
+from app.services.canonical_url import DIGEST_LENGTH, canonicalize_url, url_digest
+
+
+def test_equivalent_urls_share_canonical_form():
+    variants = [
+        "HTTPS://Example.COM:443/path?b=2&a=1",
+        "https://example.com/path?a=1&b=2",
+        "https://example.com:443/path?a=1&b=2",
+    ]
+    assert {canonicalize_url(url) for url in variants} == {"https://example.com/path?a=1&b=2"}
+
+
+def test_canonical_form_keeps_meaningful_differences():
+    assert canonicalize_url("http://example.com:8080") == "http://example.com:8080/"
+    assert canonicalize_url("https://example.com/Path") != canonicalize_url("https://example.com/path")
+    assert canonicalize_url("https://example.com/#a") != canonicalize_url("https://example.com/#b")
+    # Los valores de un mismo parámetro conservan su orden
+    assert canonicalize_url("https://example.com/?b=1&a=2&a=1") == "https://example.com/?a=2&a=1&b=1"
+    assert canonicalize_url("https://example.com/?a=2&a=1") != canonicalize_url("https://example.com/?a=1&a=2")
+
+
+def test_digest_is_fixed_width():
+    digest = url_digest(canonicalize_url("https://example.com/" + "x" * 2000))
+    assert len(digest) == DIGEST_LENGTH
+    assert digest == url_digest("https://example.com/" + "x" * 2000)
@@ -0,0 +1,37 @@
+from app.services.click_stream_service import ClickHub, Subscription
+
+
+def test_frame_coalesces_queued_events():
+    subscription = Subscription({"abc", "xyz"}, max_size=10)
+    subscription.push(1.0, {"abc": 2})
+    subscription.push(2.0, {"abc": 1, "xyz": 4})
+
+    frame = subscription.drain()
+
+    assert frame == {"clicks": {"abc": 3, "xyz": 4}, "from": 1.0, "to": 2.0, "dropped": 0}
+    assert subscription.drain() is None
+
+
+def test_full_queue_drops_oldest_events():
+    subscription = Subscription({"abc"}, max_size=2)
+    for timestamp in (1.0, 2.0, 3.0):
+        subscription.push(timestamp, {"abc": 1})
+
+    frame = subscription.drain()
+
+    assert frame["clicks"] == {"abc": 2}
+    assert frame["from"] == 2.0
+    assert frame["dropped"] == 1
+
+
+def test_dispatch_only_delivers_followed_codes():
+    hub = ClickHub()
+    watcher, other = Subscription({"abc"}), Subscription({"xyz"})
+    for subscription in (watcher, other):
+        hub._subscriptions.add(subscription)
+        hub._index(subscription, subscription.codes)
+
+    hub.dispatch(1.0, {"abc": 5, "zzz": 1})
+
+    assert watcher.drain()["clicks"] == {"abc": 5}
+    assert other.drain() is None
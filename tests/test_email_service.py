@@ -0,0 +1,154 @@
+import smtplib
+import socket
+
+import pytest
+
+from app.core import celery_app
+from app.core.celery_app import DeliveryInterrupted, deliver_emails, send_email_batch_task
+from app.services import email_service
+from app.services.email_service import EmailQueue
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.add(session.peer)
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def test_deliver_emails_reuses_one_connection(smtp_server):
+    controller, handler = smtp_server
+    messages = [
+        {"to_email": f"user{i}@example.com", "subject": "Hi", "body": f"Message {i}"}
+        for i in range(20)
+    ]
+
+    sent = deliver_emails(
+        messages, host=controller.hostname, port=controller.port,
+        username=None, password=None, use_tls=False,
+    )
+
+    assert sent == 20
+    assert len(handler.messages) == 20
+    assert len(handler.peers) == 1
+    assert handler.messages[0].rcpt_tos == ["user0@example.com"]
+
+
+class _DroppingSMTP:
+    """Servidor que corta la conexión tras aceptar `limit` correos; `errors` falla destinatarios concretos."""
+
+    sent: list = []
+    limit = 3
+    errors: dict = {}
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send_message(self, email):
+        if email["To"] in self.errors:
+            raise self.errors[email["To"]]
+        if len(self.sent) >= self.limit:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(email["To"])
+
+
+def test_interrupted_batch_is_retried_from_the_first_unsent_message(monkeypatch):
+    monkeypatch.setattr(celery_app.smtplib, "SMTP", _DroppingSMTP)
+    monkeypatch.setattr(_DroppingSMTP, "sent", [])
+    messages = [{"to_email": f"user{i}@example.com", "subject": "Hi", "body": "Body"} for i in range(5)]
+
+    def deliver(batch):
+        return deliver_emails(batch, host="smtp.test", use_tls=False, username=None)
+
+    with pytest.raises(DeliveryInterrupted) as interrupted:
+        deliver(messages)
+    assert interrupted.value.done == 3
+
+    retried = []
+
+    class Retry(Exception):
+        pass
+
+    def retry(args, exc, countdown):
+        retried.append(args)
+        return Retry()
+
+    monkeypatch.setattr(celery_app, "deliver_emails", deliver)
+    monkeypatch.setattr(_DroppingSMTP, "sent", [])
+    monkeypatch.setattr(send_email_batch_task, "retry", retry)
+    with pytest.raises(Retry):
+        send_email_batch_task.run(messages)
+    assert retried == [(messages[3:],)]
+    assert _DroppingSMTP.sent == ["user0@example.com", "user1@example.com", "user2@example.com"]
+
+
+def _deliver_to(monkeypatch, errors, count=5):
+    monkeypatch.setattr(celery_app.smtplib, "SMTP", _DroppingSMTP)
+    monkeypatch.setattr(_DroppingSMTP, "sent", [])
+    monkeypatch.setattr(_DroppingSMTP, "limit", count)
+    monkeypatch.setattr(_DroppingSMTP, "errors", errors)
+    messages = [{"to_email": f"user{i}@example.com", "subject": "Hi", "body": "Body"} for i in range(count)]
+    return deliver_emails(messages, host="smtp.test", use_tls=False, username=None)
+
+
+def test_rejected_message_does_not_stop_the_batch(monkeypatch):
+    sent = _deliver_to(monkeypatch, {
+        "user1@example.com": smtplib.SMTPDataError(554, b"Message rejected"),
+        "user3@example.com": smtplib.SMTPSenderRefused(552, b"Message too large", "no-reply@example.com"),
+    })
+    assert sent == 3
+    assert _DroppingSMTP.sent == ["user0@example.com", "user2@example.com", "user4@example.com"]
+
+
+@pytest.mark.parametrize("error", [
+    TimeoutError("timed out"),
+    smtplib.SMTPDataError(421, b"Service not available, closing channel"),
+])
+def test_timeouts_and_closing_server_interrupt_the_batch(monkeypatch, error):
+    with pytest.raises(DeliveryInterrupted) as interrupted:
+        _deliver_to(monkeypatch, {"user2@example.com": error})
+    assert interrupted.value.done == 2
+    assert interrupted.value.__cause__ is error
+
+
+@pytest.mark.asyncio
+async def test_email_queue_publishes_in_batches(monkeypatch):
+    published = []
+    monkeypatch.setattr(email_service.send_email_batch_task, "delay", published.append)
+
+    queue = EmailQueue(batch_size=100)
+    queue.start()
+    for i in range(250):
+        await queue.enqueue(f"user{i}@example.com", "Hi", "Body")
+    assert published == []
+
+    assert await queue.flush() == 250
+    assert [len(batch) for batch in published] == [100, 100, 50]
+    assert await queue.flush() == 0
@@ -0,0 +1,47 @@
+from fastapi import Response
+from starlette.requests import Request
+
+from app.services.etag_service import (
+    ALL_URLS_VERSION, affected_versions, check_not_modified, etag_matches, make_etag, owner_version,
+    params_digest, url_version
+)
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_weak_comparison_accepts_lists_and_strong_tags():
+    etag = make_etag("u", 7, "abc")
+    assert etag == 'W/"u.7.abc"'
+    assert etag_matches('W/"u.7.abc"', etag)
+    assert etag_matches('"u.7.abc"', etag)
+    assert etag_matches('W/"x", W/"u.7.abc"', etag)
+    assert not etag_matches('W/"u.7.abd"', etag)
+    assert not etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+
+
+def test_not_modified_only_when_the_tag_matches():
+    etag = make_etag("l", 0, 100, "abc")
+    response = Response()
+    assert check_not_modified(_request('W/"l.0.100.old"'), response, etag) is None
+    assert response.headers["etag"] == etag
+
+    not_modified = check_not_modified(_request(etag), Response(), etag)
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.body == b""
+
+    # Sin sello (Redis caído) se sirve la respuesta completa sin ETag
+    response = Response()
+    assert check_not_modified(_request(etag), response, None) is None
+    assert "etag" not in response.headers
+
+
+def test_writes_touch_the_link_its_owner_and_the_global_listing():
+    assert affected_versions([(1, 5), (2, None)]) == {
+        ALL_URLS_VERSION, url_version(1), url_version(2), owner_version(5)
+    }
+    assert params_digest(20, None) != params_digest(20, "cursor")
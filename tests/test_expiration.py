@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from sqlalchemy.dialects import postgresql
+
+from app.api.v1 import redirect_routes
+from app.db.session import get_session
+from app.schemas.url import URLCreate
+from app.services import expiration_service, url_service
+from app.services.expiration_service import _exhausted_batch, _expired_batch, _purge
+from app.services.url_service import CLICKS_TTL_MARGIN, CachedURL, ClickBuffer, consume_click
+
+BOT = {"user-agent": "curl/8.5.0"}
+BROWSER = {"user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36"}
+
+
+def time_in(seconds: float) -> float:
+    return datetime.now(timezone.utc).timestamp() + seconds
+
+
+@pytest.fixture
+def redirect(monkeypatch):
+    """Cliente del endpoint de redirección con la resolución y el registro de accesos sustituidos."""
+    state = SimpleNamespace(entry=None, clicks=0, accesses=[])
+
+    async def resolve_code(code):
+        return state.entry
+
+    async def consume_click(entry):
+        state.clicks += 1
+        return state.clicks <= entry.max_clicks
+
+    async def record_access(db, url_id, counted=True, consumed=False):
+        state.accesses.append((url_id, counted, consumed))
+
+    async def session():
+        yield None
+
+    monkeypatch.setattr(redirect_routes, "resolve_code", resolve_code)
+    monkeypatch.setattr(redirect_routes, "consume_click", consume_click)
+    monkeypatch.setattr(redirect_routes, "record_access", record_access)
+    monkeypatch.setattr(redirect_routes.click_publisher, "add", lambda code: None)
+    monkeypatch.setattr(redirect_routes.geo_clicks, "add", lambda url_id, ip: None)
+    app = FastAPI()
+    app.state.limiter = Limiter(key_func=get_remote_address, enabled=False)
+    app.include_router(redirect_routes.router)
+    app.dependency_overrides[get_session] = session
+    with TestClient(app) as client:
+        state.get = lambda headers=BROWSER: client.get("/api/url/abc123", headers=headers)
+        yield state
+
+
+def test_expiration_must_be_future_and_is_stored_in_utc():
+    with pytest.raises(ValueError):
+        URLCreate(original_url="https://example.com", expires_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+    local = datetime.now(timezone(timedelta(hours=-6))) + timedelta(days=1)
+    url = URLCreate(original_url="https://example.com", expires_at=local, max_clicks=3)
+    assert url.expires_at.tzinfo is None
+    assert url.expires_at == local.astimezone(timezone.utc).replace(tzinfo=None)
+    with pytest.raises(ValueError):
+        URLCreate(original_url="https://example.com", max_clicks=0)
+
+
+def test_expired_exhausted_and_broken_links_answer_410(redirect, monkeypatch):
+    redirect.entry = CachedURL(id=1, original_url="https://example.com", expires_at=1.0)
+    assert redirect.get().status_code == 410
+    assert redirect.accesses == []
+
+    redirect.entry = CachedURL(id=2, original_url="https://example.com", max_clicks=1)
+    assert redirect.get().status_code == 200
+    response = redirect.get()
+    assert response.status_code == 410 and response.json()["detail"] == "URL sin accesos disponibles"
+
+    redirect.entry = CachedURL(id=3, original_url="https://example.com", broken=True)
+    assert redirect.get().json() == {"url": "https://example.com", "broken": True}
+    monkeypatch.setattr(redirect_routes.settings, "block_broken_targets", True)
+    assert redirect.get().status_code == 410
+
+
+class _Pipe:
+    def __init__(self, clicks):
+        self.clicks = clicks
+        self.commands = []
+
+    def incr(self, key):
+        self.commands.append(("incr", key))
+
+    def expire(self, key, ttl):
+        self.commands.append(("expire", key, ttl))
+
+
+@pytest.mark.asyncio
+async def test_consume_click_counts_against_the_limit_and_keeps_a_ttl(monkeypatch):
+    pipes = []
+
+    async def pipelined(build, transaction=False):
+        pipe = _Pipe(len(pipes) + 1)
+        build(pipe)
+        pipes.append(pipe)
+        return [pipe.clicks, True]
+
+    monkeypatch.setattr(url_service, "pipelined", pipelined)
+    entry = CachedURL(id=5, original_url="https://example.com", max_clicks=2)
+    assert [await consume_click(entry) for _ in range(3)] == [True, True, False]
+    assert pipes[0].commands == [
+        ("incr", "clicks:5"), ("expire", "clicks:5", url_service.settings.redirect_cache_ttl + CLICKS_TTL_MARGIN),
+    ]
+    # Con expiración el contador no dura mucho más que el enlace
+    soon = CachedURL(id=6, original_url="https://example.com", max_clicks=2, expires_at=time_in(30))
+    assert soon.clicks_ttl() <= 30 + CLICKS_TTL_MARGIN
+
+
+class _PurgeSession:
+    """Devuelve un lote de filas borradas por cada DELETE sobre urls."""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.commits = 0
+
+    async def execute(self, statement, params=None):
+        if getattr(statement, "table", None) is not None and statement.table.name == "urls":
+            batch = self.batches.pop(0) if self.batches else []
+            return SimpleNamespace(all=lambda: batch)
+        return SimpleNamespace(all=lambda: [])
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_in_batches_and_invalidates_each_one(monkeypatch):
+    invalidated = []
+
+    async def invalidate_urls(rows):
+        invalidated.append(list(rows))
+
+    async def bump_versions(keys):
+        pass
+
+    monkeypatch.setattr(expiration_service, "invalidate_urls", invalidate_urls)
+    monkeypatch.setattr(expiration_service, "bump_versions", bump_versions)
+    rows = [SimpleNamespace(id=i, code=f"c{i}", owner_id=None) for i in range(5)]
+    session = _PurgeSession([rows[:2], rows[2:4], rows[4:]])
+
+    assert await _purge(session, 0, _expired_batch, 2) == 5
+    assert invalidated == [[(0, "c0"), (1, "c1")], [(2, "c2"), (3, "c3")], [(4, "c4")]]
+    assert session.commits == 3
+    # Un lote completo obliga a comprobar si queda otro, aunque venga vacío
+    session = _PurgeSession([rows[:2]])
+    assert await _purge(session, 0, _expired_batch, 2) == 2
+    assert session.commits == 2
+
+
+def test_bots_consume_limited_links_without_counting_an_access(redirect):
+    redirect.entry = CachedURL(id=7, original_url="https://example.com", max_clicks=2)
+    assert redirect.get(BOT).status_code == 200
+    assert redirect.get(BROWSER).status_code == 200
+    assert redirect.get(BROWSER).status_code == 410
+    assert redirect.accesses == [(7, False, True), (7, True, True)]
+
+    redirect.entry, redirect.accesses = CachedURL(id=8, original_url="https://example.com"), []
+    assert redirect.get(BOT).status_code == 200
+    assert redirect.accesses == []
+
+
+class _Session:
+    """Sesión mínima para ClickBuffer.flush: guarda los parámetros del UPDATE."""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if params is not None:
+            self.calls.append(params)
+        return SimpleNamespace(all=lambda: [])
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_click_buffer_persists_consumption_separately(monkeypatch):
+    calls = []
+    monkeypatch.setattr(url_service, "shard_sessions", [lambda: _Session(calls)])
+
+    async def bump_versions(keys):
+        pass
+
+    monkeypatch.setattr(url_service, "bump_versions", bump_versions)
+    buffer = ClickBuffer()
+    buffer.add(1)
+    buffer.add(2, counted=False, consumed=True)
+    buffer.add(2, consumed=True)
+    assert await buffer.flush() == 2
+    assert sorted(calls[0], key=lambda row: row["url_id"]) == [
+        {"url_id": 1, "hits": 1, "used": 0},
+        {"url_id": 2, "hits": 1, "used": 2},
+    ]
+    assert await buffer.flush() == 0
+
+
+def test_exhausted_purge_uses_consumed_clicks():
+    sql = str(_exhausted_batch(100).compile(dialect=postgresql.dialect()))
+    assert "urls.consumed_clicks >= urls.max_clicks" in sql
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import pytest
+from asyncpg.exceptions import InvalidCachedStatementError
+
+from app.db.fast_lookup import LOOKUP_SQL, EntryRow, _prepared, fast_lookup
+from app.services.url_service import ENTRY_COLUMNS, CachedURL
+
+
+def test_raw_query_returns_the_cache_entry_columns():
+    columns = [column.name for column in ENTRY_COLUMNS]
+    assert list(EntryRow._fields) == columns
+    assert LOOKUP_SQL.startswith(f"SELECT {', '.join(columns)} FROM urls")
+    entry = CachedURL.from_model(EntryRow(7, "https://example.com", None, None, 404))
+    assert entry.id == 7 and entry.broken
+
+
+@pytest.mark.asyncio
+async def test_statements_are_prepared_once_per_connection():
+    prepared = []
+
+    async def prepare(sql):
+        prepared.append(sql)
+        return sql
+
+    raw = SimpleNamespace(info={}, driver_connection=SimpleNamespace(prepare=prepare))
+    first = await _prepared(raw)
+    assert await _prepared(raw) is first
+    assert len(prepared) == 2
+
+
+class _Statement:
+    def __init__(self, stale: bool):
+        self.stale = stale
+
+    async def fetchrow(self, code):
+        if self.stale:
+            raise InvalidCachedStatementError("cached plan must not change result type")
+        return (7, "https://example.com", None, None, None)
+
+
+class _Engine:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def connect(self):
+        engine = self
+
+        class _Connection:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def get_raw_connection(self):
+                return engine.raw
+
+        return _Connection()
+
+
+@pytest.mark.asyncio
+async def test_stale_statements_are_prepared_again_once():
+    prepared = []
+
+    async def prepare(sql):
+        # La primera tanda queda invalidada por un cambio de esquema
+        prepared.append(sql)
+        return _Statement(stale=len(prepared) <= 2)
+
+    raw = SimpleNamespace(info={}, driver_connection=SimpleNamespace(prepare=prepare))
+    row, consumed = await fast_lookup(_Engine(raw), "abc123")
+    assert row.id == 7 and consumed is None
+    assert len(prepared) == 4
+    assert raw.info["fast_lookup"][0].stale is False
+
+    async def always_stale(sql):
+        return _Statement(stale=True)
+
+    raw = SimpleNamespace(info={}, driver_connection=SimpleNamespace(prepare=always_stale))
+    with pytest.raises(InvalidCachedStatementError):
+        await fast_lookup(_Engine(raw), "abc123")
@@ -0,0 +1,81 @@
+from collections import Counter
+from types import SimpleNamespace
+
+from app.core import client_ip
+from app.services.geoip_service import (
+    GeoClickBuffer, GeoIndex, GeoInfo, UNKNOWN_COUNTRY, ip_key, read_csv, write_geoip_db,
+)
+
+CSV = """start,end,country,asn
+1.0.0.0,1.0.0.255,AU,13335
+8.8.8.0,8.8.8.255,US,15169
+81.0.0.0,81.255.255.255,ES,3352
+2001:4860::/32,US,15169
+2a00:1450::/32,IE,15169
+"""
+
+
+def _index(tmp_path):
+    source = tmp_path / "ranges.csv"
+    source.write_text(CSV)
+    path = str(tmp_path / "geo.bin")
+    assert write_geoip_db(path, read_csv(str(source))) == 5
+    return GeoIndex(path)
+
+
+def test_lookup_finds_ranges_and_misses_gaps(tmp_path):
+    index = _index(tmp_path)
+    assert index.lookup("8.8.8.8") == GeoInfo("US", 15169)
+    assert index.lookup("81.33.1.2") == GeoInfo("ES", 3352)
+    assert index.lookup("1.0.0.255") == GeoInfo("AU", 13335)
+    assert index.lookup("1.0.1.0") is None
+    assert index.lookup("192.168.1.1") is None
+    assert index.lookup("2001:4860:4860::8888") == GeoInfo("US", 15169)
+    assert index.lookup("::ffff:8.8.8.8") == GeoInfo("US", 15169)
+    assert index.lookup("unknown") is None
+    index.close()
+
+
+def test_batch_lookup_matches_single_lookups(tmp_path):
+    index = _index(tmp_path)
+    ips = ["81.1.1.1", "8.8.8.8", "10.0.0.1", "2a00:1450::1", "1.0.0.1", "8.8.8.4", "nope", "255.255.255.255"]
+    assert index.lookup_many(ips) == {ip: index.lookup(ip) for ip in ips}
+    index.close()
+
+
+def test_overlapping_ranges_are_rejected(tmp_path):
+    ranges = [(4, (10, 20, "ES", 1)), (4, (15, 30, "FR", 2))]
+    try:
+        write_geoip_db(str(tmp_path / "geo.bin"), ranges)
+    except ValueError:
+        return
+    raise AssertionError("Se esperaba ValueError")
+
+
+def test_click_buffer_aggregates_by_country_and_asn(tmp_path):
+    buffer = GeoClickBuffer(_index(tmp_path))
+    pending = Counter({(1, "8.8.8.8"): 2, (1, "8.8.8.9"): 1, (1, "10.0.0.1"): 4, (2, "81.2.3.4"): 1})
+    assert buffer.aggregate(pending) == Counter({
+        (1, "US", 15169): 3,
+        (1, UNKNOWN_COUNTRY, 0): 4,
+        (2, "ES", 3352): 1,
+    })
+
+
+def test_ipv6_keys_use_the_64_bit_prefix():
+    assert ip_key("2001:db8:1:2:aaaa::1") == ip_key("2001:db8:1:2:bbbb::9")
+    assert ip_key("2001:db8:1:3::1") != ip_key("2001:db8:1:2::1")
+
+
+def test_forwarded_for_is_only_trusted_from_known_proxies(monkeypatch):
+    monkeypatch.setattr(client_ip, "_PROXIES", (client_ip.ipaddress.ip_network("10.0.0.0/8"),))
+    client_ip._is_trusted.cache_clear()
+
+    def request(host, forwarded=None):
+        headers = {"x-forwarded-for": forwarded} if forwarded else {}
+        return SimpleNamespace(client=SimpleNamespace(host=host), headers=headers)
+
+    assert client_ip.get_client_ip(request("10.1.1.1", "6.6.6.6, 8.8.8.8, 10.2.2.2")) == "8.8.8.8"
+    assert client_ip.get_client_ip(request("8.8.4.4", "6.6.6.6")) == "8.8.4.4"
+    assert client_ip.get_client_ip(request("10.1.1.1")) == "10.1.1.1"
+    client_ip._is_trusted.cache_clear()
@@ -0,0 +1,90 @@
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import health, lifespan as lifespan_module
+from app.core.lifespan import lifespan, register_periodic_job, register_shutdown_hook, register_startup_hook
+
+
+@pytest.fixture
+def events(monkeypatch):
+    """Pools y trabajos sustituidos: cada paso del arranque y del apagado queda anotado."""
+    events = []
+
+    def step(name, result=None):
+        async def run(*args):
+            events.append(name)
+            return result
+        return run
+
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    monkeypatch.setattr(lifespan_module, "warm_up_pool", step("db-pool", 5))
+    monkeypatch.setattr(lifespan_module, "refresh_shard_map", step("shard-map"))
+    monkeypatch.setattr(lifespan_module, "warm_up_redis_pool", step("redis-pool", 3))
+    monkeypatch.setattr(lifespan_module, "warm_up_cache", step("cache", 10))
+    monkeypatch.setattr(lifespan_module, "async_session", session)
+    monkeypatch.setattr(lifespan_module, "close_redis", step("close-redis"))
+    monkeypatch.setattr(lifespan_module, "close_engine", step("close-engine"))
+    monkeypatch.setattr(lifespan_module, "snapshot_store", None)
+    for registry in ("_startup_hooks", "_shutdown_hooks", "_periodic_jobs", "_running_tasks"):
+        monkeypatch.setattr(lifespan_module, registry, [])
+
+    register_startup_hook(step("startup-hook"))
+    register_shutdown_hook(step("flush-clicks"))
+    register_shutdown_hook(step("flush-emails"))
+    return events
+
+
+def _app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(health.router)
+    return app
+
+
+def test_ready_only_between_warm_up_and_drain(events):
+    app = _app()
+    # Sin context manager no se ejecuta el lifespan: todavía no se ha precalentado
+    response = TestClient(app).get("/health/ready")
+    assert response.status_code == 503 and response.json()["status"] == "starting"
+
+    with TestClient(app) as client:
+        assert events == ["db-pool", "shard-map", "redis-pool", "cache", "startup-hook"]
+        response = client.get("/health/ready")
+        assert response.status_code == 200 and response.json()["status"] == "ready"
+        assert client.get("/health").json() == {"status": "ok"}
+
+    # Los hooks se vacían en orden inverso y antes de cerrar los pools
+    assert events[5:] == ["flush-emails", "flush-clicks", "close-redis", "close-engine"]
+    assert app.state.ready is False
+
+
+def test_redis_failure_does_not_block_start_up(events, monkeypatch):
+    async def unavailable():
+        raise ConnectionError("redis caído")
+
+    monkeypatch.setattr(lifespan_module, "warm_up_redis_pool", unavailable)
+    with TestClient(_app()) as client:
+        assert client.get("/health/ready").status_code == 200
+    assert "cache" not in events
+
+
+def test_periodic_jobs_run_until_drain(events):
+    ticks = []
+
+    async def job():
+        ticks.append(1)
+
+    register_periodic_job("tick", 0.01, job)
+    with TestClient(_app()):
+        task = lifespan_module._running_tasks[0]
+        # El loop del lifespan corre en el hilo del portal de TestClient
+        time.sleep(0.1)
+        assert ticks
+    assert task.cancelled()
+    assert lifespan_module._running_tasks == []
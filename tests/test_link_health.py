@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.services.link_health_service import HealthChecker, ResultCache, verdict
+from app.services.url_service import CachedURL
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Destinos de prueba: /ok, /missing, /gone, /nohead (HEAD 405), /error, /moved → /ok y /escape → 127.0.0.1."""
+
+    hits: Counter = Counter()
+    hosts: set = set()
+
+    def _reply(self, send_body: bool):
+        self.hits[(self.command, self.path)] += 1
+        self.hosts.add(self.headers["Host"])
+        if self.path == "/nohead" and self.command == "HEAD":
+            code = 405
+        elif self.path in ("/moved", "/escape"):
+            port = self.server.server_address[1]
+            self.send_response(301)
+            self.send_header("Location", "/ok" if self.path == "/moved" else f"http://127.0.0.1:{port}/ok")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        else:
+            code = {"/ok": 200, "/nohead": 200, "/missing": 404, "/gone": 410, "/error": 500}.get(self.path, 404)
+        body = b"x" * 1024
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply(False)
+
+    def do_GET(self):
+        self._reply(True)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.hits = Counter()
+    _Handler.hosts = set()
+    # 127.0.0.2 hace de host "público" en test_redirect_to_private_address_is_skipped
+    httpd = ThreadingHTTPServer(("0.0.0.0", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _checker(client, **kwargs):
+    return HealthChecker(client, per_host=2, cache=ResultCache(60), allow_private=True, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_statuses_head_fallback_and_redirects(server):
+    async with httpx.AsyncClient(timeout=5) as client:
+        checker = _checker(client)
+        assert await checker.check(f"{server}/ok") == 200
+        assert await checker.check(f"{server}/missing") == 404
+        assert await checker.check(f"{server}/gone") == 410
+        assert await checker.check(f"{server}/error") == 500
+        assert await checker.check(f"{server}/nohead") == 200
+        assert await checker.check(f"{server}/moved") == 200
+    assert _Handler.hits[("GET", "/nohead")] == 1
+    assert _Handler.hits[("GET", "/ok")] == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_by_host_and_path_avoids_repeated_requests(server):
+    async with httpx.AsyncClient(timeout=5) as client:
+        checker = _checker(client, rate=1000)
+        statuses = await asyncio.gather(*(checker.check(f"{server}/missing") for _ in range(20)))
+    assert statuses == [404] * 20
+    assert _Handler.hits[("HEAD", "/missing")] == 1
+
+
+@pytest.mark.asyncio
+async def test_unreachable_and_private_targets(server):
+    async with httpx.AsyncClient(timeout=1) as client:
+        checker = _checker(client)
+        # Puerto cerrado: sin respuesta
+        assert await checker.check("http://127.0.0.1:9/") == 0
+        guarded = HealthChecker(client, cache=ResultCache(60))
+        assert await guarded.check(f"{server}/ok") is None
+        assert await guarded.check("http://localhost/ok") is None
+        assert await guarded.check("http://10.0.0.1/ok") is None
+        assert await guarded.check("ftp://example.com/file") is None
+    assert _Handler.hits[("HEAD", "/ok")] == 0
+
+
+class _PublicLoopback(HealthChecker):
+    """Trata 127.0.0.2 y public.test (→ 127.0.0.2) como públicos; el resto de loopback no."""
+
+    def _address_allowed(self, address):
+        return str(address) == "127.0.0.2" or address.is_global
+
+    async def _resolve(self, host):
+        fixed = {"public.test": ["127.0.0.2"], "internal.test": ["93.184.216.34", "10.0.0.5"]}
+        return fixed[host] if host in fixed else await super()._resolve(host)
+
+
+@pytest.mark.asyncio
+async def test_redirect_to_private_address_is_skipped(server):
+    public = server.replace("127.0.0.1", "127.0.0.2")
+    async with httpx.AsyncClient(timeout=5) as client:
+        checker = _PublicLoopback(client, cache=ResultCache(60))
+        assert await checker.check(f"{public}/missing") == 404
+        assert await checker.check(f"{public}/moved") == 200
+        assert await checker.check(f"{public}/escape") is None
+        # Un nombre con alguna dirección privada tampoco se consulta
+        assert await checker.check("http://internal.test/ok") is None
+        assert await checker._address_for("public.test") == "127.0.0.2"
+    assert _Handler.hits[("HEAD", "/escape")] == 1
+    assert _Handler.hits[("HEAD", "/ok")] == 1
+
+
+@pytest.mark.asyncio
+async def test_connection_goes_to_the_vetted_address(server):
+    port = server.rsplit(":", 1)[1]
+    async with httpx.AsyncClient(timeout=5) as client:
+        checker = _PublicLoopback(client, cache=ResultCache(60))
+        # public.test no existe en el DNS del sistema: solo responde si se conecta a la IP comprobada
+        assert await checker.check(f"http://public.test:{port}/moved") == 200
+        assert await checker.check("http://does-not-resolve.invalid/") == 0
+    assert _Handler.hosts == {f"public.test:{port}"}
+    assert _Handler.hits[("HEAD", "/ok")] == 1
+
+
+def test_verdicts_and_cached_entry_flag():
+    assert [verdict(s) for s in (200, 301, 404, 410, 500, 0)] == ["ok", "ok", "broken", "broken", "error", "error"]
+    entry = CachedURL(id=1, original_url="https://example.com", broken=True)
+    assert CachedURL.from_json(entry.to_json()) == entry
+    assert CachedURL.from_json(CachedURL(id=1, original_url="x").to_json()).broken is False
@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from sqlalchemy.dialects import postgresql
+
+from app.api.deps import get_current_user, get_current_user_optional
+from app.api.v1 import url_routes
+from app.db.models.url import URL
+from app.db.session import get_session
+from app.services import url_service
+from app.services.url_service import release_link_slots, reserve_link_slot
+
+OWNER = SimpleNamespace(id=7, link_count=45, roles=[])
+START = datetime(2026, 1, 1)
+
+
+class _Session:
+    """Sesión mínima: devuelve `rows` en cada consulta y guarda las sentencias."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append((statement, params))
+        return SimpleNamespace(
+            first=lambda: self.rows[0] if self.rows else None,
+            scalars=lambda: SimpleNamespace(first=lambda: self.rows[0] if self.rows else None),
+        )
+
+    async def commit(self):
+        pass
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.asyncio
+async def test_reserve_link_slot_enforces_the_quota(monkeypatch):
+    monkeypatch.setattr(url_service.settings, "max_links_per_user", 3)
+    full = _Session()
+    assert await reserve_link_slot(full, 7) is False
+    assert "users.link_count < 3" in _sql(full.statements[0][0])
+
+    assert await reserve_link_slot(_Session([(3,)]), 7) is True
+
+    monkeypatch.setattr(url_service.settings, "max_links_per_user", 0)
+    unlimited = _Session([(1000,)])
+    assert await reserve_link_slot(unlimited, 7) is True
+    assert "link_count <" not in _sql(unlimited.statements[0][0])
+
+
+@pytest.mark.asyncio
+async def test_release_groups_owners_and_skips_anonymous_links():
+    db = _Session()
+    await release_link_slots(db, [7, None, 7, 9])
+    assert sorted(db.statements[0][1], key=lambda row: row["owner"]) == [
+        {"owner": 7, "delta": -2}, {"owner": 9, "delta": -1},
+    ]
+    await release_link_slots(db, [None])
+    assert len(db.statements) == 1
+
+
+def _url(i: int) -> URL:
+    # Varios enlaces con la misma fecha: el id desempata en el cursor
+    return URL(
+        id=i, code=f"c{i}", original_url=f"https://example.com/{i}",
+        created_at=START + timedelta(minutes=i // 3), access_count=0, owner_id=OWNER.id,
+    )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    stored = [_url(i) for i in range(1, 46)]
+    state = SimpleNamespace(stored=stored, session=_Session(), released=[])
+
+    async def list_owner_urls(db, owner_id, limit, after=None):
+        urls = sorted(stored, key=lambda url: (url.created_at, url.id), reverse=True)
+        if after:
+            urls = [url for url in urls if (url.created_at, url.id) < after]
+        return urls[:limit]
+
+    async def read_versions(*keys):
+        return []
+
+    async def noop(*args, **kwargs):
+        pass
+
+    async def release(db, owner_ids):
+        state.released.extend(owner_ids)
+
+    async def session():
+        yield state.session
+
+    monkeypatch.setattr(url_routes, "list_owner_urls", list_owner_urls)
+    monkeypatch.setattr(url_routes, "read_versions", read_versions)
+    monkeypatch.setattr(url_routes, "release_link_slots", release)
+    monkeypatch.setattr(url_routes, "invalidate_urls", noop)
+    monkeypatch.setattr(url_routes, "bump_versions", noop)
+    monkeypatch.setattr(url_routes, "record_deleted", lambda code: None)
+    app = FastAPI()
+    app.state.limiter = Limiter(key_func=get_remote_address, enabled=False)
+    app.include_router(url_routes.router, prefix="/api/v1/urls")
+    app.dependency_overrides[get_session] = session
+    app.dependency_overrides[get_current_user] = lambda: OWNER
+    app.dependency_overrides[get_current_user_optional] = lambda: OWNER
+    with TestClient(app) as test_client:
+        state.client = test_client
+        yield state
+
+
+def test_mine_pages_through_every_link_once_with_the_keyset_cursor(client):
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 20} | ({"cursor": cursor} if cursor else {})
+        page = client.client.get("/api/v1/urls/mine", params=params).json()
+        assert page["total"] == OWNER.link_count
+        seen += [item["id"] for item in page["items"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert pages == 3
+    assert seen == list(range(45, 0, -1))
+    assert client.client.get("/api/v1/urls/mine", params={"cursor": "no-es-un-cursor"}).status_code == 400
+
+
+def test_deleting_an_owned_link_releases_its_slot(client):
+    client.session.rows = [_url(3)]
+    assert client.client.delete("/api/v1/urls/3").status_code == 204
+    assert client.released == [OWNER.id]
+
+
+class _ShardSession:
+    """Un shard de la lista global: aplica el cursor y el límite de la consulta."""
+
+    def __init__(self, urls):
+        self.urls = urls
+
+    async def execute(self, statement, params=None):
+        after = statement.whereclause.right.value if statement.whereclause is not None else 0
+        rows = [url for url in self.urls if url.id > after][:statement._limit]
+        return SimpleNamespace(scalars=lambda: iter(rows))
+
+
+def test_listing_pages_across_shards_with_after_id(client, monkeypatch):
+    shards = [[url for url in client.stored if url.id % 2 == n] for n in (0, 1)]
+
+    async def scatter(query, db=None):
+        return [await query(_ShardSession(urls)) for urls in shards]
+
+    monkeypatch.setattr(url_routes, "scatter", scatter)
+    monkeypatch.setattr(url_routes.shard_map, "shard_count", 2)
+    seen, params = [], {"limit": 20}
+    while True:
+        response = client.client.get("/api/v1/urls/", params=params)
+        seen += [item["id"] for item in response.json()]
+        if "X-Next-After-Id" not in response.headers:
+            break
+        params["after_id"] = response.headers["X-Next-After-Id"]
+    assert seen == list(range(1, 46))
+    assert client.client.get("/api/v1/urls/", params={"skip": 20}).status_code == 400
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import profiler
+from app.core.profiler import PROFILE_HEADER, SamplingProfiler
+from app.core.security import create_access_token
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_captures_running_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    worker.start()
+    sampler = SamplingProfiler(interval=0.001)
+    sampler.start()
+    time.sleep(0.05)
+    sampler.stop()
+    stop.set()
+    worker.join()
+
+    collapsed = sampler.collapsed()
+    assert any(line.startswith("busy;") and "_busy_loop" in line for line in collapsed.splitlines())
+
+    profile = sampler.speedscope("test")["profiles"][0]
+    assert profile["type"] == "sampled"
+    assert len(profile["samples"]) == len(profile["weights"])
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    profiler.setup_request_profiling(app)
+    app.include_router(profiler.router)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def _auth(role):
+    return {"Authorization": f"Bearer {create_access_token({'sub': '1', 'role': role})}"}
+
+
+def test_profiling_requires_admin(client):
+    assert client.get("/debug/profile", params={"seconds": 0.01}).status_code == 401
+    assert client.get("/ping", headers={PROFILE_HEADER: "collapsed", **_auth("user")}).status_code == 403
+
+
+def test_profile_header_returns_request_profile(client):
+    response = client.get("/ping", headers={PROFILE_HEADER: "speedscope", **_auth("admin")})
+    assert response.status_code == 200
+    assert response.headers["X-Profiled-Status"] == "200"
+    assert response.json()["profiles"][0]["type"] == "sampled"
+
+
+def test_worker_profile_endpoint(client):
+    response = client.get("/debug/profile", params={"seconds": 0.05}, headers=_auth("admin"))
+    assert response.status_code == 200
+    assert response.text.strip()
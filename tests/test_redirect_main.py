@@ -0,0 +1,21 @@
+import json
+import subprocess
+import sys
+
+_PROBE = """
+import json, sys
+from app.redirect_main import app
+print(json.dumps({
+    "routes": sorted(route.path for route in app.routes),
+    "modules": sorted(name for name in ("celery", "passlib", "babel", "app.api.v1.user_routes") if name in sys.modules),
+}))
+"""
+
+
+def test_redirect_app_mounts_only_resolution_routes_and_skips_heavy_imports():
+    # En un intérprete nuevo: los tests ya han importado la app completa
+    output = subprocess.run([sys.executable, "-c", _PROBE], check=True, capture_output=True, text=True).stdout
+    probe = json.loads(output.strip().splitlines()[-1])
+
+    assert probe["routes"] == ["/health", "/health/ready", "/metrics", "/r/api/url/{code}"]
+    assert probe["modules"] == []
@@ -0,0 +1,29 @@
+from prometheus_client import REGISTRY
+
+from app.core.config import get_settings
+from app.core.redis_client import TimedBlockingPool, create_redis_pool, create_sync_redis_pool, pool
+
+settings = get_settings()
+
+
+def test_shared_pool_is_bounded_and_uses_configured_timeouts():
+    assert isinstance(pool, TimedBlockingPool)
+    assert pool.max_connections == settings.redis_max_connections
+    assert pool.timeout == settings.redis_pool_timeout
+    options = pool.connection_kwargs
+    assert options["socket_timeout"] == settings.redis_socket_timeout
+    assert options["socket_connect_timeout"] == settings.redis_socket_connect_timeout
+    assert options["health_check_interval"] == settings.redis_health_check_interval
+
+
+def test_sync_pool_for_the_limiter_shares_options():
+    sync_pool = create_sync_redis_pool(3)
+    assert sync_pool.max_connections == 3
+    assert sync_pool.connection_kwargs["socket_timeout"] == settings.redis_socket_timeout
+
+
+def test_pool_utilization_is_exported():
+    extra = create_redis_pool(max_connections=2)
+    assert extra.max_connections == 2
+    assert REGISTRY.get_sample_value("redis_pool_connections", {"state": "max"}) == settings.redis_max_connections
+    assert REGISTRY.get_sample_value("redis_pool_connections", {"state": "in_use"}) == 0
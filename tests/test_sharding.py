@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.db import sharding
+from app.db.sharding import SHARD_BUCKETS, SHARDED_ID_BASE, ShardMap, bucket_chars, bucket_for_code, make_url_id
+from app.db.models.url import URL
+from app.services.shard_rebalance import carry_counters, upsert
+
+
+def _row(bucket, shard, moving=False):
+    return SimpleNamespace(bucket=bucket, shard=shard, moving=moving)
+
+
+def test_buckets_follow_the_first_character():
+    assert bucket_for_code("0abc") == 0
+    assert bucket_for_code("Zabc") == 35
+    assert bucket_for_code("zabc") == 61
+    assert bucket_for_code("-abc") == 0
+    assert all(bucket_for_code(char) == bucket for bucket in range(62) for char in bucket_chars(bucket))
+
+
+def test_map_routes_codes_and_ids_to_the_same_shard():
+    shard_map = ShardMap(3)
+    shard_map.load([_row(bucket_for_code("k"), 2), _row(bucket_for_code("A"), 1, moving=True)])
+    url_id = SHARDED_ID_BASE + 1234 * SHARD_BUCKETS + bucket_for_code("kXy12")
+    assert shard_map.shard_for_code("kXy12") == shard_map.shard_for_id(url_id) == 2
+    assert shard_map.shards_for_code("kXy12") == [2, 0]
+    assert shard_map.shards_for_code("bXy12") == [0]
+    # Los ids anteriores al reparto siguen en el shard 0
+    assert shard_map.shard_for_id(bucket_for_code("k")) == 0
+    assert shard_map.is_moving("Abc") and not shard_map.is_moving("kXy12")
+
+
+def test_map_rejects_unknown_shards():
+    with pytest.raises(ValueError):
+        ShardMap(2).load([_row(5, 2)])
+
+
+def test_ids_encode_the_bucket_only_when_sharded(monkeypatch):
+    assert make_url_id(77, "kXy12") == 77
+    monkeypatch.setattr(sharding.shard_map, "shard_count", 4)
+    url_id = make_url_id(77, "kXy12")
+    assert url_id > SHARDED_ID_BASE and url_id % SHARD_BUCKETS == bucket_for_code("k")
+    assert make_url_id(78, "kXy12") - url_id == SHARD_BUCKETS
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_rebalance_upsert_copies_first_and_then_adds_increments():
+    table, conflict = URL.__table__, ("code",)
+    counters, latest = ("access_count", "consumed_clicks"), ("last_accessed_at",)
+    fresh = _sql(upsert(table, conflict, counters, latest))
+    assert "access_count = excluded.access_count" in fresh
+    assert "last_accessed_at = greatest(urls.last_accessed_at, excluded.last_accessed_at)" in fresh
+    carry = _sql(upsert(table, conflict, counters, latest, accumulate=True))
+    assert "access_count = (urls.access_count + excluded.access_count)" in carry
+    assert "consumed_clicks = (urls.consumed_clicks + excluded.consumed_clicks)" in carry
+
+
+def test_rebalance_carries_only_what_the_source_gained_since_the_last_pass():
+    carried = {}
+    first = [{"id": 1, "clicks": 10}, {"id": 2, "clicks": None}]
+    assert carry_counters(first, ["id"], ("clicks",), carried) == (first, [])
+
+    # Entre pasadas el origen suma 2 y 0; el destino conserva lo que anotó por su cuenta
+    fresh, carry = carry_counters([{"id": 1, "clicks": 12}, {"id": 2, "clicks": 0}, {"id": 3, "clicks": 4}],
+                                  ["id"], ("clicks",), carried)
+    assert fresh == [{"id": 3, "clicks": 4}]
+    assert carry == [{"id": 1, "clicks": 2}, {"id": 2, "clicks": 0}]
+    assert carried[(1,)] == {"clicks": 12}
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "https://example.com"
+
+    results = await asyncio.gather(*(flight.do("abc123", load) for _ in range(50)))
+    assert calls == 1
+    assert set(results) == {"https://example.com"}
+    assert flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight("test-errors")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    results = await asyncio.gather(*(flight.do("abc123", fail) for _ in range(5)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def ok():
+        return 1
+
+    assert await flight.do("abc123", ok) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_waiters():
+    flight = SingleFlight("test-cancel")
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return 42
+
+    leader = asyncio.ensure_future(flight.do("abc123", load))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("abc123", load))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == 42
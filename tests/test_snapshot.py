@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.snapshot_service import (
+    SnapshotIndex, SnapshotStore, decode_code, encode_code, write_snapshot
+)
+
+
+def _entries(codes):
+    ordered = sorted(codes, key=encode_code)
+    return [(encode_code(code), i + 1, f"https://example.com/{code}") for i, code in enumerate(ordered)]
+
+
+def test_encode_code_roundtrip_and_order():
+    codes = ["0", "a", "zz", "000000", "Zz9aB1", "zzzzzzzzzz"]
+    for code in codes:
+        assert decode_code(encode_code(code)) == code
+    # El orden numérico coincide con (longitud, código)
+    assert sorted(codes, key=encode_code) == sorted(codes, key=lambda c: (len(c), c))
+
+
+def test_encode_code_rejects_unsupported_codes():
+    assert encode_code("") is None
+    assert encode_code("summer-sale") is None
+    assert encode_code("a" * 11) is None
+
+
+def test_snapshot_lookup(tmp_path):
+    path = str(tmp_path / "urls.snap")
+    assert write_snapshot(path, _entries(["abc123", "ZZZZZZ", "000000"])) == 3
+
+    store = SnapshotStore(path)
+    store.refresh()
+    assert store.lookup("abc123")[1] == "https://example.com/abc123"
+    assert store.lookup("missing") is None
+    store.close()
+
+
+def test_snapshot_rejects_unsorted_entries(tmp_path):
+    entries = list(reversed(_entries(["abc123", "ZZZZZZ"])))
+    with pytest.raises(ValueError):
+        write_snapshot(str(tmp_path / "urls.snap"), entries)
+
+
+def test_delta_overlay_and_compaction(tmp_path):
+    path = str(tmp_path / "urls.snap")
+    write_snapshot(path, _entries(["abc123", "gone01"]))
+
+    writer = SnapshotStore(path)
+    reader = SnapshotStore(path)
+    reader.refresh()
+
+    writer.record_created("new001", 42, "https://example.org/new")
+    writer.record_deleted("gone01")
+    reader.refresh()
+    assert reader.lookup("new001") == (42, "https://example.org/new")
+    assert reader.lookup("gone01") is None
+
+    assert writer.compact() == 2
+    reader.refresh()
+    assert reader.lookup("new001") == (42, "https://example.org/new")
+    assert reader.lookup("gone01") is None
+    assert reader.lookup("abc123") is not None
+    reader.close()
+
+
+class _ShardSession:
+    """Cursor de un shard: devuelve sus filas ya ordenadas por código, como la consulta."""
+
+    def __init__(self, codes):
+        self.codes = sorted(codes, key=lambda code: (len(code), code))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def stream(self, query):
+        async def rows():
+            for code in self.codes:
+                yield SimpleNamespace(code=code, id=len(code), original_url=f"https://example.com/{code}")
+        return rows()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_merges_the_sorted_shards(tmp_path):
+    path = str(tmp_path / "urls.snap")
+    shards = [["abc123", "zz", "0"], ["ZZZZZZ", "summer-sale", "a1"], [], ["000000", "b"]]
+    store = SnapshotStore(path)
+    store.record_created("old001", 1, "https://example.com/old")
+
+    assert await store.rebuild([lambda codes=codes: _ShardSession(codes) for codes in shards], batch_size=2) == 7
+    index = SnapshotIndex(path)
+    assert [decode_code(key) for key, _, _ in index] == ["0", "b", "a1", "zz", "000000", "ZZZZZZ", "abc123"]
+    index.close()
+    # Lo anotado antes de exportar ya está en la BD: el delta rotado se descarta
+    store.refresh()
+    assert store.lookup("old001") is None
+    assert store.lookup("a1") == (2, "https://example.com/a1")
+    store.close()
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.db.instrumentation import (
+    QueryStats, assert_query_budget, instrument_engine, normalize_sql, query_budget, server_timing,
+)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    return engine
+
+
+def test_normalize_sql_groups_equivalent_statements():
+    statement = """
+        SELECT urls.id FROM urls
+        WHERE urls.code IN ($1::VARCHAR, $2::VARCHAR, $3::VARCHAR) AND urls.owner_id = 42 AND note = 'x'
+    """
+    assert normalize_sql(statement) == (
+        "SELECT urls.id FROM urls WHERE urls.code IN (...) AND urls.owner_id = ? AND note = ?"
+    )
+
+
+def test_query_budget_counts_statements(engine):
+    with engine.connect() as conn, query_budget(2) as stats:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+    assert stats.count == 2
+    assert stats.duration > 0
+
+
+def test_failed_statements_are_counted_and_do_not_leak_start_times(engine):
+    with engine.connect() as conn, query_budget(2) as stats:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.info["query_start"] == []
+        conn.execute(text("SELECT 1"))
+    assert stats.count == 2
+
+
+def test_query_budget_fails_when_exceeded(engine):
+    with pytest.raises(AssertionError):
+        with engine.connect() as conn, query_budget(1):
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+
+def test_response_budget_reads_server_timing():
+    class Response:
+        headers = {"server-timing": server_timing(QueryStats(count=3, duration=0.004))}
+
+    assert_query_budget(Response(), 3)
+    with pytest.raises(AssertionError):
+        assert_query_budget(Response(), 2)
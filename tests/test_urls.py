@@ -3,6 +3,7 @@ from httpx import AsyncClient
 from app.main import app
 import pytest_asyncio # Import the correct decorator
 from httpx import ASGITransport # Import ASGITransport
+from app.db.instrumentation import assert_query_budget
 
 @pytest_asyncio.fixture(scope="function") # Corrected decorator
 async def ac():
@@ -67,6 +68,8 @@ async def test_list_urls_after_creation(ac: AsyncClient, url_manager):
 
     list_response = await ac.get("/api/v1/urls/")
     assert list_response.status_code == 200
+    # Una sola consulta sin importar cuántas URLs devuelva
+    assert_query_budget(list_response, 1)
     urls_list = list_response.json()
     
     # Now we can expect exactly 2 URLs if url_manager cleans up properly from other tests
@@ -132,6 +135,7 @@ async def test_get_url_by_id_success(ac: AsyncClient, url_manager):
 
     get_response = await ac.get(f"/api/v1/urls/{url_id}")
     assert get_response.status_code == 200
+    assert_query_budget(get_response, 1)
     retrieved_url_data = get_response.json()
     
     assert retrieved_url_data["id"] == url_id
@@ -0,0 +1,49 @@
+from app.services.user_agent_service import UAClass, _classify, classify_user_agent, is_automated
+
+CASES = {
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36":
+        UAClass.DESKTOP,
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15":
+        UAClass.DESKTOP,
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148":
+        UAClass.MOBILE,
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Mobile Safari/537.36":
+        UAClass.MOBILE,
+    "Mozilla/5.0 (Linux; Android 12; CUBOT X30) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36":
+        UAClass.MOBILE,
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)": UAClass.BOT,
+    "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)": UAClass.BOT,
+    "curl/8.5.0": UAClass.BOT,
+    "python-requests/2.31.0": UAClass.BOT,
+    "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)": UAClass.PREVIEW,
+    "Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)": UAClass.PREVIEW,
+    "WhatsApp/2.23.20.0": UAClass.PREVIEW,
+    "Mozilla/5.0 (compatible; Discordbot/2.0; +https://discordapp.com)": UAClass.PREVIEW,
+    "": UAClass.BOT,
+}
+
+
+def test_classifies_common_user_agents():
+    for user_agent, expected in CASES.items():
+        assert classify_user_agent(user_agent) == expected, user_agent
+
+
+def test_only_bots_and_previews_are_automated():
+    assert is_automated(UAClass.BOT) and is_automated(UAClass.PREVIEW)
+    assert not is_automated(UAClass.MOBILE) and not is_automated(UAClass.DESKTOP)
+
+
+def test_repeated_user_agents_hit_the_cache():
+    _classify.cache_clear()
+    user_agent = next(iter(CASES))
+    for _ in range(100):
+        classify_user_agent(user_agent)
+    info = _classify.cache_info()
+    assert info.misses == 1 and info.hits == 99
+
+
+def test_long_user_agents_share_a_bounded_key():
+    _classify.cache_clear()
+    classify_user_agent("Mozilla/5.0 " + "x" * 10000)
+    classify_user_agent("Mozilla/5.0 " + "x" * 20000)
+    assert _classify.cache_info().currsize == 1
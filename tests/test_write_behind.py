@@ -0,0 +1,331 @@
+import itertools
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.dml import Insert
+
+from app.core import redis_client
+from app.services import write_behind_service
+from app.services.url_service import CACHE_PREFIX, CLICKS_PREFIX, CachedURL
+from app.services.write_behind_service import (
+    _ACCEPT_SCRIPT, _REQUEUE_SCRIPT, FAILED_KEY, REMOVED_PREFIX, STREAM_KEY, WRITTEN_KEY,
+    PendingURL, WriteBehindPersister, _persist, accept_url, enqueued_at, reconcile, record_removed,
+)
+
+
+def _pending(**overrides):
+    data = dict(
+        id=42,
+        code="aB3dE5fG",
+        original_url="https://example.com/",
+        url_hash="0" * 32,
+        created_at="2024-01-01T12:00:00",
+    )
+    data.update(overrides)
+    return PendingURL(**data)
+
+
+def test_pending_url_round_trips_through_json():
+    pending = _pending(owner_id=7, expires_at="2030-01-01T00:00:00", max_clicks=3)
+    assert PendingURL.from_json(pending.to_json()) == pending
+
+
+def test_pending_url_row_matches_table_columns():
+    row = _pending(expires_at="2030-01-01T00:00:00").to_row()
+    assert row["created_at"] == datetime(2024, 1, 1, 12)
+    assert row["expires_at"] == datetime(2030, 1, 1)
+    assert row["access_count"] == 0
+
+
+def test_cache_entry_carries_limits():
+    entry = _pending(expires_at="2030-01-01T00:00:00", max_clicks=3).entry()
+    assert entry.id == 42
+    assert entry.expires_at == datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp()
+    assert entry.max_clicks == 3
+    assert not _pending().entry().is_limited
+
+
+def test_stream_id_encodes_acceptance_time():
+    assert enqueued_at("1700000000123-0") == 1700000000.123
+
+
+class _Pipeline:
+    """Encola llamadas a _FakeRedis y las ejecuta en orden."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def __len__(self):
+        return len(self.commands)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class _FakeRedis:
+    """Los comandos que usan las altas diferidas, con los scripts Lua reescritos en Python."""
+
+    def __init__(self):
+        self.strings, self.ttls, self.hashes, self.zsets = {}, {}, {}, {}
+        self.stream, self.delivered = [], set()
+        self._ids = itertools.count()
+
+    def pipeline(self, transaction=False):
+        return _Pipeline(self)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = str(value)
+        self.ttls.pop(key, None)
+        if ex:
+            self.ttls[key] = ex
+        return True
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+    async def expire(self, key, ttl):
+        if key in self.strings or key in self.hashes:
+            self.ttls[key] = ttl
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+            self.ttls.pop(key, None)
+
+    unlink = delete
+
+    async def hset(self, name, key=None, value=None, mapping=None):
+        self.hashes.setdefault(name, {}).update(mapping or {key: value})
+
+    async def hmget(self, name, keys):
+        return [self.hashes.get(name, {}).get(key) for key in keys]
+
+    async def zrangebyscore(self, name, low, high, start=0, num=None):
+        members = sorted(self.zsets.get(name, {}).items(), key=lambda item: item[1])
+        found = [member for member, score in members if score <= float(high)]
+        return found[start:start + num if num else None]
+
+    async def zrem(self, name, *members):
+        for member in members:
+            self.zsets.get(name, {}).pop(member, None)
+
+    def _xadd(self, data):
+        message_id = f"{int(time.time() * 1000)}-{next(self._ids)}"
+        self.stream.append((message_id, {"data": data}))
+
+    async def xrange(self, name, count=None):
+        return self.stream[:count]
+
+    async def xlen(self, name):
+        return len(self.stream)
+
+    async def xgroup_create(self, *args, **kwargs):
+        pass
+
+    async def xautoclaim(self, *args, **kwargs):
+        return ["0-0", [], []]
+
+    async def xreadgroup(self, group, consumer, streams, count=None):
+        fresh = [message for message in self.stream if message[0] not in self.delivered][:count]
+        self.delivered.update(message_id for message_id, _ in fresh)
+        return [[STREAM_KEY, fresh]] if fresh else []
+
+    async def xack(self, *args):
+        pass
+
+    async def xdel(self, name, *message_ids):
+        self.stream = [message for message in self.stream if message[0] not in message_ids]
+
+    async def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == _ACCEPT_SCRIPT and keys[0] in self.strings:
+            return 0
+        await self.set(keys[0], argv[0], nx=True)
+        self._xadd(argv[2])
+        self.zsets.setdefault(keys[2], {})[argv[2]] = float(argv[1])
+        if script == _ACCEPT_SCRIPT and argv[3] == "1":
+            await self.set(keys[3], 0, nx=True)
+        return 1
+
+
+class _Database:
+    """Tablas urls y urls_archive de un único shard, con ON CONFLICT DO NOTHING sobre id y code."""
+
+    def __init__(self):
+        self.urls, self.archived, self.inserts = {}, set(), []
+        self.reject = set()
+
+    def add(self, url_id, code, original_url):
+        self.urls[code] = SimpleNamespace(
+            id=url_id, code=code, original_url=original_url,
+            expires_at=None, max_clicks=None, target_status=None,
+        )
+
+    def session(self):
+        return _DatabaseSession(self)
+
+
+class _DatabaseSession:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if isinstance(statement, Insert):
+            return self._insert([{c.name: v for c, v in row.items()} for row in statement._multi_values[0]])
+        table = statement.get_final_froms()[0].name
+        wanted = statement.whereclause.right.value
+        if table == "urls_archive":
+            found = [url_id for url_id in wanted if url_id in self.db.archived]
+        elif statement.selected_columns.keys()[0] == "id":
+            found = [url.id for url in self.db.urls.values() if url.id in wanted]
+        else:
+            found = [url for code, url in self.db.urls.items() if code in wanted]
+        return SimpleNamespace(scalars=lambda: iter(found), all=lambda: found)
+
+    def _insert(self, rows):
+        if any(row["code"] in self.db.reject for row in rows):
+            raise IntegrityError("INSERT", {}, ValueError("fila rechazada"))
+        self.db.inserts.append(len(rows))
+        taken = {url.id for url in self.db.urls.values()}
+        inserted = []
+        for row in rows:
+            if row["code"] not in self.db.urls and row["id"] not in taken:
+                self.db.add(row["id"], row["code"], row["original_url"])
+                inserted.append(row["code"])
+        return SimpleNamespace(scalars=lambda: iter(inserted))
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+CODES = ["aB3dE5fG", "hJ7kL9mN", "pQ2rS4tU", "vW6xY8zA"]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    fake, db = _FakeRedis(), _Database()
+    ids, codes = itertools.count(1), iter(CODES)
+
+    async def next_id():
+        return next(ids)
+
+    async def scatter(query, session=None):
+        return [await query(db.session())]
+
+    monkeypatch.setattr(redis_client, "redis", fake)
+    monkeypatch.setattr(write_behind_service, "redis", fake)
+    monkeypatch.setattr(write_behind_service, "scatter", scatter)
+    monkeypatch.setattr(write_behind_service, "shard_sessions", [db.session])
+    monkeypatch.setattr(write_behind_service, "snapshot_store", None)
+    monkeypatch.setattr(write_behind_service, "id_allocator", SimpleNamespace(next_id=next_id))
+    monkeypatch.setattr(write_behind_service, "generate_short_code", lambda length: next(codes))
+    return SimpleNamespace(redis=fake, db=db)
+
+
+async def _accept(n, **kwargs):
+    return [await accept_url(f"https://example.com/{i}", "0" * 32, **kwargs) for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_accept_reserves_the_code_and_queues_the_row(backend):
+    backend.redis.strings[CACHE_PREFIX + CODES[0]] = "ocupado"
+    [pending] = await _accept(1, max_clicks=3)
+
+    # El código ocupado se salta sin consumir otro id
+    assert (pending.id, pending.code) == (1, CODES[1])
+    key = CACHE_PREFIX + pending.code
+    assert CachedURL.from_json(backend.redis.strings[key]) == pending.entry()
+    assert key not in backend.redis.ttls
+    assert backend.redis.strings[CLICKS_PREFIX + "1"] == "0"
+    assert [fields["data"] for _, fields in backend.redis.stream] == [pending.to_json()]
+    assert list(backend.redis.zsets[WRITTEN_KEY]) == [pending.to_json()]
+
+
+@pytest.mark.asyncio
+async def test_persister_batches_rows_and_resolves_conflicts(backend):
+    first, taken, fresh = await _accept(3)
+    # Entrega repetida de la primera y el código de la segunda ya es de otro enlace
+    backend.db.add(first.id, first.code, first.original_url)
+    backend.db.add(99, taken.code, "https://example.com/otro")
+
+    assert await WriteBehindPersister(batch_size=2).flush() == 2
+    assert backend.db.inserts == [2, 1]
+    assert backend.db.urls[fresh.code].id == fresh.id
+    assert backend.redis.hashes[FAILED_KEY] == {taken.code: "conflict"}
+    assert CACHE_PREFIX + taken.code not in backend.redis.strings
+    assert CACHE_PREFIX + fresh.code in backend.redis.ttls
+    assert backend.redis.stream == []
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_is_retried_row_by_row(backend):
+    good, bad = await _accept(2)
+    backend.db.reject.add(bad.code)
+    inserted, failed = await _persist([good, bad])
+    assert inserted == {good.code}
+    assert failed == {bad.code: "ValueError"}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_classifies_every_accepted_row(backend):
+    ok, mismatch, failed, lost = await _accept(4)
+    backend.redis.stream = []
+    backend.db.add(ok.id, ok.code, ok.original_url)
+    backend.db.add(99, mismatch.code, "https://example.com/otro")
+    backend.redis.hashes[FAILED_KEY] = {failed.code: "conflict"}
+
+    results = await reconcile(grace=0)
+    assert results == {"ok": 1, "repaired": 1, "mismatch": 1, "failed": 1, "removed": 0}
+    # Solo la perdida sigue pendiente, reencolada con la misma identidad
+    assert list(backend.redis.zsets[WRITTEN_KEY]) == [lost.to_json()]
+    assert [fields["data"] for _, fields in backend.redis.stream] == [lost.to_json()]
+    assert CachedURL.from_json(backend.redis.strings[CACHE_PREFIX + mismatch.code]).id == 99
+    assert backend.redis.hashes[FAILED_KEY][mismatch.code] == "conflict"
+
+
+@pytest.mark.asyncio
+async def test_links_removed_after_persisting_are_not_resurrected(backend):
+    deleted, archived = await _accept(2)
+    await WriteBehindPersister().flush()
+
+    # Borrado: sale de urls y de la caché dentro del periodo de gracia
+    del backend.db.urls[deleted.code]
+    await backend.redis.delete(CACHE_PREFIX + deleted.code)
+    await record_removed([(deleted.id, deleted.code)])
+    assert REMOVED_PREFIX + str(deleted.id) in backend.redis.ttls
+    # Archivado en frío sin lápida: basta con encontrarlo en urls_archive
+    del backend.db.urls[archived.code]
+    backend.db.archived.add(archived.id)
+
+    results = await reconcile(grace=0)
+    assert results["removed"] == 2 and results["repaired"] == 0
+    assert backend.redis.stream == []
+    assert backend.redis.zsets[WRITTEN_KEY] == {}
+    assert CACHE_PREFIX + deleted.code not in backend.redis.strings